@@ -2,35 +2,43 @@
 # -*- coding: utf-8 -*-
 """
 添加原始诗词数据到参考库
+不带参数时处理 input.txt；也可以传多个文件、目录或通配符批量导入
 """
 
-import json
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from lib.api import api_single
 from lib.config import load_config, ensure_dirs
+from lib.batch import get_batch_workers
+from lib.ingest import expand_inputs, get_ingest_settings, ingest_files
+from lib.refstore import open_reference_store
 
 
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='把原始题目转换后添加到参考库')
+    parser.add_argument('inputs', nargs='*', help='输入文件、目录或通配符（默认 input.txt）')
+    parser.add_argument('--pattern', help='目录里要导入的文件（默认用配置 ingest.pattern）')
+    parser.add_argument('--budget', type=int, help='每块输入的 token 预算（默认用配置 ingest.token_budget）')
+    parser.add_argument('--workers', type=int, help='并发数（默认用 batch 的并发设置）')
+    parser.add_argument('--refresh', action='store_true', help='忽略本地缓存，全部重新请求')
+    parser.add_argument('--compact', action='store_true', help='导入后立即合并参考库分段')
+    args = parser.parse_args()
+
     config = load_config()
     ensure_dirs(config)
+    settings = get_ingest_settings(config)
     
     data_dir = config.get('paths', {}).get('data_dir', './data')
     
-    # 加载参考数据
-    ref_file = os.path.join(data_dir, 'reference-original.json')
     try:
-        with open(ref_file, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-    except FileNotFoundError:
-        raw = []
-        print(f"[!] 参考数据文件不存在，将创建新文件: {ref_file}")
-    except json.JSONDecodeError:
-        raw = []
-        print("[!] 参考数据文件格式错误，将重新创建")
+        store = open_reference_store(config)
+    except Exception as e:
+        print(f"[!] 打开参考库失败: {e}")
+        return
     
     # 加载格式化提示词
     prompt_file = os.path.join(data_dir, 'format_prompt.md')
@@ -41,50 +49,56 @@ def main():
         print(f"[!] 提示词文件不存在: {prompt_file}")
         return
     
-    # 从input.txt读取输入
-    input_file = 'input.txt'
-    if not os.path.exists(input_file):
-        print(f"[!] 输入文件不存在: {input_file}")
-        print("    请创建input.txt并写入要处理的诗词内容")
-        return
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    if not content.strip():
-        print("[!] 输入文件为空")
+    # 没传参数时从input.txt读取输入
+    if not args.inputs:
+        if not os.path.exists('input.txt'):
+            print("[!] 输入文件不存在: input.txt")
+            print("    请创建input.txt并写入要处理的诗词内容，或者传入要导入的文件、目录")
+            return
+        args.inputs = ['input.txt']
+
+    files = expand_inputs(args.inputs, args.pattern or settings['pattern'])
+    if not files:
+        print("[!] 没有找到要导入的文件")
         return
-    
-    print("[*] 正在处理诗词数据...")
-    result_str = api_single([
-        {'role': 'system', 'content': prompt},
-        {'role': 'user', 'content': content}
-    ])
-    
-    if result_str is None:
-        print("[!] API调用失败")
+
+    budget = args.budget or settings['token_budget']
+    workers = args.workers or get_batch_workers(config)
+
+    def on_progress(record, done, total):
+        status = "完成" if record['ok'] else f"失败（{record['error']}）"
+        name = files[record['file_index']]
+        print(f"[{done}/{total}] {name} 第 {record['chunk_index'] + 1} 块 {status} {record['elapsed']:.1f}s")
+
+    print(f"[*] 正在处理 {len(files)} 个文件...")
+    reports = ingest_files(files, prompt, budget, workers=workers,
+                           progress_callback=on_progress, refresh=args.refresh)
+
+    # 每个文件追加为一批，按文件顺序，追加一行的开销和参考库大小无关
+    added = 0
+    ok = 0
+    print()
+    for report in reports:
+        if report['error'] is None and report['items']:
+            store.append(report['items'])
+            added += len(report['items'])
+        if report['error'] is None:
+            ok += 1
+            print(f"[+] {report['file']}: {report['chunks']} 块，{len(report['items'])} 题")
+        else:
+            print(f"[!] {report['file']}: {report['error']}")
+
+    if not added:
+        print("[!] 没有可添加的数据")
         return
-    
-    try:
-        result = json.loads(result_str)
-    except json.JSONDecodeError as e:
-        print(f"[!] JSON解析失败: {e}")
-        print("[!] 尝试修复...")
-        # 尝试修复markdown代码块
-        if "```json" in result_str:
-            result_str = result_str.split("```json")[1].split("```")[0].strip()
-        elif "```" in result_str:
-            result_str = result_str.split("```")[1].split("```")[0].strip()
-        result = json.loads(result_str)
-    
-    # 追加到参考数据
-    raw.append(result)
-    
-    # 保存
-    with open(ref_file, "w", encoding="utf-8") as f:
-        json.dump(raw, f, ensure_ascii=False, indent=2)
-    
-    print(f"[+] 数据已添加到: {ref_file}")
+
+    print(f"[+] {ok}/{len(reports)} 个文件成功，共 {added} 题已添加到: {store.directory}")
+
+    # 分段积累多了在后台合并，进程退出前会等合并做完
+    if args.compact:
+        store.compact()
+    elif store.compact_in_background():
+        print("[*] 正在合并参考库分段...")
 
 
 if __name__ == "__main__":
@@ -12,23 +12,22 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from lib.config import load_config, ensure_dirs, get_api_token, save_token_to_config
+from lib.endpoints import configured_endpoints
 from lib.generator import generate_questions, save_generated_data
 from lib.printer import generate_test_papers
+from lib.metrics import get_aggregator, format_prompt_cache
+from lib.console import console, get_console
 
-# rich 相关导入
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich import box
-from rich.text import Text
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.prompt import Prompt
-
-console = Console()
+# rich 的各个组件在用到的函数里再导入，启动时只加载第一屏需要的部分
 
 
 def check_setup():
     """检查并初始化环境"""
+    from rich.panel import Panel
+    from rich.table import Table
+    from rich import box
+    from rich.prompt import Prompt
+
     console.print()
     console.print(Panel.fit(
         "[bold cyan]诗词默写题目生成器[/bold cyan]",
@@ -44,6 +43,10 @@ def check_setup():
     
     # 检查API Token
     token = get_api_token(config)
+    if not token:
+        # api.endpoints 里单独配了 token 也可以
+        endpoints = configured_endpoints(config)
+        token = endpoints[0]['token'] if endpoints else None
     
     # 创建状态表格
     table = Table(show_header=False, box=box.ROUNDED, border_style="dim")
@@ -93,6 +96,10 @@ def check_setup():
 
 def interactive_mode(config):
     """交互模式：询问用户输入并生成题目"""
+    from rich.panel import Panel
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.prompt import Prompt
+
     console.print(Panel(
         "[bold]开始生成题目[/bold]",
         border_style="green"
@@ -127,7 +134,7 @@ def interactive_mode(config):
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
-        console=console,
+        console=get_console(),
     ) as progress:
         task = progress.add_task(
             f"[cyan]正在生成 [bold]{poet}《{poem}》[/bold] 的 {num} 道题目...[/cyan]",
@@ -148,10 +155,13 @@ def interactive_mode(config):
     
     console.print()
     console.print(f"[green]✓[/green] 成功生成 [bold]{len(result)}[/bold] 道题目")
+    summary = get_aggregator().summary()
+    if summary['prompt_cache_hit_rate'] is not None:
+        console.print(f"[dim]{format_prompt_cache(summary)}[/dim]")
     console.print()
     
     # 保存数据
-    if save_generated_data(result, config):
+    if save_generated_data(result, config, difficulty):
         console.print("[dim]正在生成试卷和答案...[/dim]")
         test_file, answer_file = generate_test_papers()
         
@@ -172,6 +182,9 @@ def interactive_mode(config):
 
 def main():
     """主函数"""
+    from rich.panel import Panel
+    from rich.prompt import Prompt
+
     try:
         config = check_setup()
         interactive_mode(config)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似去重性能测试 - 合成题库一次遍历去重的耗时、检出率和误判
+一部分题目套用同一个题干模板（只有答案不同），模拟模型批量输出的套话，检测不能因此退化成平方复杂度
+用法: python benchmarks/bench_dedup.py [--size 100000] [--dup-rate 0.1] [--template-rate 0.3]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.dedup import NearDuplicateDetector
+
+CHARS = "春江潮水连海平明月共生滟随波千万里何处无光流宛转绕芳甸花林皆似霰空里霜不觉飞汀上白沙看见"
+
+
+def random_line(rng, length):
+    return ''.join(rng.choice(CHARS) for _ in range(length))
+
+
+TEMPLATE = "诗人在{title}中以“{{{{answer}}}}，{{{{answer}}}}”两句，借景抒情，表达了自己漂泊在外、思念故乡的深沉感情。"
+
+
+def make_bank(size, dup_rate, template_rate=0.0, seed=0):
+    """
+    合成题库，约 dup_rate 比例的题目是前面某道题的改写（删改几个字，答案不变），
+    约 template_rate 比例的题目套用同一个题干模板、答案各不相同（不算重复）
+    返回 (题目列表, 改写题的序号集合)
+    """
+    rng = random.Random(seed)
+    items = []
+    dups = set()
+    for i in range(size):
+        if items and rng.random() < dup_rate:
+            src = items[rng.randrange(len(items))]
+            value = src['value']
+            # 只改动占位符前面的题干文字
+            cut = rng.randrange(2, 17)
+            items.append({
+                'title': src['title'], 'poet': src['poet'],
+                'value': value[:cut] + value[cut + 2:],
+                'answer': list(src['answer']),
+            })
+            dups.add(i)
+        elif rng.random() < template_rate:
+            items.append({
+                'title': f"诗{i % 500}", 'poet': f"诗人{i % 97}",
+                'value': TEMPLATE.format(title=f"《诗{i % 500}》"),
+                'answer': [random_line(rng, 7), random_line(rng, 7)],
+            })
+        else:
+            items.append({
+                'title': f"诗{i % 500}", 'poet': f"诗人{i % 97}",
+                'value': f"{random_line(rng, 20)}“{{{{answer}}}}，{{{{answer}}}}”{random_line(rng, 20)}",
+                'answer': [random_line(rng, 7), random_line(rng, 7)],
+            })
+    return items, dups
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='近似去重性能测试')
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dup-rate', type=float, default=0.1)
+    parser.add_argument('--template-rate', type=float, default=0.3, help='套用同一题干模板的题目比例')
+    args = parser.parse_args()
+
+    items, dups = make_bank(args.size, args.dup_rate, args.template_rate)
+
+    detector = NearDuplicateDetector()
+    found = set()
+    start = time.perf_counter()
+    for i, item in enumerate(items):
+        if detector.add(item, key=i) is not None:
+            found.add(i)
+    elapsed = time.perf_counter() - start
+
+    recall = len(found & dups) / len(dups) if dups else 1.0
+    false_pos = len(found - dups)
+    print(f"题目数 {len(items)}，耗时 {elapsed:.2f}s（{elapsed / len(items) * 1e6:.1f} us/题）")
+    print(f"改写题 {len(dups)}，检出 {len(found & dups)}（召回 {recall:.1%}），误判 {false_pos}")
+
+
+if __name__ == "__main__":
+    main()
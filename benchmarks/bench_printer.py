@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+试卷渲染性能测试 - 用合成题库测 render_test_papers 随题目数量的耗时和内存
+用法: python benchmarks/bench_printer.py [--sizes 1000 10000 100000]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.printer import group_by_poem, render_test_papers
+
+
+def make_bank(size, poems=200):
+    """合成题库：size 道题平均分到 poems 首诗，每道题的题干和答案都不一样"""
+    return [
+        {
+            "title": f"诗{i % poems}",
+            "poet": f"诗人{i % poems % 37}",
+            "value": f"第{i}题，诗中以“{{{{answer}}}}，{{{{answer}}}}”两句写出了作者的心境。",
+            "answer": [f"床前明月光{i}", f"疑是地上霜{i}"],
+        }
+        for i in range(size)
+    ]
+
+
+def bench(size, out_dir):
+    groups = group_by_poem(make_bank(size))
+    test_file = os.path.join(out_dir, f"paper_{size}.html")
+    answer_file = os.path.join(out_dir, f"answer_{size}.html")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = render_test_papers(groups.items(), test_file, answer_file)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count == size, f"渲染了 {count} 题，应为 {size} 题"
+
+    out_bytes = os.path.getsize(test_file) + os.path.getsize(answer_file)
+    return {
+        "questions": count,
+        "seconds": elapsed,
+        "us_per_question": elapsed / count * 1e6,
+        "peak_kib": peak / 1024,
+        "output_mib": out_bytes / 1024 / 1024,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='试卷渲染性能测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'题目数':>8} {'耗时(s)':>9} {'每题(us)':>9} {'峰值内存(KiB)':>14} {'输出(MiB)':>10}")
+    with tempfile.TemporaryDirectory() as out_dir:
+        for size in args.sizes:
+            r = bench(size, out_dir)
+            print(f"{r['questions']:>8} {r['seconds']:>9.3f} {r['us_per_question']:>9.2f} "
+                  f"{r['peak_kib']:>14.0f} {r['output_mib']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSE 解码吞吐测试 - 字节块解码器和原来逐行 json.loads 的对比
+用法: python benchmarks/bench_sse.py [--chunks 20000] [--block 16384]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.suite import CannedResponse, make_sse_body
+from lib.sse import iter_deltas
+
+
+def legacy_decode(response):
+    """原来的实现：iter_lines 逐行解码，每行都 json.loads"""
+    parts = []
+    usage = None
+    for line in response.iter_lines():
+        if not line:
+            continue
+        line_text = line.decode('utf-8')
+        if not line_text.startswith('data: '):
+            continue
+        json_str = line_text[6:]
+        if json_str == '[DONE]':
+            break
+        try:
+            chunk = json.loads(json_str)
+            choices = chunk.get('choices') or [{}]
+            delta = choices[0].get('delta') or {}
+            content = delta.get('content', '') or ''
+            usage = chunk.get('usage') or usage
+        except (json.JSONDecodeError, AttributeError):
+            continue
+        if content:
+            parts.append(content)
+    return ''.join(parts), usage
+
+
+def decoder_decode(response, block):
+    parts = []
+    usage = None
+    for content, chunk_usage in iter_deltas(response.iter_content(chunk_size=block)):
+        if content:
+            parts.append(content)
+        usage = chunk_usage or usage
+    return ''.join(parts), usage
+
+
+def measure(fn, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SSE 解码吞吐测试')
+    parser.add_argument('--chunks', type=int, default=20000, help='模拟的 delta 块数')
+    parser.add_argument('--block', type=int, default=16384, help='每次读取的字节数')
+    args = parser.parse_args()
+
+    body = make_sse_body(args.chunks)
+    mb = len(body) / (1 << 20)
+    events = body.count(b'data: ')
+
+    legacy_time, legacy = measure(lambda: legacy_decode(CannedResponse(body)))
+    new_time, new = measure(lambda: decoder_decode(CannedResponse(body), args.block))
+    if legacy != new:
+        print("[!] 两种实现的解码结果不一致")
+        sys.exit(1)
+
+    print(f"数据量 {mb:.2f} MB，{events} 个事件")
+    print(f"逐行 json.loads：{legacy_time * 1000:.1f} ms（{mb / legacy_time:.1f} MB/s）")
+    print(f"字节块解码器：  {new_time * 1000:.1f} ms（{mb / new_time:.1f} MB/s），"
+          f"{legacy_time / new_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
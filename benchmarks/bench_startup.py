@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动时间测试 - 每个入口脚本在新进程里 import 一次，用 python -X importtime 统计导入耗时
+报告导入总耗时、进程总耗时、最慢的几个模块，以及 rich / requests 这类重模块有没有在启动时被加载
+结果格式和 suite.py 一样，可以保存为基线再比较
+
+用法:
+    python benchmarks/bench_startup.py -o startup.json
+    python benchmarks/bench_startup.py --baseline startup.json --tolerance 0.3
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    "app",
+    "create_cli",
+    "create_batch",
+    "create_print",
+    "create_exam",
+    "add_original",
+    "dedupe_bank",
+    "serve",
+    "create_drill",
+]
+
+# 启动时不应该加载的重模块，用到时才导入
+HEAVY_MODULES = ["rich", "requests", "aiohttp", "urllib3", "email.utils", "concurrent.futures.process"]
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 {模块名: (自身微秒, 累计微秒)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return modules
+
+
+def measure_entry(module):
+    """新开一个进程导入入口模块（入口脚本都有 __main__ 保护，不会真的运行），返回 (导入耗时秒, 进程耗时秒, 模块表)"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr.strip().splitlines()[-1]}")
+    modules = parse_importtime(proc.stderr)
+    return modules.get(module, (0, 0))[1] / 1e6, wall, modules
+
+
+def interpreter_modules():
+    """空解释器启动时就会导入的模块（site 之类），统计最慢模块时排除"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'],
+                          cwd=ROOT, capture_output=True, text=True)
+    return set(parse_importtime(proc.stderr))
+
+
+def run_entry(module, repeat, exclude=()):
+    imports = []
+    walls = []
+    modules = {}
+    for _ in range(repeat):
+        import_time, wall, modules = measure_entry(module)
+        imports.append(import_time)
+        walls.append(wall)
+    # 最慢的模块只看最后一次
+    top = sorted(((name, cum) for name, (_, cum) in modules.items() if name != module and name not in exclude),
+                 key=lambda kv: -kv[1])[:5]
+    return {
+        "median": statistics.median(imports),
+        "min": min(imports),
+        "wall": statistics.median(walls),
+        "runs": repeat,
+        "heavy": [name for name in HEAVY_MODULES if name in modules],
+        "top": [[name, cum / 1e6] for name, cum in top],
+    }
+
+
+def compare(results, baseline, tolerance):
+    """返回变慢超过容差的入口 [(名字, 基线, 当前, 比例)]"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else 1.0
+        if ratio > 1 + tolerance:
+            regressions.append((name, base['median'], result['median'], ratio))
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='入口脚本启动时间测试')
+    parser.add_argument('-o', '--output', help='结果保存为JSON文件')
+    parser.add_argument('--baseline', help='基线结果JSON文件，用来比较')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的变慢比例（默认0.3）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个入口运行次数')
+    parser.add_argument('--filter', help='只测名字包含该字符串的入口')
+    args = parser.parse_args()
+
+    exclude = interpreter_modules()
+    results = {}
+    for module in ENTRY_POINTS:
+        if args.filter and args.filter not in module:
+            continue
+        result = run_entry(module, max(1, args.repeat), exclude)
+        results[module] = result
+        heavy = "、".join(result['heavy']) or "无"
+        print(f"{module:<14} 导入 {result['median'] * 1000:>7.1f} ms   进程 {result['wall'] * 1000:>7.1f} ms   "
+              f"启动时加载的重模块: {heavy}")
+        for name, cum in result['top']:
+            print(f"    {name:<40} {cum * 1000:>7.1f} ms")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.time(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[+] 结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[!] {len(regressions)} 个入口比基线慢超过 {args.tolerance:.0%}:")
+            for name, base, now, ratio in regressions:
+                print(f"    {name}: {base * 1000:.1f} ms -> {now * 1000:.1f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print("[+] 与基线相比没有明显变慢")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地热点路径的微基准测试
+覆盖：SSE 流解析、参考库加载（含检索索引）、提示词组装、代码块 JSON 修复、试卷渲染
+结果输出为 JSON，可以和保存的基线比较，变慢超过容差时返回非 0 退出码
+
+用法:
+    python benchmarks/suite.py -o bench.json                 # 跑一遍并保存结果
+    python benchmarks/suite.py --baseline bench.json         # 和基线比较
+    python benchmarks/suite.py --quick --filter render       # 小规模、只跑部分用例
+"""
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ITEM = {
+    "title": "石壕吏",
+    "poet": "杜甫",
+    "value": "《石壕吏》中，诗人以“{{answer}}，{{answer}}”两句，揭示了普通家庭中男性成员已全部被征调的残酷现实。",
+    "answer": ["三男邺城戍", "一男附书至"],
+}
+
+
+def make_items(size, poems=200):
+    """合成题目，平均分到 poems 首诗，每道题的题干和答案都不一样（打开试卷去重也不会被去掉）"""
+    return [
+        dict(ITEM, title=f"{ITEM['title']}{i % poems}", poet=f"{ITEM['poet']}{i % poems % 37}",
+             value=f"{ITEM['value']}{i}", answer=[f"{a}{i}" for a in ITEM['answer']])
+        for i in range(size)
+    ]
+
+
+class CannedResponse:
+    """回放固定的 SSE 字节流，接口和 requests 的流式响应一致"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def iter_lines(self, chunk_size=512):
+        return iter(self.body.split(b'\n'))
+
+    def iter_content(self, chunk_size=1):
+        # None 表示按网络到达的块读取，这里按 16KB 一块模拟
+        chunk_size = chunk_size or 16384
+        body = self.body
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+
+def make_sse_body(chunks):
+    """模拟模型输出：chunks 段 delta，加上 usage 块和 [DONE]"""
+    text = json.dumps([ITEM] * 20, ensure_ascii=False)
+    step = max(1, len(text) // chunks)
+    lines = [b': keep-alive', b'']
+    for i in range(0, len(text), step):
+        chunk = {"id": "x", "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": {"content": text[i:i + step]}}]}
+        lines.append(b'data: ' + json.dumps(chunk, ensure_ascii=False).encode('utf-8'))
+        lines.append(b'')
+    usage = {"choices": [], "usage": {"prompt_tokens": 1000, "completion_tokens": chunks}}
+    lines += [b'data: ' + json.dumps(usage).encode('utf-8'), b'', b'data: [DONE]', b'']
+    return b'\n'.join(lines)
+
+
+# ---------------- 用例 ----------------
+# 每个用例返回 (准备函数, 被测函数)，准备函数的返回值作为被测函数的参数
+
+def case_sse_decode(chunks):
+    from lib.api import _consume_stream
+    body = make_sse_body(chunks)
+
+    def run(_):
+        return _consume_stream(CannedResponse(body))
+    return (lambda: None), run
+
+
+def _reference_store_setup(size):
+    from lib.refstore import open_reference_store
+
+    def setup():
+        data_dir = tempfile.mkdtemp(prefix='bench-ref-')
+        # 分段设得小一些，合并时才有写满的分段可以并进快照
+        config = {'paths': {'data_dir': data_dir}, 'reference_store': {'fsync': False, 'segment_max_mb': 0.05}}
+        # 参考库按批次追加，每批 50 条，合并一次后快照和分段都有
+        items = make_items(size)
+        store = open_reference_store(config)
+        for i in range(0, size, 50):
+            store.append(items[i:i + 50])
+        assert store.compact(), "没有合并出快照"
+        return config
+    return setup
+
+
+def case_load_reference(size):
+    from lib.generator import load_reference_data
+    return _reference_store_setup(size), load_reference_data
+
+
+def case_load_reference_index(size):
+    """加载参考库并得到检索索引：快照部分读合并时存下的索引"""
+    from lib.generator import load_reference_index
+
+    def run(config):
+        index = load_reference_index(config)
+        assert len(index) == size, f"索引了 {len(index)} 条，应为 {size} 条"
+        return index
+    return _reference_store_setup(size), run
+
+
+def case_prompt_assembly(size):
+    from lib.generator import build_messages
+    from lib.retrieval import ReferenceIndex
+
+    def setup():
+        return ReferenceIndex(make_items(size))
+
+    def run(index):
+        examples = index.search("杜甫3", "石壕吏3")
+        return build_messages("杜甫3", "石壕吏3", 5, "0.9", examples)
+    return setup, run
+
+
+def case_fence_repair(size):
+    from lib.generator import _parse_result
+    text = "好的，下面是题目：\n```json\n" + json.dumps(make_items(size), ensure_ascii=False) + "\n```"
+
+    def run(_):
+        return _parse_result(text)
+    return (lambda: None), run
+
+
+def case_render_papers(size):
+    from lib.printer import group_by_poem, render_test_papers
+
+    def setup():
+        data_dir = tempfile.mkdtemp(prefix='bench-render-')
+        json_file = os.path.join(data_dir, 'generated.json')
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(make_items(size), f, ensure_ascii=False)
+        return data_dir, json_file
+
+    def run(paths):
+        # 和 generate_test_papers 一样：读 JSON、按诗分组、渲染，只是输出到临时目录
+        data_dir, json_file = paths
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        count = render_test_papers(group_by_poem(data).items(),
+                                   os.path.join(data_dir, 'paper.html'), os.path.join(data_dir, 'answer.html'))
+        assert count == size, f"渲染了 {count} 题，应为 {size} 题"
+    return setup, run
+
+
+def build_cases(quick):
+    sizes = [1000, 10000] if quick else [1000, 10000, 100000]
+    cases = [(f"sse_decode[{n}]", case_sse_decode(n)) for n in (200, 2000)]
+    cases += [(f"load_reference[{n}]", case_load_reference(n)) for n in sizes]
+    cases += [(f"load_reference_index[{n}]", case_load_reference_index(n)) for n in sizes]
+    cases += [(f"prompt_assembly[{n}]", case_prompt_assembly(n)) for n in sizes]
+    cases += [(f"fence_repair[{n}]", case_fence_repair(n)) for n in (10, 1000)]
+    cases += [(f"render_papers[{n}]", case_render_papers(n)) for n in sizes]
+    return cases
+
+
+# ---------------- 运行和比较 ----------------
+
+def run_case(setup, fn, repeat, min_time):
+    """先跑一次预热，再至少跑 repeat 次、累计不少于 min_time 秒，取中位数"""
+    arg = setup()
+    fn(arg)
+    times = []
+    total = 0.0
+    while len(times) < repeat or total < min_time:
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+        if len(times) >= repeat * 20:
+            break
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "runs": len(times),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """返回变慢超过容差的用例 [(名字, 基线, 当前, 比例)]"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else 1.0
+        if ratio > 1 + tolerance:
+            regressions.append((name, base['median'], result['median'], ratio))
+    return regressions
+
+
+def _quiet_consoles():
+    """基准测试时关掉 lib 里 rich 的输出"""
+    from lib.console import get_console
+    get_console().quiet = True
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地热点路径微基准测试')
+    parser.add_argument('-o', '--output', help='结果保存为JSON文件')
+    parser.add_argument('--baseline', help='基线结果JSON文件，用来比较')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的变慢比例（默认0.25）')
+    parser.add_argument('--filter', help='只跑名字包含该字符串的用例')
+    parser.add_argument('--quick', action='store_true', help='小规模快速跑一遍')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例最少运行次数')
+    parser.add_argument('--min-time', type=float, default=0.2, help='每个用例最少累计运行秒数')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_file = os.path.abspath(args.baseline) if args.baseline else None
+
+    # 在临时目录里运行，config.json 和输出文件都不碰项目目录
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    tempfile.tempdir = work_dir
+    os.chdir(work_dir)
+    with open('config.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            "api": {"url": "", "token": "", "model": "bench"},
+            "paths": {"data_dir": work_dir, "output_dir": os.path.join(work_dir, 'output')},
+            "cache": {"enabled": False},
+        }, f)
+    _quiet_consoles()
+
+    results = {}
+    try:
+        for name, (setup, fn) in build_cases(args.quick):
+            if args.filter and args.filter not in name:
+                continue
+            result = run_case(setup, fn, args.repeat, args.min_time)
+            results[name] = result
+            print(f"{name:<28} 中位数 {result['median'] * 1000:>10.3f} ms   "
+                  f"最快 {result['min'] * 1000:>10.3f} ms   ({result['runs']} 次)")
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.time(),
+        "results": results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[+] 结果已保存: {output}")
+
+    if baseline_file:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[!] {len(regressions)} 个用例比基线慢超过 {args.tolerance:.0%}:")
+            for name, base, now, ratio in regressions:
+                print(f"    {name}: {base * 1000:.3f} ms -> {now * 1000:.3f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print("[+] 与基线相比没有明显变慢")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量生成 - 按任务文件并发生成多首诗的题目，合并输出
+任务文件每行一条：诗人,诗名,数量,难度（也支持JSON数组）
+每个任务的进度记录在 data/jobs.db，中途崩溃或 Ctrl-C 后用同一个任务文件重新运行，只做没完成的任务
+"""
+
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lib.config import load_config, ensure_dirs
+from lib.batch import load_jobs, generate_batch, get_batch_workers
+from lib.generator import save_generated_data, save_to_bank
+from lib.jobstore import open_job_store, run_id_for
+from lib.cache import get_response_cache
+from lib.metrics import get_aggregator, format_summary
+from lib.concurrency import get_limiter, format_concurrency
+from lib.printer import generate_test_papers
+from lib.console import console, get_console
+
+
+def _run(args, config, jobs, store, run_id):
+    from rich.progress import Progress, BarColumn, TextColumn, MofNCompleteColumn, TimeElapsedColumn
+
+    workers = args.workers or get_batch_workers(config)
+    limiter = get_limiter(config)
+    if limiter is not None:
+        snapshot = limiter.snapshot()
+        console.print(
+            f"[dim]共 {len(jobs)} 个任务，线程数 {workers}，"
+            f"自适应并发从 {snapshot['limit']} 开始（范围 {snapshot['min']}~{snapshot['max']}）[/dim]"
+        )
+    else:
+        console.print(f"[dim]共 {len(jobs)} 个任务，并发数 {workers}[/dim]")
+
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        console=get_console(),
+    ) as progress:
+        completed = store.counts(run_id)['done'] if store is not None else 0
+        task = progress.add_task("[cyan]批量生成中...[/cyan]", total=len(jobs), completed=completed)
+
+        def on_progress(record, done, total):
+            job = record['job']
+            if record['ok']:
+                progress.console.print(
+                    f"[green]✓[/green] {job['poet']}《{job['poem']}》 "
+                    f"{len(record['items'])} 题 [dim]{record['elapsed']:.1f}s[/dim]"
+                )
+            else:
+                progress.console.print(
+                    f"[red]✗[/red] {job['poet']}《{job['poem']}》 [dim]{record['error']}[/dim]"
+                )
+            progress.advance(task)
+            if limiter is not None:
+                progress.update(task, description=f"[cyan]批量生成中（并发上限 {limiter.snapshot()['limit']}）...[/cyan]")
+
+        items, records = generate_batch(
+            jobs, workers=workers, progress_callback=on_progress, refresh=args.refresh,
+            store=store, run_id=run_id,
+        )
+
+    failed = [r for r in records if not r['ok']]
+    resumed = sum(1 for r in records if r['resumed'])
+    console.print(
+        f"[bold]完成[/bold] 成功 {len(records) - len(failed)} / {len(records)}，"
+        f"共 [bold]{len(items)}[/bold] 道题目"
+        + (f"（其中 {resumed} 个任务是上次完成的）" if resumed else "")
+    )
+    if failed and store is not None:
+        console.print("[dim]失败的任务已记录，重新运行同一命令只重试这些任务[/dim]")
+    cache = get_response_cache(config)
+    if cache is not None:
+        stats = cache.stats()
+        console.print(
+            f"[dim]缓存命中 {stats['hits']}，未命中 {stats['misses']}，"
+            f"命中率 {stats['hit_rate']:.0%}[/dim]"
+        )
+    for line in format_summary(get_aggregator().summary()):
+        console.print(f"[dim]{line}[/dim]")
+    if limiter is not None:
+        console.print(f"[dim]{format_concurrency(limiter.snapshot())}[/dim]")
+
+    if not items:
+        return
+
+    # 每个任务按各自的难度入库；有任务队列时带上任务的幂等键，续跑时已经入库的任务不会重复写入
+    for record in records:
+        if record['items']:
+            key = store.import_key(run_id, record['index']) if store is not None else None
+            save_to_bank(record['items'], config, record['job']['difficulty'], import_key=key)
+
+    if args.output:
+        try:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False, indent=4)
+            console.print(f"[green]✓[/green] 数据已保存: [dim]{args.output}[/dim]")
+        except Exception as e:
+            console.print(f"[red]✗ 保存数据失败: {e}[/red]")
+            return
+        json_file = args.output
+    else:
+        if not save_generated_data(items, config, to_bank=False):
+            return
+        json_file = None
+
+    if not args.no_print:
+        generate_test_papers(json_file)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='批量并发生成诗词默写题目')
+    parser.add_argument('job_file', help='任务文件（每行：诗人,诗名,数量,难度；或JSON数组）')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='线程数（默认读取config.json的batch.workers，开启自适应并发时不超过concurrency.max）')
+    parser.add_argument('-o', '--output', default=None, help='合并结果输出文件（默认保存到data/generated.json）')
+    parser.add_argument('--no-print', action='store_true', help='只生成数据，不生成试卷')
+    parser.add_argument('--refresh', action='store_true', help='忽略本地缓存和上次的进度，全部重新请求')
+    parser.add_argument('--restart', action='store_true', help='丢弃这份任务文件上次的进度，从头开始')
+    parser.add_argument('--no-queue', action='store_true', help='不记录进度（中途退出后要全部重做）')
+    args = parser.parse_args()
+
+    config = load_config()
+    ensure_dirs(config)
+
+    try:
+        jobs = load_jobs(args.job_file)
+    except FileNotFoundError:
+        console.print(f"[red]✗ 任务文件不存在: {args.job_file}[/red]")
+        return
+    except (ValueError, json.JSONDecodeError) as e:
+        console.print(f"[red]✗ 任务文件格式错误: {e}[/red]")
+        return
+
+    if not jobs:
+        console.print("[yellow]⚠ 任务文件为空[/yellow]")
+        return
+
+    store = None
+    run_id = None
+    if not args.no_queue:
+        store = open_job_store(config)
+        if args.restart or args.refresh:
+            store.discard(run_id_for(jobs))
+        run_id, resumed = store.open_run(jobs, source=os.path.abspath(args.job_file))
+        counts = store.counts(run_id)
+        if resumed and counts['done'] == len(jobs):
+            console.print("[cyan]这份任务文件上次已经全部完成，直接使用上次的结果（要重新生成请加 --restart）[/cyan]")
+        elif resumed:
+            console.print(
+                f"[cyan]接着上次的进度：已完成 {counts['done']} / {len(jobs)}，"
+                f"这次做剩下的 {len(jobs) - counts['done']} 个任务[/cyan]"
+            )
+
+    try:
+        _run(args, config, jobs, store, run_id)
+    except KeyboardInterrupt:
+        console.print()
+        if store is not None:
+            counts = store.counts(run_id)
+            console.print(
+                f"[yellow]⚠ 已中断，完成 {counts['done']} / {len(jobs)} 个任务，"
+                f"用同样的命令重新运行会接着做剩下的[/yellow]"
+            )
+        else:
+            console.print("[yellow]⚠ 已中断[/yellow]")
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from lib.config import load_config, ensure_dirs
 from lib.generator import generate_questions, save_generated_data
 from lib.printer import generate_test_papers
+from lib.metrics import get_aggregator, format_prompt_cache
 
 
 def main():
@@ -36,9 +37,13 @@ def main():
     if result is None:
         print("[!] 生成失败")
         return
+
+    summary = get_aggregator().summary()
+    if summary['prompt_cache_hit_rate'] is not None:
+        print(f"[*] {format_prompt_cache(summary)}")
     
     # 保存数据
-    if save_generated_data(result, config):
+    if save_generated_data(result, config, difficulty):
         print("[*] 正在生成试卷...")
         test_file, answer_file = generate_test_papers()
         
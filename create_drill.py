@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线出题 - 从本地诗文全文语料切出上句/下句默写题，不调用 API
+语料可以是 JSON（[{poet, title, content}] 或 {诗人: {诗名: 全文}}）、JSONL、文本或目录
+"""
+
+import json
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lib.config import load_config, ensure_dirs
+from lib.drill import drills_from_corpus, MODES
+from lib.generator import save_generated_data, save_to_bank
+from lib.printer import generate_test_papers
+from lib.console import console
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='从本地语料离线生成上句/下句默写题')
+    parser.add_argument('corpus', help='诗文全文语料文件或目录')
+    parser.add_argument('--poet', help='只出这位诗人的诗')
+    parser.add_argument('--title', help='只出这首诗')
+    parser.add_argument('--modes', help=f"题型，逗号分隔：{','.join(MODES)}（默认用配置 drill.modes）")
+    parser.add_argument('-n', '--per-poem', type=int, help='每首诗最多出几题，0 表示全部（默认用配置 drill.per_poem）')
+    parser.add_argument('--difficulty', help='题目标记的难度（默认用配置 drill.difficulty）')
+    parser.add_argument('--seed', type=int, help='抽题的随机种子')
+    parser.add_argument('-o', '--output', default=None, help='结果输出文件（默认保存到data/generated.json）')
+    parser.add_argument('--to-bank', action='store_true', help='同时加入题库')
+    parser.add_argument('--no-print', action='store_true', help='只生成数据，不生成试卷')
+    args = parser.parse_args()
+
+    modes = None
+    if args.modes:
+        modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown:
+            parser.error(f"未知题型: {','.join(unknown)}")
+
+    config = load_config()
+    ensure_dirs(config)
+
+    start = time.perf_counter()
+    items = drills_from_corpus(
+        args.corpus, poet=args.poet, title=args.title, modes=modes,
+        per_poem=args.per_poem, difficulty=args.difficulty, seed=args.seed,
+    )
+    elapsed = time.perf_counter() - start
+    if not items:
+        if items is not None:
+            console.print("[yellow]⚠ 没有生成任何题目[/yellow]")
+        return
+
+    poems = len({(item['poet'], item['title']) for item in items})
+    console.print(
+        f"[green]✓[/green] 从 {poems} 首诗生成 [bold]{len(items)}[/bold] 道题目，"
+        f"用时 {elapsed * 1000:.0f}ms（每秒 {len(items) / max(elapsed, 1e-9):,.0f} 题）"
+    )
+
+    if args.output:
+        try:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False, indent=4)
+            console.print(f"[green]✓[/green] 数据已保存: [dim]{args.output}[/dim]")
+        except Exception as e:
+            console.print(f"[red]✗ 保存数据失败: {e}[/red]")
+            return
+        if args.to_bank:
+            save_to_bank(items, config)
+        json_file = args.output
+    else:
+        if not save_generated_data(items, config, to_bank=args.to_bank):
+            return
+        json_file = None
+
+    if not args.no_print:
+        generate_test_papers(json_file)
+
+
+if __name__ == "__main__":
+    main()
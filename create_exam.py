@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+从题库组多份平行试卷（A/B/C 卷），每份生成一对试卷和答案
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lib.exam import assemble_exams, parse_mix
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='从题库组多份平行试卷')
+    parser.add_argument('--variants', type=int, help='组几份卷子（默认用配置 exam.variants）')
+    parser.add_argument('--score', type=int, help='每份卷子总分（默认用配置 exam.total_score）')
+    parser.add_argument('--mix', help='难度占比，比如 0.9=0.5,0.5=0.3,0.2=0.2')
+    parser.add_argument('--min-per-poem', type=int, help='每首诗至少出几题')
+    parser.add_argument('--seed', type=int, help='随机种子，相同种子组出相同的卷子')
+    parser.add_argument('--poet', help='题库筛选：诗人')
+    parser.add_argument('--title', help='题库筛选：诗名')
+    parser.add_argument('--difficulty', nargs='+', help='题库筛选：难度（可多个）')
+    parser.add_argument('--days', type=float, help='题库筛选：只选最近几天生成的题目')
+    args = parser.parse_args()
+
+    mix = None
+    if args.mix:
+        try:
+            mix = parse_mix(args.mix)
+        except ValueError as e:
+            parser.error(str(e))
+
+    bank_query = {
+        'poet': args.poet,
+        'title': args.title,
+        'difficulty': args.difficulty,
+        'since': time.time() - args.days * 86400 if args.days else None,
+    }
+
+    assemble_exams(
+        variants=args.variants,
+        total_score=args.score,
+        mix=mix,
+        min_per_poem=args.min_per_poem,
+        seed=args.seed,
+        bank_query=bank_query,
+    )
+
+
+if __name__ == "__main__":
+    main()
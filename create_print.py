@@ -6,20 +6,58 @@
 
 import sys
 import os
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from lib.printer import generate_test_papers
+from lib.printer import generate_test_papers, load_question_groups
+from lib.student_papers import generate_student_papers, load_roster, numbered_roster
 
 
 def main():
     import argparse
+    import multiprocessing
+
+    # 打包成 exe 后进程池需要这一句
+    multiprocessing.freeze_support()
     
     parser = argparse.ArgumentParser(description='生成诗词默写试卷和答案')
     parser.add_argument('input_file', nargs='?', help='输入的JSON文件路径（默认使用data/generated.json）')
+    parser.add_argument('--bank', action='store_true', help='从题库选题，而不是读取JSON文件')
+    parser.add_argument('--poet', help='题库筛选：诗人')
+    parser.add_argument('--title', help='题库筛选：诗名')
+    parser.add_argument('--difficulty', nargs='+', help='题库筛选：难度（可多个）')
+    parser.add_argument('--days', type=float, help='题库筛选：只选最近几天生成的题目')
+    parser.add_argument('--limit', type=int, help='题库筛选：最多选多少题')
+    parser.add_argument('--students', type=int, help='学生个人卷：按人数生成，每人一份打乱顺序的卷子')
+    parser.add_argument('--roster', help='学生个人卷：学生名单文件（每行 学号,姓名）')
+    parser.add_argument('--seed', type=int, help='学生个人卷：考试种子（默认用配置 student_papers.seed）')
+    parser.add_argument('--workers', type=int, help='学生个人卷：渲染进程数（默认按 CPU 核数）')
     args = parser.parse_args()
     
-    test_file, answer_file = generate_test_papers(args.input_file)
+    bank_query = None
+    if args.bank:
+        bank_query = {
+            'poet': args.poet,
+            'title': args.title,
+            'difficulty': args.difficulty,
+            'since': time.time() - args.days * 86400 if args.days else None,
+            'limit': args.limit,
+        }
+    
+    if args.students or args.roster:
+        try:
+            students = load_roster(args.roster) if args.roster else numbered_roster(args.students)
+        except OSError as e:
+            parser.error(f'读取学生名单失败: {e}')
+        if not students:
+            parser.error('学生名单为空')
+        groups = load_question_groups(args.input_file, bank_query=bank_query)
+        if groups:
+            generate_student_papers(groups, students, seed=args.seed, workers=args.workers)
+        return
+
+    test_file, answer_file = generate_test_papers(args.input_file, bank_query=bank_query)
     
     if test_file and answer_file and sys.platform == 'win32':
         os.system(f'start "" "{test_file}"')
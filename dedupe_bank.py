@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题库去重 - 一次遍历找出近似重复的题目（改写的题干、同一组答案），可选直接删除
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lib.config import load_config
+from lib.bank import open_bank, get_bank_path
+from lib.dedup import DEFAULT_THRESHOLD
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='题库近似重复检测')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='题干相似度阈值（0-1）')
+    parser.add_argument('--delete', action='store_true', help='删除检出的重复题（保留先入库的）')
+    args = parser.parse_args()
+
+    config = load_config()
+    bank_file = get_bank_path(config)
+    if not os.path.exists(bank_file):
+        print(f"[!] 题库不存在: {bank_file}")
+        return
+
+    with open_bank(config) as bank:
+        total = bank.count()
+        start = time.perf_counter()
+        duplicates = bank.find_duplicates(threshold=args.threshold)
+        elapsed = time.perf_counter() - start
+        print(f"[*] 共 {total} 题，检出重复 {len(duplicates)} 题，用时 {elapsed:.1f}s")
+
+        if duplicates and args.delete:
+            deleted = bank.delete(dup for dup, _ in duplicates)
+            print(f"[+] 已删除 {deleted} 道重复题")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,711 @@
-import requests
-import json
 import os
-from .config import load_config, get_api_token, should_show_ai_response
+import queue
+import threading
+import time
+import weakref
+from .config import load_config, should_show_ai_response
+from .concurrency import get_limiter
+from .cache import get_response_cache, make_cache_key
+from .endpoints import get_endpoint_pool, get_pool_settings, is_failover_status
+from .metrics import CallTimer, configure_metrics
+from .retry import get_retry_settings, parse_retry_after, backoff_delay, hedge_delay
+from .sse import SSEDecoder, extract_delta, iter_deltas
 
+# 共享的连接池，所有调用复用同一个 Session，省掉每次的 TCP/TLS 握手
+_session = None
+_session_settings = None
+_session_lock = threading.Lock()
 
-def api_single(value: list[dict[str, str]], stream_callback=None, temp=0.2):
+# 异步 Session 绑定在事件循环上，每个循环一份
+_async_sessions = weakref.WeakKeyDictionary()
+
+DEFAULT_HTTP_SETTINGS = {
+    "pool_size": 10,
+    "connect_timeout": 10,
+    "read_timeout": 60
+}
+
+
+def get_http_settings(config):
+    """读取连接池和超时配置，缺省的项用默认值"""
+    http_config = config.get('http', {})
+    settings = {}
+    for key, default in DEFAULT_HTTP_SETTINGS.items():
+        try:
+            settings[key] = type(default)(http_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['pool_size'] = max(1, settings['pool_size'])
+    return settings
+
+
+def get_session(config=None):
     """
-    调用 AI API，支持流式传输
-    现在从config.json读取配置，不再硬编码
+    获取共享的 requests.Session（keep-alive + 连接池）
+    配置里的连接池大小变了会自动重建
     """
-    config = load_config()
-    
-    # 获取API Token
-    api_key = get_api_token(config)
-    if not api_key:
-        print("[!] 错误: API Token 未设置")
-        print("    请设置以下之一:")
-        print("    1. 环境变量 DEEPSEEK_API_KEY 或 OPENAI_API_KEY")
-        print("    2. 在 config.json 中填写 api.token")
-        return None
+    global _session, _session_settings
+    if config is None:
+        config = load_config()
+    settings = get_http_settings(config)
 
-    # 从配置读取API地址和模型
-    api_config = config.get('api', {})
-    url = api_config.get('url', 'https://api.deepseek.com/v1/chat/completions')
-    model = api_config.get('model', 'deepseek-chat')
-    show_response = should_show_ai_response(config)
+    with _session_lock:
+        if _session is None or _session_settings != settings:
+            # requests 加载要上百毫秒，第一次发请求时才导入，程序启动时不用等
+            import requests
+            from requests.adapters import HTTPAdapter
 
-    # 构造请求头
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+            if _session is not None:
+                _session.close()
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings['pool_size'],
+                pool_maxsize=settings['pool_size']
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+            _session_settings = settings
+        return _session
+
+
+def close_session():
+    """关闭共享连接池（一般在程序退出时调用）"""
+    global _session, _session_settings
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_settings = None
 
-    # 构造请求体
-    data = {
+
+def _print_missing_token():
+    print("[!] 错误: API Token 未设置")
+    print("    请设置以下之一:")
+    print("    1. 环境变量 DEEPSEEK_API_KEY 或 OPENAI_API_KEY")
+    print("    2. 在 config.json 中填写 api.token（或 api.endpoints 里每个接口的 token）")
+
+
+def _build_payload(value, temp, model):
+    """构造请求体，发给哪个接口时再填对应的 model"""
+    return {
         "model": model,
         "messages": [item for item in value],
         "temperature": temp,
         "stream": True,
+        # 让最后一块带上 token 用量，用于统计
+        "stream_options": {"include_usage": True},
         'type': 'json_object'
     }
 
+
+def _build_headers(token):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def _emit_delta(content, usage, parts, stream_callback, show_response, timer):
+    """处理一段增量内容：计时、拼接、打印，返回回调的返回值"""
+    if timer is not None:
+        timer.on_usage(usage)
+    if not content:
+        return None
+    if timer is not None:
+        timer.on_chunk(content)
+    parts.append(content)
+    # 根据配置决定是否实时打印
+    if show_response:
+        print(content, end='', flush=True)
+    # 如果有回调函数，也调用一下
+    if stream_callback:
+        return stream_callback(content)
+    return None
+
+
+def _consume_stream(response, stream_callback=None, show_response=False, timer=None):
+    """读完一个流式响应，返回拼好的完整内容"""
+    parts = []
+    # chunk_size=None 时按网络到达的块读取，不会为了凑满固定大小而等待
+    for content, usage in iter_deltas(response.iter_content(chunk_size=None)):
+        _emit_delta(content, usage, parts, stream_callback, show_response, timer)
+    return ''.join(parts)
+
+
+def _report_http_error(response):
+    """打印非 200 响应的内容，返回 (结果, 状态, 附加信息)，结果含义见 _stream_once"""
+    print(f"[!] 请求失败，状态码: {response.status_code}")
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=60, stream=True)
-        
-        if response.status_code == 200:
-            full_message = ""
-            # 逐行读取流式响应
-            for line in response.iter_lines():
-                if line:
-                    line_text = line.decode('utf-8')
-                    # SSE 格式以 "data: " 开头
-                    if line_text.startswith('data: '):
-                        json_str = line_text[6:]  # 去掉 "data: " 前缀
-                        if json_str == '[DONE]':
-                            break
-                        try:
-                            chunk = json.loads(json_str)
-                            # 提取 delta 中的 content
-                            delta = chunk.get('choices', [{}])[0].get('delta', {})
-                            content = delta.get('content', '')
-                            if content:
-                                full_message += content
-                                # 根据配置决定是否实时打印
-                                if show_response:
-                                    print(content, end='', flush=True)
-                                # 如果有回调函数，也调用一下
-                                if stream_callback:
-                                    stream_callback(content)
-                        except json.JSONDecodeError:
-                            continue
-            
-            if show_response:
-                print()  # 最后换行
-                print("=" * 50)
-            
-            return full_message.strip()
-        else:
-            print(f"[!] 请求失败，状态码: {response.status_code}")
-            try:
-                error_detail = response.json()
-                print(f"[!] 错误详情: {error_detail}")
-            except:
-                print(f"[!] 响应内容: {response.text[:200]}")
-            return None
+        error_detail = response.json()
+        print(f"[!] 错误详情: {error_detail}")
+    except:
+        print(f"[!] 响应内容: {response.text[:200]}")
+    status = f"http_{response.status_code}"
+    if not is_failover_status(response.status_code):
+        return 'error', status, {}
+    detail = {}
+    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+    if retry_after is not None:
+        detail['retry_after'] = retry_after
+    return 'failover', status, detail
+
+
+def _stream_once(session, pool, endpoint, data, timeout, stream_callback, show_response, timer):
+    """
+    向一个接口发一次请求并读完流，结束时归还接口并报告是否健康
+    返回 (结果, 内容或状态, 附加信息)，结果是：
+      'ok'       内容是完整回复
+      'failover' 限流、服务端错误或网络问题，可以换个接口或稍后再试，附加信息里可能有 retry_after
+      'error'    重试也没用的错误
+    """
+    import requests
+
+    success = None
+    rate_limited = False
+    try:
+        with session.post(endpoint.url, headers=_build_headers(endpoint.token), json=data,
+                          timeout=timeout, stream=True) as response:
+            if response.status_code == 200:
+                full_message = _consume_stream(response, stream_callback, show_response, timer)
+                success = True
+                return 'ok', full_message, {}
+
+            kind, status, detail = _report_http_error(response)
+            if kind == 'failover':
+                success = False
+                rate_limited = response.status_code == 429
+            return kind, status, detail
 
     except requests.exceptions.RequestException as e:
+        success = False
         print(f"[!] 网络或请求错误: {e}")
+        return 'failover', 'network_error', {"error": str(e)}
+    except Exception as e:
+        print(f"[!] 未知错误: {e}")
+        return 'error', 'error', {"error": str(e)}
+    finally:
+        pool.release(endpoint, success, rate_limited)
+
+
+class _HedgeRace:
+    """对冲请求的几路之间谁先出内容谁赢，各路的内容和结束事件都放进同一个队列"""
+
+    def __init__(self):
+        self.winner = None
+        self.events = queue.Queue()
+        self._lock = threading.Lock()
+
+    def claim(self, attempt):
+        """attempt 收到首个内容时调用，返回它是不是赢家"""
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+            return self.winner is attempt
+
+
+class _HedgeAttempt(threading.Thread):
+    """对冲请求里的一路，在后台线程读流，内容交给调用线程处理"""
+
+    def __init__(self, race, session, pool, endpoint, data, timeout):
+        super().__init__(daemon=True)
+        self.race = race
+        self.session = session
+        self.pool = pool
+        self.endpoint = endpoint
+        self.data = dict(data, model=endpoint.model)
+        self.timeout = timeout
+        self.cancelled = False
+        self._response = None
+
+    def cancel(self):
+        """输掉的一路直接断开连接，服务端也就不再继续生成"""
+        self.cancelled = True
+        response = self._response
+        if response is not None:
+            # 读流的线程还拿着连接的锁，在这里关会一直等到它读到下一块，所以放到后台去关
+            threading.Thread(target=response.close, daemon=True).start()
+
+    def run(self):
+        import requests
+
+        success = None
+        rate_limited = False
+        outcome = ('error', 'error', {})
+        try:
+            with self.session.post(self.endpoint.url, headers=_build_headers(self.endpoint.token),
+                                   json=self.data, timeout=self.timeout, stream=True) as response:
+                self._response = response
+                if self.cancelled:
+                    pass
+                elif response.status_code == 200:
+                    for content, usage in iter_deltas(response.iter_content(chunk_size=None)):
+                        if self.cancelled or (content and not self.race.claim(self)):
+                            self.cancelled = True
+                            break
+                        self.race.events.put(('delta', self, (content, usage)))
+                    success = True
+                    outcome = ('ok', '', {})
+                else:
+                    outcome = _report_http_error(response)
+                    if outcome[0] == 'failover':
+                        success = False
+                        rate_limited = response.status_code == 429
+        except requests.exceptions.RequestException as e:
+            if not self.cancelled:
+                success = False
+                print(f"[!] 网络或请求错误: {e}")
+                outcome = ('failover', 'network_error', {"error": str(e)})
+        except Exception as e:
+            if not self.cancelled:
+                print(f"[!] 未知错误: {e}")
+                outcome = ('error', 'error', {"error": str(e)})
+        finally:
+            if self.cancelled:
+                # 被主动断开的一路不算接口的成败
+                success = None
+                outcome = ('cancelled', 'cancelled', {})
+            self.pool.release(self.endpoint, success, rate_limited)
+            self.race.events.put(('done', self, outcome))
+
+
+def _stream_hedged(session, pool, first, data, timeout, delay, exclude, stream_callback, show_response, timer):
+    """
+    对冲请求：先向 first 发请求，delay 秒内没收到首个内容就再发一路（优先换个接口）
+    谁先出内容用谁，另一路立即断开
+    返回 (结果, 内容或状态, 附加信息, 用到的接口列表)，前三项含义和 _stream_once 一致
+    """
+    race = _HedgeRace()
+    attempts = [_HedgeAttempt(race, session, pool, first, data, timeout)]
+    attempts[0].start()
+    deadline = time.monotonic() + delay
+    hedged = False
+    parts = []
+    outcomes = {}
+
+    while True:
+        wait = None
+        if not hedged and race.winner is None:
+            wait = max(0.0, deadline - time.monotonic())
+        try:
+            event, attempt, payload = race.events.get(timeout=wait)
+        except queue.Empty:
+            hedged = True
+            endpoint, _ = pool.try_acquire(exclude=list(exclude) + [first])
+            if endpoint is None:
+                # 没有别的接口可用时向同一个接口再发一路
+                endpoint, _ = pool.try_acquire()
+            if endpoint is not None:
+                attempt = _HedgeAttempt(race, session, pool, endpoint, data, timeout)
+                attempts.append(attempt)
+                attempt.start()
+            continue
+
+        if event == 'delta':
+            if attempt is race.winner:
+                content, usage = payload
+                _emit_delta(content, usage, parts, stream_callback, show_response, timer)
+            continue
+
+        outcomes[attempt] = payload
+        # 一个内容都没有的成功响应也算赢
+        if attempt is race.winner or (payload[0] == 'ok' and race.claim(attempt)):
+            for other in attempts:
+                if other is not attempt:
+                    other.cancel()
+            kind, result, detail = payload
+            if kind == 'ok':
+                result = ''.join(parts)
+            detail = dict(detail, endpoint=attempt.endpoint.name)
+            if len(attempts) > 1:
+                detail['hedged'] = True
+            return kind, result, detail, [a.endpoint for a in attempts]
+
+        if len(outcomes) == len(attempts):
+            # 每一路都失败了（或者还没到对冲时间就失败了），按最后一个结果返回，交给外面的重试逻辑
+            kind, result, detail = payload
+            detail = dict(detail, endpoint=attempt.endpoint.name)
+            if len(attempts) > 1:
+                detail['hedged'] = True
+            return kind, result, detail, [a.endpoint for a in attempts]
+
+
+def _request_with_retry(config, pool, session, data, timeout, acquire_timeout, stream_callback, show_response, timer):
+    """
+    按重试策略发请求：先换接口，所有接口都失败后退避再来一轮，开启对冲时首字太慢再发一路
+    返回 (状态, 完整内容或 None, 附加到指标记录上的信息)
+    """
+    retry = get_retry_settings(config)
+    tried = []          # 这一轮已经试过的接口
+    attempts = 0
+    rounds = 0
+    retry_after = None
+    status, extra = 'no_endpoint', {}
+    while attempts < retry['max_attempts']:
+        endpoint = pool.acquire(exclude=tried, timeout=acquire_timeout)
+        if endpoint is None:
+            wait = 0.0
+            if not tried:
+                # 一个接口都拿不到（全部熔断或并发已满）也算一次尝试，退避后再来；
+                # 熔断的接口至少等到能试探，要等的时间超过退避上限或次数用完才放弃
+                attempts += 1
+                wait = pool.reopen_delay()
+                if attempts >= retry['max_attempts'] or wait > retry['max_delay']:
+                    print("[!] 没有可用的接口（全部熔断或并发已满）")
+                    break
+            # 能用的接口这一轮都失败了，退避一会儿再来一轮，服务端给了 Retry-After 就至少等这么久
+            rounds += 1
+            delay = max(wait, backoff_delay(rounds, retry, retry_after))
+            print(f"[*] {delay:.1f} 秒后重试")
+            time.sleep(delay)
+            tried = []
+            retry_after = None
+            continue
+
+        tried.append(endpoint)
+        attempts += 1
+        data['model'] = endpoint.model
+        extra = {"endpoint": endpoint.name, "attempts": attempts}
+
+        hedge = hedge_delay(retry, data['model'])
+        if hedge is None:
+            kind, result, detail = _stream_once(session, pool, endpoint, data, timeout,
+                                                stream_callback, show_response, timer)
+        else:
+            kind, result, detail, used = _stream_hedged(session, pool, endpoint, data, timeout, hedge, tried,
+                                                        stream_callback, show_response, timer)
+            attempts += len(used) - 1
+            tried.extend(other for other in used if other not in tried)
+        if detail.get('retry_after') is not None:
+            retry_after = max(retry_after or 0.0, detail.pop('retry_after'))
+        extra.update(detail, attempts=attempts)
+
+        if kind == 'ok':
+            return 'ok', result, extra
+
+        status = result
+        # 已经有内容交给回调了就不能再重试，否则回调会收到重复的内容
+        if kind != 'failover' or timer.chunks:
+            break
+        if attempts < retry['max_attempts'] and len(tried) < len(pool.endpoints):
+            print(f"[*] 接口 {endpoint.name} 不可用，切换其他接口重试")
+
+    return status, None, extra
+
+
+def _lookup_cache(config, data, temp, use_cache, refresh):
+    """
+    查本地结果缓存，同步和异步调用共用，返回 (缓存, 缓存键, 命中的结果)
+    不用缓存时缓存和键都是 None；refresh=True 时不读缓存，结果照常写回
+    """
+    cache = get_response_cache(config) if use_cache else None
+    if cache is None:
+        return None, None, None
+    cache_key = make_cache_key(data['messages'], data['model'], temp)
+    return cache, cache_key, None if refresh else cache.get(cache_key)
+
+
+def api_single(value: list[dict[str, str]], stream_callback=None, temp=0.2, show_response=None,
+               use_cache=True, refresh=False, tags=None):
+    """
+    调用 AI API，支持流式传输
+    现在从config.json读取配置，不再硬编码
+    show_response 为 None 时按配置决定是否实时打印，批量并发时可传 False 避免输出混在一起
+    use_cache: 是否使用本地结果缓存；refresh=True 时跳过读缓存，重新请求并覆盖
+    tags: 附加到本次调用指标记录上的标签，比如 {"poet": ..., "poem": ...}
+    配置了多个接口（api.endpoints）时按权重分配，遇到限流、服务端错误或超时且还没收到内容时换一个接口重试
+    所有接口都失败时按 retry 配置退避后再试；开启 retry.hedge 后首字太慢会再发一路请求，谁先出内容用谁
+    开启自适应并发（concurrency.adaptive）时，同时在途的调用数由 AIMD 限制器控制
+    """
+    config = load_config()
+
+    pool = get_endpoint_pool(config)
+    if pool is None:
+        _print_missing_token()
         return None
+    data = _build_payload(value, temp, pool.model)
+
+    if show_response is None:
+        show_response = should_show_ai_response(config)
+
+    configure_metrics(config)
+    timer = CallTimer(data['model'], tags)
+
+    # 先查缓存，命中时整段交给回调，行为和流式一致
+    cache, cache_key, cached = _lookup_cache(config, data, temp, use_cache, refresh)
+    if cached is not None:
+        if show_response:
+            print(cached)
+            print("=" * 50)
+        if stream_callback:
+            stream_callback(cached)
+        timer.finish('cached')
+        return cached
+    settings = get_http_settings(config)
+    timeout = (settings['connect_timeout'], settings['read_timeout'])
+    acquire_timeout = get_pool_settings(config)['acquire_timeout']
+    session = get_session(config)
+
+    limiter = get_limiter(config)
+    status, full_message, extra = 'error', None, {}
+    if limiter is not None:
+        limiter.acquire()
+        extra['concurrency_limit'] = limiter.snapshot()['limit']
+        extra['queue_wait'] = timer.restart()
+    try:
+        status, full_message, detail = _request_with_retry(
+            config, pool, session, data, timeout, acquire_timeout, stream_callback, show_response, timer
+        )
+        extra.update(detail)
+    finally:
+        if limiter is not None:
+            limiter.release(status, timer.ttft)
+
+    if status != 'ok':
+        timer.finish(status, **extra)
+        return None
+
+    if show_response:
+        print()  # 最后换行
+        print("=" * 50)
+
+    full_message = full_message.strip()
+    if cache is not None and full_message:
+        cache.put(cache_key, full_message, model=data['model'])
+    timer.finish('ok', **extra)
+    return full_message
+
+
+async def _get_async_session(settings):
+    """获取当前事件循环上的共享 aiohttp Session"""
+    import asyncio
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    cached = _async_sessions.get(loop)
+    if cached is not None:
+        session, cached_settings = cached
+        if cached_settings == settings and not session.closed:
+            return session
+        await session.close()
+
+    connector = aiohttp.TCPConnector(limit=settings['pool_size'])
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        connect=settings['connect_timeout'],
+        sock_read=settings['read_timeout']
+    )
+    session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    _async_sessions[loop] = (session, settings)
+    return session
+
+
+async def close_async_session():
+    """关闭当前事件循环上的共享 aiohttp Session"""
+    import asyncio
+
+    cached = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if cached is not None:
+        await cached[0].close()
+
+
+async def _stream_once_async(session, pool, endpoint, data, stream_callback, show_response, timer):
+    """_stream_once 的异步版本，返回值含义一致"""
+    import asyncio
+    import inspect
+    import aiohttp
+
+    success = None
+    rate_limited = False
+    try:
+        async with session.post(endpoint.url, headers=_build_headers(endpoint.token), json=data) as response:
+            if response.status == 200:
+                parts = []
+                decoder = SSEDecoder()
+                finished = False
+                # 有多少读多少，交给 SSE 解码器切分事件
+                async for chunk in response.content.iter_any():
+                    for event in decoder.feed(chunk):
+                        finished, content, usage = extract_delta(event)
+                        if finished:
+                            break
+                        ret = _emit_delta(content, usage, parts, stream_callback, show_response, timer)
+                        if inspect.isawaitable(ret):
+                            await ret
+                    if finished:
+                        break
+                if not finished:
+                    # 最后一个事件可能没有以空行结尾
+                    for event in decoder.flush():
+                        finished, content, usage = extract_delta(event)
+                        if finished:
+                            break
+                        ret = _emit_delta(content, usage, parts, stream_callback, show_response, timer)
+                        if inspect.isawaitable(ret):
+                            await ret
+                success = True
+                return 'ok', ''.join(parts), {}
+
+            print(f"[!] 请求失败，状态码: {response.status}")
+            body = await response.text()
+            print(f"[!] 响应内容: {body[:200]}")
+            if is_failover_status(response.status):
+                success = False
+                rate_limited = response.status == 429
+                detail = {}
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None:
+                    detail['retry_after'] = retry_after
+                return 'failover', f"http_{response.status}", detail
+            return 'error', f"http_{response.status}", {}
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        success = False
+        print(f"[!] 网络或请求错误: {e!r}")
+        return 'failover', 'network_error', {"error": repr(e)}
     except Exception as e:
         print(f"[!] 未知错误: {e}")
+        return 'error', 'error', {"error": str(e)}
+    finally:
+        pool.release(endpoint, success, rate_limited)
+
+
+async def _acquire_async(pool, exclude, timeout):
+    """异步等待一个可用接口，不阻塞事件循环"""
+    import asyncio
+
+    deadline = time.monotonic() + timeout
+    while True:
+        endpoint, reason = pool.try_acquire(exclude)
+        if endpoint is not None or reason != 'busy' or time.monotonic() >= deadline:
+            return endpoint
+        await asyncio.sleep(0.05)
+
+
+async def _request_with_retry_async(config, pool, session, data, acquire_timeout, stream_callback, show_response,
+                                    timer):
+    """_request_with_retry 的异步版本，不做对冲"""
+    import asyncio
+
+    retry = get_retry_settings(config)
+    tried = []
+    attempts = 0
+    rounds = 0
+    retry_after = None
+    status, extra = 'no_endpoint', {}
+    while attempts < retry['max_attempts']:
+        endpoint = await _acquire_async(pool, tried, acquire_timeout)
+        if endpoint is None:
+            wait = 0.0
+            if not tried:
+                attempts += 1
+                wait = pool.reopen_delay()
+                if attempts >= retry['max_attempts'] or wait > retry['max_delay']:
+                    print("[!] 没有可用的接口（全部熔断或并发已满）")
+                    break
+            rounds += 1
+            delay = max(wait, backoff_delay(rounds, retry, retry_after))
+            print(f"[*] {delay:.1f} 秒后重试")
+            await asyncio.sleep(delay)
+            tried = []
+            retry_after = None
+            continue
+
+        tried.append(endpoint)
+        attempts += 1
+        data['model'] = endpoint.model
+        extra = {"endpoint": endpoint.name, "attempts": attempts}
+
+        kind, result, detail = await _stream_once_async(session, pool, endpoint, data,
+                                                        stream_callback, show_response, timer)
+        if detail.get('retry_after') is not None:
+            retry_after = max(retry_after or 0.0, detail.pop('retry_after'))
+        extra.update(detail)
+        if kind == 'ok':
+            return 'ok', result, extra
+
+        status = result
+        if kind != 'failover' or timer.chunks:
+            break
+        if attempts < retry['max_attempts'] and len(tried) < len(pool.endpoints):
+            print(f"[*] 接口 {endpoint.name} 不可用，切换其他接口重试")
+
+    return status, None, extra
+
+
+async def api_single_async(value: list[dict[str, str]], stream_callback=None, temp=0.2, show_response=None,
+                           use_cache=True, refresh=False, tags=None):
+    """
+    api_single 的异步版本，流式传输、stream_callback、结果缓存、接口切换、重试和指标记录行为一致（不做对冲）
+    stream_callback 可以是普通函数，也可以是 async 函数
+    需要安装 aiohttp
+    """
+    import asyncio
+    import inspect
+
+    try:
+        import aiohttp
+    except ImportError:
+        print("[!] 异步调用需要安装 aiohttp: pip install aiohttp")
+        return None
+
+    config = load_config()
+
+    pool = get_endpoint_pool(config)
+    if pool is None:
+        _print_missing_token()
+        return None
+    data = _build_payload(value, temp, pool.model)
+
+    if show_response is None:
+        show_response = should_show_ai_response(config)
+
+    configure_metrics(config)
+    timer = CallTimer(data['model'], tags)
+
+    # 和 api_single 查同一份缓存，两种调用方式拿到的结果一致
+    cache, cache_key, cached = _lookup_cache(config, data, temp, use_cache, refresh)
+    if cached is not None:
+        if show_response:
+            print(cached)
+            print("=" * 50)
+        if stream_callback:
+            ret = stream_callback(cached)
+            if inspect.isawaitable(ret):
+                await ret
+        timer.finish('cached')
+        return cached
+    settings = get_http_settings(config)
+    acquire_timeout = get_pool_settings(config)['acquire_timeout']
+    session = await _get_async_session(settings)
+
+    limiter = get_limiter(config)
+    status, full_message, extra = 'error', None, {}
+    if limiter is not None:
+        # 不阻塞事件循环，轮询等名额
+        while not limiter.try_acquire():
+            await asyncio.sleep(0.05)
+        extra['concurrency_limit'] = limiter.snapshot()['limit']
+        extra['queue_wait'] = timer.restart()
+    try:
+        status, full_message, detail = await _request_with_retry_async(
+            config, pool, session, data, acquire_timeout, stream_callback, show_response, timer
+        )
+        extra.update(detail)
+    finally:
+        if limiter is not None:
+            limiter.release(status, timer.ttft)
+
+    if status != 'ok':
+        timer.finish(status, **extra)
         return None
+
+    if show_response:
+        print()
+        print("=" * 50)
+
+    full_message = full_message.strip()
+    if cache is not None and full_message:
+        cache.put(cache_key, full_message, model=data['model'])
+    timer.finish('ok', **extra)
+    return full_message
@@ -0,0 +1,383 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from .dedup import MAX_CANDIDATES, NearDuplicateDetector, pack_signature, unpack_signature
+
+DEFAULT_BANK_FILE = "./data/question_bank.db"
+
+# 查询时每批取回的行数
+FETCH_SIZE = 2000
+
+# 指纹表里答案元组的分隔符；规范化后的答案不含空白字符，不会和它冲突
+_ANSWER_SEP = "\x1f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS poems (
+    id INTEGER PRIMARY KEY,
+    poet TEXT NOT NULL,
+    title TEXT NOT NULL,
+    UNIQUE (poet, title)
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    poem_id INTEGER NOT NULL REFERENCES poems(id),
+    value TEXT NOT NULL,
+    difficulty TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS answers (
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (question_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fingerprints (
+    question_id INTEGER PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    answers_key TEXT NOT NULL,
+    signature BLOB
+);
+CREATE TABLE IF NOT EXISTS fingerprint_bands (
+    band_hash INTEGER NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    PRIMARY KEY (band_hash, question_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_poems_title ON poems (title);
+CREATE INDEX IF NOT EXISTS idx_questions_poem ON questions (poem_id, difficulty);
+CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions (difficulty);
+CREATE INDEX IF NOT EXISTS idx_questions_created ON questions (created_at);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_answers ON fingerprints (answers_key);
+CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_question ON fingerprint_bands (question_id);
+"""
+
+
+def get_bank_path(config):
+    """题库文件路径，默认放在数据目录下"""
+    return config.get('paths', {}).get('bank_file', DEFAULT_BANK_FILE)
+
+
+class QuestionBank:
+    """
+    SQLite 题库
+    poems / questions / answers 三张表，按诗人、诗名、难度、创建时间建索引
+    fingerprints / fingerprint_bands 存每道题的去重指纹（答案元组、MinHash 签名、LSH 分段桶号），
+    入库查重直接查索引，不用每个进程把整个题库读进内存重建
+    查询结果和 generated.json 里的题目格式一致，可以直接交给打印
+    """
+
+    def __init__(self, path=DEFAULT_BANK_FILE):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._poem_ids = {}
+        self._detector = NearDuplicateDetector()
+        self._fingerprints_checked = False
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _poem_id(self, cur, poet, title):
+        key = (poet, title)
+        poem_id = self._poem_ids.get(key)
+        if poem_id is None:
+            cur.execute("INSERT OR IGNORE INTO poems (poet, title) VALUES (?, ?)", key)
+            poem_id = cur.execute(
+                "SELECT id FROM poems WHERE poet = ? AND title = ?", key
+            ).fetchone()[0]
+            self._poem_ids[key] = poem_id
+        return poem_id
+
+    def _add_fingerprint(self, cur, question_id, fingerprint):
+        answers, signature, band_keys = fingerprint
+        cur.execute(
+            "INSERT OR REPLACE INTO fingerprints (question_id, answers_key, signature) VALUES (?, ?, ?)",
+            (question_id, _ANSWER_SEP.join(answers), None if signature is None else pack_signature(signature))
+        )
+        cur.executemany(
+            "INSERT OR IGNORE INTO fingerprint_bands (band_hash, question_id) VALUES (?, ?)",
+            [(band_hash, question_id) for band_hash in self._detector.band_hashes(band_keys)]
+        )
+
+    def _find_duplicate(self, cur, fingerprint):
+        """在已入库的指纹里找重复题，返回原题 id；最多比较 MAX_CANDIDATES 个候选"""
+        answers, signature, band_keys = fingerprint
+        if answers:
+            rows = cur.execute(
+                "SELECT question_id, answers_key, signature FROM fingerprints WHERE answers_key = ? LIMIT ?",
+                (_ANSWER_SEP.join(answers), MAX_CANDIDATES)
+            ).fetchall()
+        else:
+            hashes = self._detector.band_hashes(band_keys)
+            if not hashes:
+                return None
+            rows = cur.execute(f"""
+                SELECT question_id, answers_key, signature FROM fingerprints
+                WHERE question_id IN (
+                    SELECT question_id FROM fingerprint_bands WHERE band_hash IN ({','.join('?' * len(hashes))}) LIMIT ?
+                )
+            """, (*hashes, MAX_CANDIDATES)).fetchall()
+        for question_id, answers_key, packed in rows:
+            other_answers = tuple(answers_key.split(_ANSWER_SEP)) if answers_key else ()
+            other_signature = None if packed is None else unpack_signature(packed)
+            if self._detector.matches(answers, signature, other_answers, other_signature):
+                return question_id
+        return None
+
+    def ensure_fingerprints(self):
+        """
+        补齐缺指纹的题（老题库第一次去重时，或者指纹参数变了之后），返回补了多少道
+        每个连接只检查一次
+        """
+        if self._fingerprints_checked:
+            return 0
+        count = 0
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            layout = cur.execute("SELECT value FROM meta WHERE key = 'fingerprint_layout'").fetchone()
+            if layout is None or layout[0] != self._detector.layout:
+                cur.execute("DELETE FROM fingerprint_bands")
+                cur.execute("DELETE FROM fingerprints")
+                cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint_layout', ?)",
+                            (self._detector.layout,))
+            missing = cur.execute("""
+                SELECT q.id FROM questions q
+                WHERE NOT EXISTS (SELECT 1 FROM fingerprints f WHERE f.question_id = q.id)
+            """).fetchall()
+            for start in range(0, len(missing), 500):
+                chunk = [row[0] for row in missing[start:start + 500]]
+                marks = ','.join('?' * len(chunk))
+                values = dict(cur.execute(f"SELECT id, value FROM questions WHERE id IN ({marks})", chunk))
+                answers = defaultdict(list)
+                for question_id, text in cur.execute(
+                    f"SELECT question_id, text FROM answers WHERE question_id IN ({marks}) ORDER BY question_id, position",
+                    chunk
+                ):
+                    answers[question_id].append(text)
+                for question_id in chunk:
+                    item = {'value': values[question_id], 'answer': answers[question_id]}
+                    self._add_fingerprint(cur, question_id, self._detector.fingerprint(item))
+                    count += 1
+        self._fingerprints_checked = True
+        return count
+
+    def has_import(self, import_key):
+        """这个幂等键的题目是否已经写入过"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM imports WHERE key = ?", (import_key,)
+            ).fetchone() is not None
+
+    def insert_many(self, items, difficulty=None, created_at=None, dedupe=False, import_key=None):
+        """
+        批量写入题目，一个事务提交
+        题目自带 difficulty 字段时优先用题目自己的
+        每道题的去重指纹同时写入；dedupe=True 时跳过和库里（包括同一批前面的题）近似重复的题
+        传入 import_key 时这一批只会写入一次：键和题目在同一个事务里提交，键已经存在就什么都不写
+        返回写入的题目数
+        """
+        created_at = time.time() if created_at is None else created_at
+        count = 0
+        if dedupe:
+            self.ensure_fingerprints()
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            if import_key is not None and cur.execute(
+                "SELECT 1 FROM imports WHERE key = ?", (import_key,)
+            ).fetchone():
+                return 0
+            answer_rows = []
+            for item in items:
+                fingerprint = self._detector.fingerprint(item)
+                if dedupe and self._find_duplicate(cur, fingerprint) is not None:
+                    continue
+                poet = str(item.get('poet', '未知'))
+                title = str(item.get('title', '未知'))
+                answers = item.get('answer', [])
+                if isinstance(answers, str):
+                    answers = [answers]
+                item_difficulty = item.get('difficulty', difficulty)
+
+                cur.execute(
+                    "INSERT INTO questions (poem_id, value, difficulty, created_at) VALUES (?, ?, ?, ?)",
+                    (self._poem_id(cur, poet, title), item.get('value', ''),
+                     None if item_difficulty is None else str(item_difficulty), created_at)
+                )
+                question_id = cur.lastrowid
+                self._add_fingerprint(cur, question_id, fingerprint)
+                answer_rows.extend(
+                    (question_id, position, str(text)) for position, text in enumerate(answers)
+                )
+                count += 1
+            cur.executemany(
+                "INSERT INTO answers (question_id, position, text) VALUES (?, ?, ?)", answer_rows
+            )
+            if import_key is not None:
+                cur.execute(
+                    "INSERT INTO imports (key, count, created_at) VALUES (?, ?, ?)",
+                    (import_key, count, created_at)
+                )
+        return count
+
+    def _where(self, poet=None, title=None, difficulty=None, since=None, until=None):
+        clauses = []
+        params = []
+        if poet is not None:
+            clauses.append("p.poet = ?")
+            params.append(poet)
+        if title is not None:
+            clauses.append("p.title = ?")
+            params.append(title)
+        if difficulty is not None:
+            if isinstance(difficulty, (list, tuple, set)):
+                difficulty = [str(d) for d in difficulty]
+                clauses.append(f"q.difficulty IN ({','.join('?' * len(difficulty))})")
+                params.extend(difficulty)
+            else:
+                clauses.append("q.difficulty = ?")
+                params.append(str(difficulty))
+        if since is not None:
+            clauses.append("q.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("q.created_at < ?")
+            params.append(until)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+
+    def iter_items(self, poet=None, title=None, difficulty=None, since=None, until=None, limit=None):
+        """
+        按条件流式返回题目，按诗分组排列（先入库的诗在前）
+        limit 限制题目数量
+        """
+        where, params = self._where(poet, title, difficulty, since, until)
+        limit_sql = ""
+        if limit is not None:
+            limit_sql = " LIMIT ?"
+            params.append(int(limit))
+
+        sql = f"""
+            SELECT q.id, p.poet, p.title, q.value, q.difficulty, q.created_at, a.text
+            FROM (
+                SELECT q.id, q.poem_id, q.value, q.difficulty, q.created_at
+                FROM questions q JOIN poems p ON p.id = q.poem_id
+                {where}
+                ORDER BY q.poem_id, q.id{limit_sql}
+            ) q
+            JOIN poems p ON p.id = q.poem_id
+            LEFT JOIN answers a ON a.question_id = q.id
+            ORDER BY q.poem_id, q.id, a.position
+        """
+        # 分批取结果，只在取数据时持锁，调用方慢慢消费也不会卡住其他线程
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(sql, params)
+        current = None
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for qid, poet_, title_, value, diff, created, answer in rows:
+                if current is None or current['id'] != qid:
+                    if current is not None:
+                        yield current
+                    current = {
+                        'id': qid, 'title': title_, 'poet': poet_, 'value': value,
+                        'answer': [], 'difficulty': diff, 'created_at': created
+                    }
+                if answer is not None:
+                    current['answer'].append(answer)
+        if current is not None:
+            yield current
+
+    def query(self, **filters):
+        """按条件查询题目，返回列表，参数同 iter_items"""
+        return list(self.iter_items(**filters))
+
+    def iter_groups(self, **filters):
+        """按 ((诗人, 诗名), 题目列表) 流式分组返回，可以直接交给 render_test_papers"""
+        key = None
+        group = []
+        for item in self.iter_items(**filters):
+            item_key = (item['poet'], item['title'])
+            if item_key != key:
+                if group:
+                    yield key, group
+                key = item_key
+                group = []
+            group.append(item)
+        if group:
+            yield key, group
+
+    def count(self, **filters):
+        """按条件统计题目数量"""
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM questions q JOIN poems p ON p.id = q.poem_id{where}", params
+            ).fetchone()[0]
+
+    def poems(self):
+        """返回 [(诗人, 诗名, 题目数)]"""
+        with self._lock:
+            return self._conn.execute("""
+                SELECT p.poet, p.title, COUNT(q.id)
+                FROM poems p LEFT JOIN questions q ON q.poem_id = p.id
+                GROUP BY p.id ORDER BY p.id
+            """).fetchall()
+
+    def find_duplicates(self, **kwargs):
+        """一次遍历全库，返回 [(重复题 id, 原题 id)]，先入库的题算原题"""
+        detector = NearDuplicateDetector(**kwargs)
+        duplicates = []
+        for item in self.iter_items():
+            original = detector.add(item, key=item['id'])
+            if original is not None:
+                duplicates.append((item['id'], original))
+        return duplicates
+
+    def remove_duplicates(self, **kwargs):
+        """删除全库的近似重复题，返回删除的数量"""
+        return self.delete(dup for dup, _ in self.find_duplicates(**kwargs))
+
+    def delete(self, question_ids):
+        """按 id 删除题目，返回删除的数量"""
+        ids = list(question_ids)
+        deleted = 0
+        with self._lock, self._conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ','.join('?' * len(chunk))
+                self._conn.execute(f"DELETE FROM answers WHERE question_id IN ({marks})", chunk)
+                deleted += self._conn.execute(
+                    f"DELETE FROM questions WHERE id IN ({marks})", chunk
+                ).rowcount
+        return deleted
+
+
+def open_bank(config):
+    """按配置打开题库"""
+    return QuestionBank(get_bank_path(config))
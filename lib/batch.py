@@ -0,0 +1,158 @@
+import csv
+import json
+import time
+from .concurrency import get_concurrency_settings
+from .generator import generate_questions
+
+DEFAULT_WORKERS = 4
+
+
+def get_batch_workers(config):
+    """
+    批量生成的线程数，取配置 batch.workers，没写就用默认值
+    开启自适应并发时同时在途的 API 调用数由限制器按服务商的情况调整，线程数不超过 concurrency.max
+    """
+    try:
+        workers = int(config.get('batch', {}).get('workers', DEFAULT_WORKERS))
+    except (TypeError, ValueError):
+        workers = DEFAULT_WORKERS
+    settings = get_concurrency_settings(config)
+    if settings['adaptive']:
+        workers = min(workers, settings['max'])
+    return max(1, workers)
+
+
+def normalize_job(job):
+    """
+    把一条任务统一成 dict: {poet, poem, num, difficulty}
+    支持 dict 或 [诗人, 诗名, 数量, 难度] 形式，数量和难度可省略
+    """
+    if isinstance(job, dict):
+        poet = job.get('poet', '')
+        poem = job.get('poem') or job.get('title', '')
+        num = job.get('num', 5)
+        difficulty = job.get('difficulty', '0.9')
+    else:
+        fields = list(job) + [None] * 4
+        poet, poem, num, difficulty = fields[:4]
+        num = 5 if num in (None, '') else num
+        difficulty = '0.9' if difficulty in (None, '') else difficulty
+
+    poet = str(poet).strip()
+    poem = str(poem).strip().strip('《》')
+    if not poet or not poem:
+        raise ValueError(f"任务缺少诗人或诗名: {job}")
+
+    return {
+        'poet': poet,
+        'poem': poem,
+        'num': int(num),
+        'difficulty': str(difficulty).strip(),
+    }
+
+
+def load_jobs(job_file):
+    """
+    从文件读取任务列表
+    - .json: 数组，元素为 dict 或 [诗人, 诗名, 数量, 难度]
+    - 其他: 每行一条 "诗人,诗名,数量,难度"，# 开头为注释
+    """
+    if job_file.lower().endswith('.json'):
+        with open(job_file, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        return [normalize_job(job) for job in raw]
+
+    jobs = []
+    with open(job_file, 'r', encoding='utf-8') as f:
+        lines = [line.replace('，', ',') for line in f]
+    for row in csv.reader(lines, skipinitialspace=True):
+        if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+            continue
+        jobs.append(normalize_job(row))
+    return jobs
+
+
+def _run_job(index, job, refresh=False, store=None, run_id=None):
+    """执行单个任务，返回结果记录；传入 store 时任务状态和结果同时写进持久化队列"""
+    start = time.perf_counter()
+    if store is not None:
+        store.start(run_id, index)
+    try:
+        result = generate_questions(
+            job['poet'], job['poem'], job['num'], job['difficulty'],
+            show_response=False, refresh=refresh
+        )
+        error = None if result is not None else "生成失败"
+        # 偶尔AI只返回单个对象，统一包成列表
+        if isinstance(result, dict):
+            result = [result]
+    except Exception as e:
+        result = None
+        error = str(e)
+    elapsed = time.perf_counter() - start
+
+    if store is not None:
+        if result is not None:
+            store.complete(run_id, index, result, elapsed)
+        else:
+            store.fail(run_id, index, error, elapsed)
+
+    return {
+        'index': index,
+        'job': job,
+        'ok': result is not None,
+        'items': result or [],
+        'error': error,
+        'elapsed': elapsed,
+        'resumed': False,
+    }
+
+
+def generate_batch(jobs, workers=DEFAULT_WORKERS, progress_callback=None, refresh=False,
+                   store=None, run_id=None):
+    """
+    并发执行多组出题任务
+    jobs: normalize_job 能识别的任务列表
+    progress_callback(record, done, total): 每完成一个任务调用一次
+    refresh: 忽略本地缓存，全部重新请求
+    store / run_id: 持久化任务队列（JobStore.open_run 登记过的），已经完成的任务直接取上次的结果，
+                    其余任务每完成一个就写进队列，中途退出下次接着做
+    返回 (合并后的题目列表, 按任务顺序排列的结果记录)
+    """
+    jobs = [normalize_job(job) for job in jobs]
+    total = len(jobs)
+    records = [None] * total
+
+    pending = list(enumerate(jobs))
+    if store is not None:
+        for index, job, items, elapsed in store.finished(run_id):
+            records[index] = {
+                'index': index, 'job': job, 'ok': True, 'items': items,
+                'error': None, 'elapsed': elapsed, 'resumed': True,
+            }
+        pending = [(index, job) for index, job in pending if records[index] is None]
+
+    # concurrent.futures 连带 logging 加载要二十毫秒左右，真正并发时再导入
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = [executor.submit(_run_job, i, job, refresh, store, run_id) for i, job in pending]
+        done = total - len(pending)
+        for future in as_completed(futures):
+            record = future.result()
+            records[record['index']] = record
+            done += 1
+            if progress_callback:
+                progress_callback(record, done, total)
+    except BaseException:
+        # Ctrl-C 之类：没开始的任务取消，正在执行的做完（结果照样写进队列）再退出
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+
+    # 按任务原始顺序合并，保证输出稳定
+    items = []
+    for record in records:
+        items.extend(record['items'])
+    return items, records
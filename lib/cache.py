@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# 默认缓存配置
+DEFAULT_CACHE_SETTINGS = {
+    "enabled": True,
+    "dir": "./data/cache",
+    "max_size_mb": 100,
+    "max_age_days": 30
+}
+
+_cache = None
+_cache_settings = None
+_cache_lock = threading.Lock()
+
+
+def make_cache_key(messages, model, temperature):
+    """按完整的 messages + 模型 + 温度计算内容哈希"""
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages},
+        ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    磁盘上的 AI 返回结果缓存
+    每条结果存成 <key前两位>/<key>.json，超过最大体积或过期时按时间淘汰
+    """
+
+    def __init__(self, cache_dir, max_bytes, max_age_seconds):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 第一次写入时才统计
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _expired(self, mtime, now=None):
+        if self.max_age_seconds <= 0:
+            return False
+        return (now or time.time()) - mtime > self.max_age_seconds
+
+    def get(self, key):
+        """命中返回缓存内容，否则返回 None"""
+        path = self._path(key)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                content = json.load(f)['content']
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, key, content, model=None):
+        """写入一条缓存，先写临时文件再替换，避免写一半"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"created": time.time(), "model": model, "content": content}, f, ensure_ascii=False)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        with self._lock:
+            self.writes += 1
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += os.path.getsize(path) - old_size
+            over = self.max_bytes > 0 and self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+        return True
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _entries(self):
+        """列出所有缓存文件 (mtime, size, path)"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(sub_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """删除过期缓存，总大小仍超限时从最旧的开始删，直到降到上限的 90%"""
+        entries = sorted(self._entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9 if self.max_bytes > 0 else None
+        removed = 0
+        for mtime, size, path in entries:
+            too_big = target is not None and total > target
+            if not too_big and not self._expired(mtime, now):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self.evictions += removed
+            self._total_bytes = total
+        return removed
+
+    def clear(self):
+        """清空全部缓存"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._total_bytes = 0
+
+    def stats(self):
+        """命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+def get_cache_settings(config):
+    """读取缓存配置，缺省的项用默认值"""
+    settings = dict(DEFAULT_CACHE_SETTINGS)
+    settings.update(config.get('cache', {}))
+    return settings
+
+
+def get_response_cache(config):
+    """获取进程共享的缓存对象，缓存被关闭时返回 None"""
+    global _cache, _cache_settings
+    settings = get_cache_settings(config)
+    if not settings.get('enabled', True):
+        return None
+
+    with _cache_lock:
+        if _cache is None or _cache_settings != settings:
+            _cache = ResponseCache(
+                settings['dir'],
+                int(float(settings['max_size_mb']) * 1024 * 1024),
+                float(settings['max_age_days']) * 86400
+            )
+            _cache_settings = settings
+        return _cache
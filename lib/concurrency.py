@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from .metrics import emit
+
+# 自适应并发（AIMD）：调用健康时慢慢加并发，遇到限流、服务端错误或首字延迟明显变长时减半
+# 和 TCP 拥塞控制一个思路，不用手动调 workers 也能跑到服务商允许的最快速度
+
+DEFAULT_CONCURRENCY_SETTINGS = {
+    "adaptive": True,
+    "initial": 4,               # 初始并发上限
+    "min": 1,
+    "max": 32,
+    "decrease": 0.5,            # 出问题时上限乘以这个系数
+    "ttft_tolerance": 2.0,      # 首字延迟超过基线的几倍算变慢
+}
+
+# 首字延迟基线的平滑系数
+BASELINE_ALPHA = 0.1
+# 至少有这么多样本才用首字延迟判断
+BASELINE_MIN_SAMPLES = 10
+# 保留最近多少次上限变化
+HISTORY_SIZE = 1000
+
+
+def _is_backoff_status(status):
+    """需要退让的调用结果：限流、服务端错误、网络问题"""
+    return status in ("http_429", "network_error") or status.startswith("http_5")
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 并发限制器
+    acquire 占一个名额（超过当前上限就等），调用结束后 release 报告结果和首字延迟
+    上限每变化一次记一条历史，并作为指标事件（event=concurrency_limit）发给各个 sink
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=32, decrease=0.5, ttft_tolerance=2.0):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.decrease = float(decrease)
+        self.ttft_tolerance = float(ttft_tolerance)
+        self.in_flight = 0
+        self.baseline = None
+        self.samples = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        # 减小上限之后已经在路上的请求结束时不再重复减
+        self._since_decrease = 0
+        self._in_flight_at_decrease = 0
+        self._cond = threading.Condition()
+        self._record(None, "initial")
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """占一个并发名额，超过上限时等待，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, status, ttft=None):
+        """
+        归还名额并根据结果调整上限
+        status 是调用记录里的状态（ok / http_429 / network_error ...），ttft 是首字延迟秒数
+        """
+        with self._cond:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            self._since_decrease += 1
+
+            reason = None
+            if _is_backoff_status(status):
+                reason = status
+            elif status == 'ok' and ttft is not None:
+                if self.samples >= BASELINE_MIN_SAMPLES and ttft > self.baseline * self.ttft_tolerance:
+                    reason = "slow_ttft"
+                # 基线也跟着慢慢变，服务商整体变慢后不会一直减下去
+                self.samples += 1
+                if self.baseline is None:
+                    self.baseline = ttft
+                else:
+                    self.baseline += BASELINE_ALPHA * (ttft - self.baseline)
+
+            if reason is not None:
+                # 同一波请求里只减一次
+                if self._since_decrease > self._in_flight_at_decrease:
+                    old = self.limit
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._since_decrease = 0
+                    self._in_flight_at_decrease = self.in_flight
+                    if int(self.limit) != int(old):
+                        self._record(old, reason)
+            elif status == 'ok' and in_flight >= int(self.limit):
+                # 名额用满了还健康才加，每轮大约加 1
+                old = self.limit
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                if int(self.limit) != int(old):
+                    self._record(old, "increase")
+            self._cond.notify_all()
+
+    def _record(self, old, reason):
+        entry = {
+            "ts": time.time(),
+            "limit": int(self.limit),
+            "previous": None if old is None else int(old),
+            "reason": reason,
+            "in_flight": self.in_flight,
+            "ttft_baseline": self.baseline,
+        }
+        self.history.append(entry)
+        emit(dict(entry, event="concurrency_limit"))
+
+    def snapshot(self):
+        """当前状态和历史，给指标和进度输出用"""
+        with self._cond:
+            history = list(self.history)
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "ttft_baseline": self.baseline,
+                "peak": max(h['limit'] for h in history),
+                "decreases": sum(1 for h in history if h['reason'] not in ("initial", "increase")),
+                "history": history,
+            }
+
+
+_limiter = None
+_limiter_settings = None
+_limiter_lock = threading.Lock()
+
+
+def get_concurrency_settings(config):
+    """读取自适应并发配置（concurrency），缺省的项用默认值"""
+    concurrency_config = config.get('concurrency', {})
+    settings = {}
+    for key, default in DEFAULT_CONCURRENCY_SETTINGS.items():
+        try:
+            settings[key] = type(default)(concurrency_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    return settings
+
+
+def get_limiter(config):
+    """获取进程共享的并发限制器，自适应并发被关闭时返回 None"""
+    global _limiter, _limiter_settings
+    settings = get_concurrency_settings(config)
+    if not settings['adaptive']:
+        return None
+
+    with _limiter_lock:
+        if _limiter is None or _limiter_settings != settings:
+            _limiter = AdaptiveLimiter(
+                initial=settings['initial'],
+                min_limit=settings['min'],
+                max_limit=settings['max'],
+                decrease=settings['decrease'],
+                ttft_tolerance=settings['ttft_tolerance'],
+            )
+            _limiter_settings = settings
+        return _limiter
+
+
+def format_concurrency(snapshot):
+    """自适应并发的情况，一行文字"""
+    return (
+        f"自适应并发：当前上限 {snapshot['limit']}，最高 {snapshot['peak']}，"
+        f"退让 {snapshot['decreases']} 次（范围 {snapshot['min']}~{snapshot['max']}）"
+    )
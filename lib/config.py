@@ -1,28 +1,129 @@
+import copy
 import json
 import os
-from rich.console import Console
-from rich.panel import Panel
-
-console = Console()
+import threading
+import time
+from .console import console
 
 # 默认配置，万一config.json坏了还能兜底
 DEFAULT_CONFIG = {
     "api": {
         "url": "https://api.deepseek.com/v1/chat/completions",
         "token": "",
-        "model": "deepseek-chat"
+        "model": "deepseek-chat",
+        "endpoints": []
     },
     "output": {
         "show_ai_response": True
     },
     "paths": {
         "data_dir": "./data",
-        "output_dir": "./output"
+        "output_dir": "./output",
+        "bank_file": "./data/question_bank.db",
+        "job_store_file": "./data/jobs.db"
+    },
+    "batch": {
+        "workers": 4
+    },
+    "http": {
+        "pool_size": 10,
+        "connect_timeout": 10,
+        "read_timeout": 60
+    },
+    "cache": {
+        "enabled": True,
+        "dir": "./data/cache",
+        "max_size_mb": 100,
+        "max_age_days": 30
+    },
+    "reference": {
+        "top_k": 12,
+        "token_budget": 2000
+    },
+    "metrics": {
+        "jsonl_file": ""
+    },
+    "generation": {
+        "repair_rounds": 1
+    },
+    "bank": {
+        "dedupe": True
+    },
+    "printer": {
+        "dedupe": False
+    },
+    "failover": {
+        "failure_threshold": 3,
+        "cooldown_seconds": 30,
+        "acquire_timeout": 60
+    },
+    "retry": {
+        "max_attempts": 3,
+        "base_delay": 1.0,
+        "max_delay": 30.0,
+        "hedge": False,
+        "hedge_percentile": 95,
+        "hedge_min_samples": 20,
+        "hedge_min_delay": 1.0
+    },
+    "concurrency": {
+        "adaptive": True,
+        "initial": 4,
+        "min": 1,
+        "max": 32,
+        "decrease": 0.5,
+        "ttft_tolerance": 2.0
+    },
+    "exam": {
+        "variants": 3,
+        "total_score": 100,
+        "min_per_poem": 1,
+        "mix": {},
+        "seed": 0
+    },
+    "student_papers": {
+        "workers": 0,
+        "chunk_size": 50,
+        "seed": 0
+    },
+    "ingest": {
+        "token_budget": 3000,
+        "pattern": "*.txt"
+    },
+    "reference_store": {
+        "segment_max_mb": 4,
+        "compact_segments": 8,
+        "fsync": True
+    },
+    "service": {
+        "host": "127.0.0.1",
+        "port": 8321,
+        "workers": 4,
+        "max_finished_jobs": 1000,
+        "wait_timeout": 300,
+        "token": "",
+        "bank_limit": 1000
+    },
+    "drill": {
+        "modes": ["next", "prev"],
+        "per_poem": 0,
+        "difficulty": "0.2",
+        "seed": 0,
+        "min_answer": 3
     }
 }
 
 CONFIG_FILE = "config.json"
 
+# 进程内共享的配置，只有文件修改时间变了才重新读
+# 两次检查修改时间之间至少间隔 CONFIG_CHECK_INTERVAL 秒，热路径上基本不碰文件系统
+CONFIG_CHECK_INTERVAL = 1.0
+
+_config = None
+_config_mtime = None
+_config_checked = 0.0
+_config_lock = threading.RLock()
+
 
 def ensure_config_exists():
     """检查config.json是否存在，不存在就创建一个"""
@@ -46,30 +147,69 @@ def save_token_to_config(token):
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=4)
         
+        reload_config()
         return True
     except Exception as e:
         console.print(f"[red]✗ 保存Token失败: {e}[/red]")
         return False
 
 
-def load_config():
-    """加载配置，如果没config就创建一个"""
-    ensure_config_exists()
-    
+def _read_config_file():
+    """读取并校验config.json，出问题时返回默认配置的副本"""
     try:
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
             config = json.load(f)
             # 简单校验一下关键字段
             if 'api' not in config or 'token' not in config.get('api', {}):
                 console.print("[yellow]⚠ 配置文件格式可能有问题，使用默认配置[/yellow]")
-                return DEFAULT_CONFIG.copy()
+                return copy.deepcopy(DEFAULT_CONFIG)
             return config
     except json.JSONDecodeError:
         console.print("[yellow]⚠ config.json 解析失败，使用默认配置[/yellow]")
-        return DEFAULT_CONFIG.copy()
+        return copy.deepcopy(DEFAULT_CONFIG)
     except Exception as e:
         console.print(f"[yellow]⚠ 读取配置出错: {e}，使用默认配置[/yellow]")
-        return DEFAULT_CONFIG.copy()
+        return copy.deepcopy(DEFAULT_CONFIG)
+
+
+def _config_file_mtime():
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_config():
+    """
+    加载配置，如果没config就创建一个
+    结果在进程内共享，config.json 修改后会自动重新读取
+    返回的是共享对象，调用方不要随意修改
+    """
+    global _config, _config_mtime, _config_checked
+    with _config_lock:
+        now = time.monotonic()
+        if _config is not None and now - _config_checked < CONFIG_CHECK_INTERVAL:
+            return _config
+        _config_checked = now
+
+        mtime = _config_file_mtime()
+        if _config is not None and mtime is not None and mtime == _config_mtime:
+            return _config
+
+        if mtime is None:
+            ensure_config_exists()
+            mtime = _config_file_mtime()
+        _config = _read_config_file()
+        _config_mtime = mtime
+        return _config
+
+
+def reload_config():
+    """强制重新读取config.json"""
+    global _config
+    with _config_lock:
+        _config = None
+        return load_config()
 
 
 def ensure_dirs(config):
@@ -0,0 +1,50 @@
+import re
+import threading
+
+# 所有模块共用一个控制台输出
+# rich 第一次真正输出时才加载，只用到数据层（题库、去重、参考库）的程序不需要付这个开销，没装 rich 也能用
+
+_MARKUP_RE = re.compile(r'\[/?[a-z][a-z0-9 #_.,=-]*\]')
+
+_console = None
+_console_lock = threading.Lock()
+
+
+class PlainConsole:
+    """没有 rich 时的替代：去掉 [green] 之类的标记直接 print"""
+
+    def __init__(self):
+        self.quiet = False
+
+    def print(self, *objects, sep=' ', end='\n', **kwargs):
+        if self.quiet:
+            return
+        print(sep.join(_MARKUP_RE.sub('', str(o)) for o in objects), end=end)
+
+
+def get_console():
+    """共享的控制台，第一次调用时创建"""
+    global _console
+    if _console is None:
+        with _console_lock:
+            if _console is None:
+                try:
+                    from rich.console import Console
+                except ImportError:
+                    _console = PlainConsole()
+                else:
+                    _console = Console()
+    return _console
+
+
+class _LazyConsole:
+    """模块里 `console.print(...)` 照常写，用到时才创建真正的控制台"""
+
+    def __getattr__(self, name):
+        return getattr(get_console(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_console(), name, value)
+
+
+console = _LazyConsole()
@@ -0,0 +1,216 @@
+import hashlib
+import operator
+import re
+import struct
+import zlib
+from collections import defaultdict
+
+# 默认参数：48 个桶的单次哈希 MinHash，分 8 段做 LSH（每段 6 个桶）
+# 一段完全相同才算候选，候选概率 1-(1-s^6)^8 的 S 曲线拐点在 (1/8)^(1/6)≈0.71，和阈值 0.7 对齐
+DEFAULT_NUM_BINS = 48
+DEFAULT_BANDS = 8
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.7
+
+# 每道题最多和多少个候选比较签名；套模板的题干会让同一个桶里堆满题目，
+# 不设上限时逐个比较会退化成 O(n²)
+MAX_CANDIDATES = 64
+# 单个 LSH 桶最多登记多少道题，桶满了说明是模板，再往里放只会拖慢后面的查询
+MAX_BUCKET_SIZE = 64
+
+# shingle 用 crc32 哈希，签名跨进程稳定，可以存进题库
+_MASK = 0xFFFFFFFF
+_EMPTY = _MASK + 1
+
+_STRIP_RE = re.compile(r"\{\{answer\}\}|[\s，。？！；：、“”‘’《》（）()_＿\-—…·,.?!;:\"']+")
+
+
+def normalize_text(text):
+    """去掉占位符、空白和标点，只留文字"""
+    return _STRIP_RE.sub('', str(text))
+
+
+def normalize_answers(answers):
+    """答案片段规范化后组成元组，用来做精确匹配"""
+    if isinstance(answers, str):
+        answers = [answers]
+    return tuple(normalize_text(a) for a in answers or [] if normalize_text(a))
+
+
+def minhash_signature(text, num_bins=DEFAULT_NUM_BINS, shingle_size=DEFAULT_SHINGLE_SIZE):
+    """
+    单次哈希 MinHash（one permutation hashing）
+    每个字符 shingle 只算一次哈希，按哈希值分到 num_bins 个桶里各取最小值
+    空桶从右边最近的非空桶借值（densification），保证签名可比
+    """
+    if len(text) <= shingle_size:
+        shingles = {text} if text else set()
+    else:
+        shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+    bins = [_EMPTY] * num_bins
+    for h in {zlib.crc32(shingle.encode('utf-8')) for shingle in shingles}:
+        b = h % num_bins
+        v = h // num_bins
+        if v < bins[b]:
+            bins[b] = v
+
+    if _EMPTY in bins:
+        if bins.count(_EMPTY) == num_bins:
+            return tuple(bins)
+        # 从后往前绕两圈，空桶借用右边最近的非空桶，加上距离偏移区分借来的值
+        original = bins
+        bins = list(original)
+        borrowed = None
+        distance = 0
+        for i in range(2 * num_bins - 1, -1, -1):
+            v = original[i % num_bins]
+            if v != _EMPTY:
+                borrowed = v
+                distance = 0
+            else:
+                distance += 1
+                if i < num_bins and borrowed is not None:
+                    bins[i] = borrowed + distance * _EMPTY
+    return tuple(bins)
+
+
+def estimate_similarity(sig_a, sig_b):
+    """两个签名相同桶的比例，近似 Jaccard 相似度"""
+    return sum(map(operator.eq, sig_a, sig_b)) / len(sig_a)
+
+
+def pack_signature(signature):
+    """签名转成 bytes 存进数据库"""
+    return struct.pack(f'<{len(signature)}q', *signature)
+
+
+def unpack_signature(data):
+    return struct.unpack(f'<{len(data) // 8}q', data)
+
+
+class NearDuplicateDetector:
+    """
+    近似重复检测，可以边来边查
+    两道题算重复要同时满足：
+    - answer 规范化后的元组相同（match_answers=False 时不看答案）
+    - value 的字符 shingle 做 MinHash，签名估算的相似度达到阈值
+    有答案时按答案元组找候选，没有答案（或不看答案）时按 LSH 分段分桶找候选
+    每道题比较的候选数有上限，套模板的题干不会让检测退化成平方复杂度
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_bins=DEFAULT_NUM_BINS, bands=DEFAULT_BANDS,
+                 shingle_size=DEFAULT_SHINGLE_SIZE, match_answers=True):
+        if num_bins % bands:
+            raise ValueError("num_bins 必须能被 bands 整除")
+        self.threshold = threshold
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+        self.shingle_size = shingle_size
+        self.match_answers = match_answers
+        self._signatures = {}
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._answers = defaultdict(list)
+
+    def __len__(self):
+        return len(self._signatures)
+
+    @property
+    def layout(self):
+        """签名和分段的参数，存进题库的指纹只有参数一样才能继续用"""
+        return f"crc32:{self.num_bins}:{self.bands}:{self.shingle_size}"
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[i * rows:(i + 1) * rows] for i in range(self.bands)]
+
+    def band_hashes(self, band_keys):
+        """每一段的桶号转成一个 64 位整数（带上段号），跨进程稳定，存进题库建索引用"""
+        hashes = []
+        for band, band_key in enumerate(band_keys):
+            digest = hashlib.blake2b(struct.pack(f'<{len(band_key) + 1}q', band, *band_key), digest_size=8).digest()
+            hashes.append(int.from_bytes(digest, 'little', signed=True))
+        return hashes
+
+    def fingerprint(self, item):
+        """返回 (答案元组, 签名, 分段桶号)；value 为空时签名为 None"""
+        answers = normalize_answers(item.get('answer', [])) if self.match_answers else ()
+        text = normalize_text(item.get('value', ''))
+        if not text:
+            return answers, None, []
+        signature = minhash_signature(text, self.num_bins, self.shingle_size)
+        return answers, signature, self._band_keys(signature)
+
+    def matches(self, answers, signature, other_answers, other_signature):
+        """两道题的指纹是否算重复：答案相同并且题干相似"""
+        if self.match_answers and answers != other_answers:
+            return False
+        if signature is None or other_signature is None:
+            # 没有题干的题只有答案完全一样才算重复
+            return signature is other_signature and bool(answers)
+        return estimate_similarity(signature, other_signature) >= self.threshold
+
+    def _candidates(self, answers, band_keys):
+        if self.match_answers and answers:
+            yield from self._answers.get(answers, ())[:MAX_CANDIDATES]
+            return
+        checked = set()
+        for band, band_key in enumerate(band_keys):
+            for key in self._buckets[band].get(band_key, ()):
+                if key not in checked:
+                    checked.add(key)
+                    yield key
+                    if len(checked) >= MAX_CANDIDATES:
+                        return
+
+    def _find(self, answers, signature, band_keys):
+        for key in self._candidates(answers, band_keys):
+            other_answers, other_signature = self._signatures[key]
+            if self.matches(answers, signature, other_answers, other_signature):
+                return key
+        return None
+
+    def check(self, item):
+        """只检查不登记，重复时返回原题的 key，否则返回 None"""
+        return self._find(*self.fingerprint(item))
+
+    def add(self, item, key=None):
+        """
+        检查并登记一道题
+        重复时返回原题的 key（本题不登记），否则登记为 key（默认为当前序号）并返回 None
+        """
+        answers, signature, band_keys = self.fingerprint(item)
+        original = self._find(answers, signature, band_keys)
+        if original is not None:
+            return original
+
+        if key is None:
+            key = len(self._signatures)
+        self._signatures[key] = (answers, signature)
+        for band, band_key in enumerate(band_keys):
+            bucket = self._buckets[band][band_key]
+            if len(bucket) < MAX_BUCKET_SIZE:
+                bucket.append(key)
+        if answers:
+            bucket = self._answers[answers]
+            if len(bucket) < MAX_BUCKET_SIZE:
+                bucket.append(key)
+        return None
+
+
+def find_duplicates(items, **kwargs):
+    """一次遍历，返回 [(重复题序号, 原题序号)]"""
+    detector = NearDuplicateDetector(**kwargs)
+    duplicates = []
+    for i, item in enumerate(items):
+        original = detector.add(item, key=i)
+        if original is not None:
+            duplicates.append((i, original))
+    return duplicates
+
+
+def dedupe_items(items, **kwargs):
+    """去掉近似重复的题目，保留先出现的"""
+    detector = NearDuplicateDetector(**kwargs)
+    return [item for i, item in enumerate(items) if detector.add(item, key=i) is None]
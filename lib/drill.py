@@ -0,0 +1,217 @@
+import json
+import os
+import random
+import re
+from .config import load_config
+from .validator import PLACEHOLDER, PUNCTUATION
+from .console import console
+
+# 离线出题：从本地诗文全文直接切出"上句/下句"默写题，不调用 API
+# 全文按 ，。？！； 切成分句，一句话的最后两个分句（逗号前后的上下句）组成一题，挖掉其中一句
+# 出来的题目和 AI 生成的格式一样（title/poet/value/answer），可以直接打印、入库
+
+DEFAULT_DRILL_SETTINGS = {
+    "modes": ["next", "prev"],  # next: 给上句填下句；prev: 给下句填上句
+    "per_poem": 0,              # 每首诗最多出几题，0 表示全部
+    "difficulty": "0.2",        # 机械默写，按基础题算（最难为1）
+    "seed": 0,                  # 抽题的随机种子
+    "min_answer": 3,            # 答案最少几个字，禁止一字空或者短语空
+}
+
+MODES = ("next", "prev")
+
+# 分句标点；只有逗号后面的分句和前面的分句属于同一句，句末标点（。？！；）结束一句
+CLAUSE_MARKS = "，。？！；"
+SENTENCE_ENDS = "。？！；"
+
+_CLAUSE_RE = re.compile(f"([^{CLAUSE_MARKS}]+)([{CLAUSE_MARKS}]?)")
+# 空白和括号里的注释（注音、校勘）在切分前去掉
+_NOISE_RE = re.compile(r"\s+|（[^）]*）|\([^)]*\)|\[[^\]]*\]|【[^】]*】")
+# 分句两头的引号留在题干里，不算进答案
+_QUOTES = "“”‘’「」『』\"'"
+# 文本语料里的标题行："《静夜思》 李白"、"李白《静夜思》"
+_HEADER_RE = re.compile(r"^\s*(?P<before>[^《》\s]*)\s*《(?P<title>[^》]+)》\s*(?P<after>[^《》\s]*)\s*$")
+
+
+def get_drill_settings(config):
+    """读取离线出题配置（drill），缺省的项用默认值"""
+    drill_config = config.get('drill', {})
+    settings = {}
+    for key, default in DEFAULT_DRILL_SETTINGS.items():
+        try:
+            settings[key] = type(default)(drill_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['modes'] = [mode for mode in settings['modes'] if mode in MODES] or list(MODES)
+    return settings
+
+
+def _poem_entry(data):
+    """语料里的一首诗统一成 {poet, title, content}，兼容 chinese-poetry 的 author/paragraphs 写法"""
+    poet = data.get('poet') or data.get('author') or ''
+    title = data.get('title') or data.get('rhythmic') or ''
+    content = data.get('content') or data.get('text') or data.get('paragraphs') or ''
+    if isinstance(content, list):
+        content = ''.join(str(line) for line in content)
+    return {'poet': str(poet).strip(), 'title': str(title).strip().strip('《》'), 'content': str(content)}
+
+
+def _parse_text_corpus(text):
+    """
+    文本语料：每首诗以标题行开头（"《诗名》 诗人" 或 "诗人《诗名》"），下面是全文
+    下一个标题行之前的内容都算这首诗的
+    """
+    poems = []
+    for line in text.splitlines():
+        match = _HEADER_RE.match(line)
+        if match:
+            poet = match.group('before') or match.group('after')
+            poems.append({'poet': poet, 'title': match.group('title').strip(), 'content': ''})
+        elif poems:
+            poems[-1]['content'] += line + '\n'
+    return poems
+
+
+def load_corpus(path):
+    """
+    读取诗文全文语料，返回 [{poet, title, content}]
+    - .json: 数组（元素是 {poet, title, content} 或 chinese-poetry 的 {author, title, paragraphs}），
+             或者 {诗人: {诗名: 全文}}
+    - .jsonl: 每行一首
+    - 其他: 文本，见 _parse_text_corpus
+    - 目录: 目录下所有 .json / .jsonl / .txt
+    """
+    if os.path.isdir(path):
+        poems = []
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(('.json', '.jsonl', '.txt')):
+                    poems.extend(load_corpus(os.path.join(root, name)))
+        return poems
+
+    lower = path.lower()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if lower.endswith('.jsonl'):
+            entries = [json.loads(line) for line in f if line.strip()]
+        elif lower.endswith('.json'):
+            data = json.load(f)
+            if isinstance(data, dict):
+                entries = [{'poet': poet, 'title': title, 'content': content}
+                           for poet, poems in data.items() for title, content in poems.items()]
+            else:
+                entries = data
+        else:
+            entries = _parse_text_corpus(f.read())
+
+    poems = [_poem_entry(entry) for entry in entries if isinstance(entry, dict)]
+    return [poem for poem in poems if poem['poet'] and poem['title'] and poem['content']]
+
+
+def split_clauses(content):
+    """全文切成 [(分句, 后面的标点)]，标点是 ，。？！； 之一，全文最后没有标点时为空串"""
+    content = _NOISE_RE.sub('', content)
+    return [(text, mark) for text, mark in _CLAUSE_RE.findall(content) if text.strip(_QUOTES)]
+
+
+def _blank(text, min_answer=0):
+    """
+    把分句换成占位符，两头的引号留在外面；返回 (题干片段, 答案)
+    答案里还有别的标点，或者不到 min_answer 个字（一字空、短语空）时返回 None
+    """
+    answer = text.strip(_QUOTES)
+    if len(answer) < max(min_answer, 1) or any(ch in PUNCTUATION for ch in answer):
+        return None
+    start = text.index(answer)
+    return text[:start] + PLACEHOLDER + text[start + len(answer):], answer
+
+
+def drill_pairs(clauses):
+    """
+    可以组成上下句的相邻分句下标 [(i, i + 1)]
+    上句以逗号结尾、下句以句末标点结尾（或者是全文最后一个分句）时才配对，不跨句，题干不会停在半句上
+    一句话超过两个分句时（"甲，乙，丙。"）只取最后两个分句
+    """
+    return [(i, i + 1) for i in range(len(clauses) - 1)
+            if clauses[i][1] == '，' and (clauses[i + 1][1] in SENTENCE_ENDS or i + 2 == len(clauses))]
+
+
+def poem_drills(poem, modes=MODES, difficulty=None, min_answer=0):
+    """一首诗的全部上句/下句题，同一首诗里题干相同的只留一道；答案不到 min_answer 个字的不出"""
+    clauses = split_clauses(poem['content'])
+    items = []
+    seen = set()
+    for i, j in drill_pairs(clauses):
+        (first, first_mark), (second, second_mark) = clauses[i], clauses[j]
+        for mode in modes:
+            if mode == 'next':
+                blanked = _blank(second, min_answer)
+                if blanked is None:
+                    continue
+                value = f"{first}{first_mark}{blanked[0]}{second_mark}"
+            else:
+                blanked = _blank(first, min_answer)
+                if blanked is None:
+                    continue
+                value = f"{blanked[0]}{first_mark}{second}{second_mark}"
+            answer = blanked[1]
+            # 叠句（"行路难，行路难"）题干里就有答案，没法考
+            if value in seen or answer in value.replace(PLACEHOLDER, ''):
+                continue
+            seen.add(value)
+            item = {'title': poem['title'], 'poet': poem['poet'], 'value': value, 'answer': [answer]}
+            if difficulty is not None:
+                item['difficulty'] = difficulty
+            items.append(item)
+    return items
+
+
+def generate_drills(poems, modes=MODES, per_poem=0, difficulty=None, seed=0, min_answer=0):
+    """
+    批量生成离线题目，按语料顺序排列
+    per_poem > 0 时每首诗按种子随机抽这么多题（抽出来的题保持在诗里的先后顺序）
+    """
+    rng = random.Random(seed)
+    items = []
+    for poem in poems:
+        drills = poem_drills(poem, modes, difficulty, min_answer)
+        if 0 < per_poem < len(drills):
+            keep = sorted(rng.sample(range(len(drills)), per_poem))
+            drills = [drills[i] for i in keep]
+        items.extend(drills)
+    return items
+
+
+def filter_corpus(poems, poet=None, title=None):
+    """按诗人、诗名筛选语料"""
+    return [poem for poem in poems
+            if (poet is None or poem['poet'] == poet) and (title is None or poem['title'] == title.strip('《》'))]
+
+
+def drills_from_corpus(path, poet=None, title=None, modes=None, per_poem=None, difficulty=None, seed=None):
+    """
+    读取语料并生成题目，没传的参数用配置里的 drill 设置
+    返回题目列表，读取失败返回 None
+    """
+    settings = get_drill_settings(load_config())
+    try:
+        poems = load_corpus(path)
+    except FileNotFoundError:
+        console.print(f"[red]✗ 语料不存在: {path}[/red]")
+        return None
+    except (ValueError, UnicodeDecodeError) as e:
+        console.print(f"[red]✗ 语料格式错误: {e}[/red]")
+        return None
+
+    poems = filter_corpus(poems, poet, title)
+    if not poems:
+        console.print("[yellow]⚠ 语料里没有符合条件的诗[/yellow]")
+        return []
+
+    return generate_drills(
+        poems,
+        modes=settings['modes'] if modes is None else modes,
+        per_poem=settings['per_poem'] if per_poem is None else per_poem,
+        difficulty=settings['difficulty'] if difficulty is None else difficulty,
+        seed=settings['seed'] if seed is None else seed,
+        min_answer=settings['min_answer'],
+    )
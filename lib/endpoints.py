@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from .config import get_api_token
+
+# 多个接口 / 多个 Key 组成的池子，请求按权重分到各个接口上
+# 单个接口连续失败达到阈值就熔断一段时间，冷却后放一个请求试探，成功再恢复
+# 限流（429）说明接口是好的只是太忙，不计入熔断，由调用方按 Retry-After 退避
+
+DEFAULT_POOL_SETTINGS = {
+    "failure_threshold": 3,    # 连续失败几次熔断
+    "cooldown_seconds": 30,    # 熔断后多久允许试探
+    "acquire_timeout": 60,     # 所有接口都满并发时最多等多久
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_failover_status(status):
+    """需要换接口重试的状态码：限流和服务端错误"""
+    return status == 429 or status >= 500
+
+
+class Endpoint:
+    """池子里的一个接口（地址 + Key + 模型），带并发计数和熔断状态"""
+
+    def __init__(self, name, url, token, model, weight=1, max_concurrency=0):
+        self.name = name
+        self.url = url
+        self.token = token
+        self.model = model
+        self.weight = max(1, int(weight))
+        self.max_concurrency = max(0, int(max_concurrency))  # 0 表示不限
+        self.in_flight = 0
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.calls = 0
+        self.errors = 0
+        self._current_weight = 0  # 平滑加权轮询用
+
+    def has_capacity(self):
+        return not self.max_concurrency or self.in_flight < self.max_concurrency
+
+    def is_open(self, now, cooldown):
+        """熔断中且还没到试探时间"""
+        if self.state == OPEN:
+            return now - self.opened_at < cooldown
+        # 半开状态只放一个试探请求
+        return self.state == HALF_OPEN and self.in_flight > 0
+
+    def snapshot(self):
+        return {
+            "name": self.name,
+            "url": self.url,
+            "model": self.model,
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "state": self.state,
+            "failures": self.failures,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+class EndpointPool:
+    """
+    接口池
+    acquire 挑一个可用的接口并占用一个并发名额，用完必须 release 并说明结果
+    挑选用平滑加权轮询（和 nginx 一样），权重高的分到更多请求，又不会连续扎堆
+    """
+
+    def __init__(self, endpoints, failure_threshold=3, cooldown_seconds=30):
+        if not endpoints:
+            raise ValueError("接口池不能为空")
+        self.endpoints = list(endpoints)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_seconds = float(cooldown_seconds)
+        self._cond = threading.Condition()
+
+    @property
+    def model(self):
+        """默认模型（第一个接口的），用于缓存键等不区分接口的场合"""
+        return self.endpoints[0].model
+
+    def try_acquire(self, exclude=()):
+        """
+        不等待地挑一个接口，exclude 是这次调用已经试过的接口
+        返回 (接口, None)；没挑到时返回 (None, 原因)，原因是 'busy'（都满并发）或 'unavailable'（都熔断或都试过了）
+        """
+        with self._cond:
+            return self._pick(exclude)
+
+    def acquire(self, exclude=(), timeout=None):
+        """挑一个接口，都满并发时等待，最多等 timeout 秒；都不可用时返回 None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                endpoint, reason = self._pick(exclude)
+                if endpoint is not None or reason != 'busy':
+                    return endpoint
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _pick(self, exclude):
+        now = time.monotonic()
+        candidates = []
+        busy = False
+        for endpoint in self.endpoints:
+            if endpoint in exclude or endpoint.is_open(now, self.cooldown_seconds):
+                continue
+            if not endpoint.has_capacity():
+                busy = True
+                continue
+            candidates.append(endpoint)
+        if not candidates:
+            return None, ('busy' if busy else 'unavailable')
+
+        total = 0
+        best = None
+        for endpoint in candidates:
+            endpoint._current_weight += endpoint.weight
+            total += endpoint.weight
+            if best is None or endpoint._current_weight > best._current_weight:
+                best = endpoint
+        best._current_weight -= total
+
+        if best.state == OPEN:
+            # 冷却时间到了，放这一个请求去试探
+            best.state = HALF_OPEN
+        best.in_flight += 1
+        best.calls += 1
+        return best, None
+
+    def reopen_delay(self, exclude=()):
+        """
+        还要等多少秒才有接口可以用（熔断的要等到能试探），有不在熔断中的接口时返回 0
+        exclude 里的接口不算，全被排除时返回 None
+        """
+        now = time.monotonic()
+        with self._cond:
+            delays = [
+                max(0.0, endpoint.opened_at + self.cooldown_seconds - now) if endpoint.state == OPEN else 0.0
+                for endpoint in self.endpoints if endpoint not in exclude
+            ]
+        return min(delays) if delays else None
+
+    def release(self, endpoint, success, rate_limited=False):
+        """
+        归还接口
+        success: True 成功；False 失败（服务端错误、超时、连不上），计入熔断；
+                 None 和接口健康无关的结果（比如请求本身有问题），不影响熔断状态
+        rate_limited: 被限流（429），记一次错误但不计入熔断；半开试探时收到限流说明接口能响应，直接恢复
+        """
+        with self._cond:
+            endpoint.in_flight -= 1
+            if rate_limited:
+                endpoint.errors += 1
+                if endpoint.state == HALF_OPEN:
+                    endpoint.state = CLOSED
+            elif success:
+                endpoint.failures = 0
+                endpoint.state = CLOSED
+            elif success is not None:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.state == HALF_OPEN or endpoint.failures >= self.failure_threshold:
+                    endpoint.state = OPEN
+                    endpoint.opened_at = time.monotonic()
+            elif endpoint.state == HALF_OPEN:
+                # 试探结果不明，回到熔断状态等下一次试探
+                endpoint.state = OPEN
+                endpoint.opened_at = time.monotonic()
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """各接口当前状态，给指标和状态输出用"""
+        with self._cond:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
+
+
+_pool = None
+_pool_signature = None
+_pool_lock = threading.Lock()
+
+
+def get_pool_settings(config):
+    """读取熔断和等待配置（failover），缺省的项用默认值"""
+    pool_config = config.get('failover', {})
+    settings = {}
+    for key, default in DEFAULT_POOL_SETTINGS.items():
+        try:
+            settings[key] = type(default)(pool_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    return settings
+
+
+def configured_endpoints(config):
+    """
+    从配置里整理出接口列表，每项是 dict(name, url, token, model, weight, max_concurrency)
+    没配 api.endpoints 时就是 api.url / api.token / api.model 这一个
+    endpoints 里没写的字段沿用 api 下的同名配置；token 也可以用 token_env 指定环境变量名
+    拿不到 token 的接口会被跳过
+    """
+    api_config = config.get('api', {})
+    base = {
+        "url": api_config.get('url', 'https://api.deepseek.com/v1/chat/completions'),
+        "model": api_config.get('model', 'deepseek-chat'),
+        "weight": 1,
+        "max_concurrency": 0,
+    }
+    entries = api_config.get('endpoints') or [{}]
+
+    result = []
+    for i, entry in enumerate(entries):
+        token = entry.get('token')
+        if not token and entry.get('token_env'):
+            token = os.getenv(entry['token_env'])
+        if not token:
+            token = get_api_token(config)
+        if not token:
+            continue
+        endpoint = dict(base)
+        endpoint.update({k: v for k, v in entry.items() if k in base})
+        endpoint['token'] = token
+        endpoint['name'] = entry.get('name') or f"endpoint-{i + 1}"
+        result.append(endpoint)
+    return result
+
+
+def get_endpoint_pool(config):
+    """
+    获取进程共享的接口池，接口配置变了才重建（熔断和并发状态跨调用保留）
+    一个可用接口都没有（没有 token）时返回 None
+    """
+    global _pool, _pool_signature
+    endpoints = configured_endpoints(config)
+    if not endpoints:
+        return None
+    settings = get_pool_settings(config)
+    signature = (tuple(tuple(sorted(e.items())) for e in endpoints), tuple(sorted(settings.items())))
+
+    with _pool_lock:
+        if _pool is None or _pool_signature != signature:
+            _pool = EndpointPool(
+                [Endpoint(**e) for e in endpoints],
+                failure_threshold=settings['failure_threshold'],
+                cooldown_seconds=settings['cooldown_seconds'],
+            )
+            _pool_signature = signature
+        return _pool
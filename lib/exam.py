@@ -0,0 +1,307 @@
+import os
+import random
+import string
+import time
+from collections import Counter, defaultdict, deque
+from .bank import open_bank
+from .config import load_config
+from .dedup import NearDuplicateDetector
+from .printer import POINTS_PER_QUESTION, render_test_papers
+from .console import console
+
+# 从题库组多份平行试卷（A/B/C 卷）
+# 约束：每首诗至少出几题、难度按比例分配、总分固定、相邻两份卷子没有相同的题
+# 做法是带随机的贪心：先保证每首诗都覆盖到，再按难度配额补满，补题时优先选出题少的诗
+# 候选题按 (已被用过几次, 随机数) 排好序，各份卷子会尽量用不同的题，几千道候选题每份卷子几毫秒
+
+DEFAULT_EXAM_SETTINGS = {
+    "variants": 3,          # 几份卷子
+    "total_score": 100,     # 每份卷子总分，题数 = 总分 / 每题分值
+    "min_per_poem": 1,      # 每首诗至少出几题
+    "mix": {},              # 难度占比，比如 {"0.9": 0.5, "0.5": 0.5}；为空时按题库里各难度的题数比例
+    "seed": 0,              # 随机种子，同样的题库和参数组出同样的卷子
+}
+
+
+def get_exam_settings(config):
+    """读取组卷配置（exam），缺省的项用默认值"""
+    exam_config = config.get('exam', {})
+    settings = {}
+    for key, default in DEFAULT_EXAM_SETTINGS.items():
+        try:
+            settings[key] = type(default)(exam_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['variants'] = max(1, settings['variants'])
+    settings['min_per_poem'] = max(0, settings['min_per_poem'])
+    return settings
+
+
+def parse_mix(text):
+    """解析命令行的难度占比，"0.9=0.5,0.5=0.3,0.2=0.2" → {"0.9": 0.5, ...}"""
+    mix = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        difficulty, _, share = part.partition('=')
+        try:
+            mix[difficulty.strip()] = float(share)
+        except ValueError:
+            raise ValueError(f"难度占比格式不对: {part}（应为 难度=占比）")
+    return mix
+
+
+def variant_label(index):
+    """第 index 份卷子的卷别：A、B、C……超过 26 份用数字"""
+    if index < len(string.ascii_uppercase):
+        return string.ascii_uppercase[index]
+    return str(index + 1)
+
+
+def allocate_quotas(mix, total):
+    """
+    按占比把 total 道题分给各难度，最大余数法，保证加起来正好是 total
+    占比不要求加起来等于 1，只看相对大小
+    """
+    weights = {k: v for k, v in mix.items() if v > 0}
+    weight_sum = sum(weights.values())
+    if not weights or total <= 0:
+        return {}
+    exact = {k: total * v / weight_sum for k, v in weights.items()}
+    quotas = {k: int(v) for k, v in exact.items()}
+    left = total - sum(quotas.values())
+    for k in sorted(exact, key=lambda k: exact[k] - quotas[k], reverse=True)[:left]:
+        quotas[k] += 1
+    return quotas
+
+
+def _difficulty(item):
+    difficulty = item.get('difficulty')
+    return '' if difficulty is None else str(difficulty)
+
+
+def _poem_key(item):
+    return (item.get('poet', '未知'), item.get('title', '未知'))
+
+
+class ExamAssembler:
+    """
+    组卷引擎
+    items 是候选题（题库 iter_items 返回的 dict，必须带 id），assemble 每调用一次组一份卷子
+    同一个引擎连续组的卷子，后一份不会用前一份的题，并且整体上尽量少重复用题
+    """
+
+    def __init__(self, items, questions, mix=None, cover=None, min_per_poem=1, seed=0):
+        self.items = list(items)
+        self.questions = max(1, int(questions))
+        self.min_per_poem = max(0, int(min_per_poem))
+        self.rng = random.Random(seed)
+        self.usage = Counter()
+        self.previous = set()
+
+        # 要覆盖的诗，默认是候选题里的全部诗，按题库顺序
+        poems = list(dict.fromkeys(_poem_key(item) for item in self.items))
+        self.cover = poems if cover is None else [tuple(key) for key in cover]
+
+        self._poem_of = {item['id']: _poem_key(item) for item in self.items}
+        counts = Counter(_difficulty(item) for item in self.items)
+        self._difficulties = list(counts)
+        self.mix = dict(mix) if mix else dict(counts)
+        self.quotas = allocate_quotas(self.mix, self.questions)
+        # 占比里写了题库没有的难度，提前提醒
+        self.missing_difficulties = [d for d in self.quotas if self.quotas[d] and not counts.get(d)]
+
+    def assemble(self, label=None):
+        """组一份卷子，返回 dict(label, items, groups, stats, warnings)"""
+        start = time.perf_counter()
+        rng = self.rng
+        warnings = []
+
+        # 按 (用过几次, 随机数) 排序，再按 (诗, 难度) 分到各个队列里，队头就是最该选的题
+        available = [item for item in self.items if item['id'] not in self.previous]
+        order = {item['id']: (self.usage[item['id']], rng.random()) for item in available}
+        available.sort(key=lambda item: order[item['id']])
+        queues = defaultdict(deque)
+        poems_by_difficulty = defaultdict(dict)
+        for item in available:
+            key = _poem_key(item)
+            difficulty = _difficulty(item)
+            queues[key, difficulty].append(item)
+            poems_by_difficulty[difficulty][key] = None
+
+        remaining = dict(self.quotas)
+        picked = []
+        per_poem = Counter()
+        detector = NearDuplicateDetector()
+
+        def take(key, difficulty):
+            queue = queues.get((key, difficulty))
+            while queue:
+                item = queue.popleft()
+                # 同一份卷子里不出近似重复的题，渲染时也就不会再被去掉
+                if detector.add(item, key=item['id']) is None:
+                    picked.append(item)
+                    per_poem[key] += 1
+                    remaining[difficulty] = remaining.get(difficulty, 0) - 1
+                    return True
+            return False
+
+        def by_need():
+            # 剩余配额多的难度优先，一样多时随机
+            return sorted(remaining, key=lambda d: (-remaining[d], rng.random()))
+
+        # 第一步：每首诗至少出 min_per_poem 题
+        cover = list(self.cover)
+        if len(cover) * self.min_per_poem > self.questions:
+            warnings.append(
+                f"{len(cover)} 首诗每首至少 {self.min_per_poem} 题超过了总题数 {self.questions}，只能覆盖一部分"
+            )
+            # 优先覆盖之前出题少的诗，各份卷子轮流覆盖
+            used = Counter()
+            for item_id, count in self.usage.items():
+                used[self._poem_of[item_id]] += count
+            rng.shuffle(cover)
+            cover.sort(key=lambda key: used[key])
+
+        for _ in range(self.min_per_poem):
+            for key in cover:
+                if len(picked) >= self.questions:
+                    break
+                if not any(take(key, d) for d in by_need() if remaining[d] > 0):
+                    # 配额内的难度没有这首诗的题，超一点配额也要覆盖到
+                    any(take(key, d) for d in self._difficulties)
+
+        # 第二步：按难度配额补满，同一难度里挑目前出题最少的诗
+        while len(picked) < self.questions:
+            progressed = False
+            for difficulty in by_need():
+                if remaining[difficulty] <= 0:
+                    break
+                if self._take_spread(take, difficulty, poems_by_difficulty, queues, per_poem):
+                    progressed = True
+                    break
+            if progressed:
+                continue
+            # 配额内的题用完了，放宽难度从别的难度补
+            for difficulty in self._difficulties:
+                if self._take_spread(take, difficulty, poems_by_difficulty, queues, per_poem):
+                    progressed = True
+                    break
+            if not progressed:
+                warnings.append(f"候选题不够，只组出 {len(picked)} 题（需要 {self.questions} 题）")
+                break
+
+        missing = [key for key in self.cover if not per_poem[key]]
+        if missing and self.min_per_poem and len(cover) * self.min_per_poem <= self.questions:
+            warnings.append("这些诗没有可用的题：" + "、".join(f"《{title}》" for _, title in missing))
+        over = {d: -n for d, n in remaining.items() if n < 0}
+        if over and self.quotas:
+            warnings.append("难度没能完全按比例分配：" + "，".join(
+                f"{d or '未标注'} 多出 {n} 题" for d, n in sorted(over.items())
+            ))
+        if self.missing_difficulties:
+            warnings.append("题库中没有这些难度的题：" + "、".join(self.missing_difficulties))
+
+        shared = sum(1 for item in picked if item['id'] in self.previous)
+        for item in picked:
+            self.usage[item['id']] += 1
+        self.previous = {item['id'] for item in picked}
+
+        # 按要覆盖的诗的顺序分组，同一首诗里按题号排
+        position = {key: i for i, key in enumerate(self.cover)}
+        groups = defaultdict(list)
+        for item in picked:
+            groups[_poem_key(item)].append(item)
+        ordered = sorted(groups.items(), key=lambda kv: (position.get(kv[0], len(position)), kv[0]))
+        for _, group in ordered:
+            group.sort(key=lambda item: item['id'])
+
+        return {
+            "label": label,
+            "items": [item for _, group in ordered for item in group],
+            "groups": ordered,
+            "warnings": warnings,
+            "stats": {
+                "questions": len(picked),
+                "score": len(picked) * POINTS_PER_QUESTION,
+                "poems": len(groups),
+                "difficulty": dict(Counter(_difficulty(item) for item in picked)),
+                "shared_with_previous": shared,
+                "seconds": time.perf_counter() - start,
+            },
+        }
+
+    def assemble_all(self, variants):
+        """连续组 variants 份卷子，卷别为 A、B、C……"""
+        return [self.assemble(variant_label(i)) for i in range(variants)]
+
+    @staticmethod
+    def _take_spread(take, difficulty, poems_by_difficulty, queues, per_poem):
+        """在某个难度里，从目前出题最少的诗里取一题"""
+        candidates = [key for key in poems_by_difficulty.get(difficulty, ()) if queues[key, difficulty]]
+        for key in sorted(candidates, key=lambda key: per_poem[key]):
+            if take(key, difficulty):
+                return True
+        return False
+
+
+def assemble_exams(variants=None, total_score=None, mix=None, min_per_poem=None, seed=None, bank_query=None):
+    """
+    从题库组多份平行试卷，每份写一对试卷和答案 HTML
+    没传的参数用配置里的 exam 设置；bank_query 是题库筛选条件（诗人、诗名、难度、时间）
+    返回 [(卷别, 试卷文件, 答案文件)]，失败返回 []
+    """
+    config = load_config()
+    settings = get_exam_settings(config)
+    variants = settings['variants'] if variants is None else max(1, variants)
+    total_score = settings['total_score'] if total_score is None else total_score
+    mix = settings['mix'] if mix is None else mix
+    min_per_poem = settings['min_per_poem'] if min_per_poem is None else min_per_poem
+    seed = settings['seed'] if seed is None else seed
+
+    questions = total_score // POINTS_PER_QUESTION
+    if questions <= 0 or total_score % POINTS_PER_QUESTION:
+        console.print(f"[red]✗ 总分必须是每题分值（{POINTS_PER_QUESTION} 分）的正整数倍[/red]")
+        return []
+
+    with open_bank(config) as bank:
+        candidates = bank.query(**(bank_query or {}))
+    if not candidates:
+        console.print("[red]✗ 题库中没有符合条件的题目[/red]")
+        return []
+
+    start = time.perf_counter()
+    assembler = ExamAssembler(candidates, questions, mix=mix, min_per_poem=min_per_poem, seed=seed)
+    papers = assembler.assemble_all(variants)
+    console.print(
+        f"[green]✓[/green] 从 {len(candidates)} 道候选题组出 {len(papers)} 份卷子，"
+        f"用时 {time.perf_counter() - start:.2f}s"
+    )
+
+    output_dir = config.get('paths', {}).get('output_dir', './output')
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    for paper in papers:
+        label = paper['label']
+        stats = paper['stats']
+        test_file = os.path.join(output_dir, f"诗词默写试卷-{label}.html")
+        answer_file = os.path.join(output_dir, f"诗词默写答案-{label}.html")
+        try:
+            render_test_papers(paper['groups'], test_file, answer_file, label=f"（{label}卷）")
+        except Exception as e:
+            console.print(f"[red]✗ 保存 {label} 卷失败: {e}[/red]")
+            continue
+        results.append((label, test_file, answer_file))
+
+        mix_text = "，".join(f"{d or '未标注'}: {n}" for d, n in sorted(stats['difficulty'].items()))
+        console.print(
+            f"  [bold]{label} 卷[/bold] {stats['questions']} 题 {stats['score']} 分，"
+            f"{stats['poems']} 首诗，难度 {mix_text}，和上一份重复 {stats['shared_with_previous']} 题"
+        )
+        console.print(f"    [dim]试卷：[/dim]{test_file}")
+        console.print(f"    [dim]答案：[/dim]{answer_file}")
+        for warning in paper['warnings']:
+            console.print(f"    [yellow]⚠ {warning}[/yellow]")
+    return results
@@ -1,147 +1,118 @@
 import json
 import os
+import threading
 from .api import api_single
 from .config import load_config
-from rich.console import Console
-from rich.panel import Panel
+from .bank import open_bank, get_bank_path
+from .validator import split_valid
+from .stream_json import IncrementalArrayParser, strip_code_fence
+from .refstore import open_reference_store, get_reference_dir
+from .retrieval import ReferenceIndex, get_reference_settings
+from .prompt import build_generate_messages, build_repair_messages
+from .console import console
 
-console = Console()
+# 参考库索引缓存，参考文件没变就不重新加载
+_reference_index = None
+_reference_signature = None
+_reference_lock = threading.Lock()
 
 
 def load_reference_data(config):
-    """加载参考数据"""
-    data_dir = config.get('paths', {}).get('data_dir', './data')
-    ref_file = os.path.join(data_dir, 'reference-original.json')
-    
-    if not os.path.exists(ref_file):
-        console.print(f"[yellow]⚠ 参考数据文件不存在: {ref_file}[/yellow]")
-        return []
-    
+    """加载参考数据（按批次的二维数组），老的 reference-original.json 第一次加载时转成新的存储"""
     try:
-        with open(ref_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            console.print(f"[dim]已加载 {len(data)} 条参考数据[/dim]")
-            return data
+        data = open_reference_store(config).load()
     except Exception as e:
         console.print(f"[red]✗ 读取参考数据失败: {e}[/red]")
         return []
 
+    if not data:
+        console.print(f"[yellow]⚠ 参考库为空: {get_reference_dir(config)}[/yellow]")
+        return []
+    console.print(f"[dim]已加载 {len(data)} 条参考数据[/dim]")
+    return data
+
+
+def load_reference_index(config):
+    """加载参考库的检索索引，快照部分用合并时存下的索引，不用逐条重建"""
+    try:
+        index = open_reference_store(config).load_index()
+    except Exception as e:
+        console.print(f"[red]✗ 读取参考数据失败: {e}[/red]")
+        return ReferenceIndex()
+
+    if not len(index):
+        console.print(f"[yellow]⚠ 参考库为空: {get_reference_dir(config)}[/yellow]")
+    else:
+        console.print(f"[dim]已加载 {len(index)} 道参考题目[/dim]")
+    return index
+
 
-def generate_questions(poet: str, poem: str, num: int, difficulty: str = "0.9"):
+def get_reference_index(config):
+    """获取参考库索引，参考库有追加或合并时重建"""
+    global _reference_index, _reference_signature
+    try:
+        store = open_reference_store(config)
+        signature = (os.path.abspath(store.directory), store.signature())
+    except Exception:
+        signature = (os.path.abspath(get_reference_dir(config)), None)
+
+    with _reference_lock:
+        if _reference_index is None or _reference_signature != signature:
+            _reference_index = load_reference_index(config)
+            _reference_signature = signature
+        return _reference_index
+
+
+def select_reference_examples(config, poet, poem):
+    """按配置的 top_k 和 token 预算挑选最相关的参考示例"""
+    settings = get_reference_settings(config)
+    index = get_reference_index(config)
+    return index.search(poet, poem, settings['top_k'], settings['token_budget'])
+
+
+def build_messages(poet, poem, num, difficulty, reference_data):
+    """组装出题请求的 messages，固定内容在前，方便命中服务商的前缀缓存"""
+    return build_generate_messages(poet, poem, num, difficulty, reference_data)
+
+
+def generate_questions(poet: str, poem: str, num: int, difficulty: str = "0.9", show_response=None,
+                       refresh=False, on_item=None):
     """
     生成诗词默写题目 题目必须是完整的一小句（以逗号或句号断） 禁止一字空或者短语空
+    refresh=True 时忽略本地缓存，强制重新请求
+    on_item(item): 流式接收过程中每解析出一道完整题目就调用一次（此时还未经过本地校验）
     """
     config = load_config()
-    reference_data = load_reference_data(config)
-    
-    # 系统提示词 - 格式细则
-    format_prompt = """格式细则：
-    **【核心要求】**  
-输出必须是纯净的JSON数组，没有任何额外文本、说明或标记。直接以`[`开始，以`]`结束。
-
-**【处理流程】**
-
-**第1步：解析题目与答案对应关系**  
-1. 识别输入文本中的每个独立诗篇（如《蜀相》理解性默写）  
-2. 在每个诗篇中识别所有编号题目（如`1．`、`2．`）  
-3. 定位文本末尾的答案集中区域，按诗篇标题找到每道题的对应答案
-
-**第2步：处理单道题目（严格按顺序执行）**  
-
-**A. 提取答案并正确拆分**  
-1. 从答案集中找到当前题目的答案原文  
-2. **强制按诗词真实断句拆分**：  
-   - 先按标点拆分：逗号（，）、句号（。）、问号（？）、感叹号（！）、分号（；）  
-   - **重要**：拆分后必须验证每个片段是否为合法的诗句断句  
-   - 示例：  
-     - 错误：`["酌酒以自宽举杯断绝歌路难"]`（未拆分）  
-     - 正确：`["酌酒以自宽", "举杯断绝歌路难"]`（按逗号拆分）  
-3. 如果答案原文无标点但明显是多个诗句，按诗词常识拆分：  
-   - 五言诗：2+3断句（如"床前明月光"拆为"床前"、"明月光"）  
-   - 七言诗：4+3断句（如"两个黄鹂鸣翠柳"拆为"两个黄鹂鸣翠柳"、"一行白鹭上青天"）  
-   - 注意：每个片段应有独立完整的意思  
-4. 统计答案片段数量，记为`n`
-
-**B. 构建value字段（关键步骤）**  
-1. 移除题目前的编号（如`1．`）及后续空格  
-2. 识别题目原文中的所有填空标记：  
-   - 下划线`_`、全角下划线`＿`、连续下划线`____`  
-   - 括号提示如`（_）`、`（__,__）`等  
-3. **占位符数量必须等于答案片段数量`n`**：  
-   - 如果题目原文中填空标记数量等于`n`：直接替换为`{{answer}}`  
-   - 如果填空标记数量少于`n`：在适当位置添加`{{answer}}`  
-     * 通常在诗句自然断句处添加  
-     * 保持句子通顺  
-   - 如果填空标记数量多于`n`：合并多余的标记  
-   - 若答案只有一句，value中也应当**只有1处{{answer}}**
-4. **标点位置处理**：  
-   - 答案片段间的标点（逗号、问号等）必须保留在`value`的`{{answer}}`之间  
-   - 示例：  
-     - 正确：`"{{answer}}，{{answer}}"`（两个占位符中间有逗号）  
-     - 错误：`"{{answer}}"`（当`n=2`时）
-
-**C. 字段提取**  
-1. `title`：从《诗名》中提取，去除书名号  
-2. `poet`：从"诗人《诗名》"格式中提取诗人，如未明确则补充常识  
-3. `answer`：确保每个片段：  
-   - 不包含任何标点  
-   - 是独立的诗句片段  
-   - 顺序与题目填空顺序一致
-
-**第3步：强制验证**  
-处理完每道题后必须检查：  
-1. `answer`数组长度 = `value`中`{{answer}}`的数量  
-2. 将`answer`片段依次代入`{{answer}}`，句子必须完整通顺  
-3. `answer`中无任何标点符号  
-4. 诗词断句符合常识（如不是生硬的2+2拆分五言诗）
-**JSON返回必须最小化 去掉不必要的格式空格 节约token**"""
-
-    # 难度说明
-    difficulty_prompt = """难度评判参考：1级（低难度/基础记忆）：
-
-考查点：直接考查最著名、最核心的名句、主旨句。题干描述与诗句字面意思高度重合。
-
-答案特征：通常是全篇的"诗眼"或千古名句，学生耳熟能详。
-
-示例题干："《岳阳楼记》中表达作者远大政治抱负的句子是'{{answer}}，{{answer}}。'"（答案：先天下之忧而忧，后天下之乐而乐）
-
-难度构成示例："考查核心主旨句，记忆强度高，理解要求低。"
-
-2级（中难度/标准理解）：
-
-考查点：考查对特定场景、手法或情感的理解。题干需要对诗句进行适度的概括、转述或术语化。
-
-答案特征：是文中的关键句，但未必是首推的那一两句。需要联系上下文才能准确锁定。
-
-示例题干："《琵琶行》中通过听众的寂静反应侧面烘托琵琶女演奏技艺高超的句子是'{{answer}}，{{answer}}。'"（答案：东船西舫悄无言，唯见江心秋月白）
-
-难度构成示例："考查特定艺术手法（侧面描写）下的句子，需在理解全文基础上进行定位。"
-
-3级（高难度/深度分析与综合）：
-
-考查点：考查对含蓄意象、复杂情感、深层逻辑或易混淆句的精准把握。题干描述高度抽象、概括，或设置微妙的辨析点。
-
-答案特征：可能是容易被忽略的句子，或与其它句子含义相近易混。需要对诗文有整体、深入的分析。
-
-示例题干："《赤壁赋》中，苏轼以'{{answer}}，{{answer}}'两句，形象地揭示了'变'与'不变'的哲学思考，体现了辩证观点。"（答案：盖将自其变者而观之，则天地曾不能以一瞬；自其不变者而观之，则物与我皆无尽也）
-
-难度构成示例："考查抽象哲学观点的具体对应句，句子较长，且文中另有表达相似情感的句子易造成干扰。"
-
-总体要求：不论什么难度 都不应当直接提及答案中的原词"""
-
-    messages = [
-        {"role": "system", "content": "学习诗文出题数据 返回符合数据格式的json字符串"},
-        {"role": "system", "content": format_prompt},
-        {"role": "system", "content": "数据：" + json.dumps(reference_data, ensure_ascii=False)},
-        {"role": "system", "content": difficulty_prompt},
-        {"role": "user", "content": f"生成:`{poet}`的`《{poem}》`的理解性默写 包含{num}道题目 难度为(最难为1){difficulty}"},
-    ]
+    # 只放最相关的几条参考题目，提示词长度不随参考库增长
+    reference_data = select_reference_examples(config, poet, poem)
+    messages = build_messages(poet, poem, num, difficulty, reference_data)
+
+    # 边接收边解析，每道题的右括号一到就交给 on_item
+    parser = IncrementalArrayParser()
+
+    def on_chunk(chunk):
+        for item in parser.feed(chunk):
+            if on_item:
+                on_item(item)
 
-    result = api_single(messages, temp=0.7)
+    result = api_single(messages, stream_callback=on_chunk, temp=0.7,
+                        show_response=show_response, refresh=refresh,
+                        tags={"poet": poet, "poem": poem, "kind": "generate"})
     
     if result is None:
         return None
-    
+
+    parsed = _parse_result(result, parser)
+    if not isinstance(parsed, list):
+        return parsed
+
+    # 本地校验，只把不合格的题目发回去修
+    rounds = int(config.get('generation', {}).get('repair_rounds', 1))
+    return _validate_and_repair(poet, poem, parsed, rounds, show_response)
+
+
+def _parse_result(result, parser=None):
+    """解析AI返回的JSON，整体解析失败时退回流式解析出的完整题目"""
     try:
         # 解析返回的JSON
         parsed = json.loads(result)
@@ -152,19 +123,100 @@ def generate_questions(poet: str, poem: str, num: int, difficulty: str = "0.9"):
         # 尝试修复常见的JSON问题
         try:
             # 有时候AI会返回markdown代码块
-            if "```json" in result:
-                result = result.split("```json")[1].split("```")[0].strip()
-            elif "```" in result:
-                result = result.split("```")[1].split("```")[0].strip()
-            parsed = json.loads(result)
+            parsed = json.loads(strip_code_fence(result))
             console.print("[green]✓[/green] 成功修复并解析JSON")
             return parsed
-        except:
-            return None
+        except json.JSONDecodeError:
+            pass
+
+    # 整体解析失败时，保留流式解析出来的完整题目
+    if parser is not None and parser.items:
+        console.print(
+            f"[yellow]⚠ 已从流式结果中保留 {len(parser.items)} 道完整题目"
+            f"（丢弃 {len(parser.errors)} 道损坏的）[/yellow]"
+        )
+        return parser.items
+    return None
+
+
+def repair_items(poet, poem, broken, show_response=None):
+    """
+    把校验没通过的题目连同错误说明单独发给AI修正
+    broken: [(原序号, 题目, 错误列表)]
+    返回修正后的题目列表，顺序和 broken 一致，失败返回 None
+    """
+    messages = build_repair_messages(poet, poem, broken)
+
+    result = api_single(messages, temp=0.2, show_response=show_response,
+                        tags={"poet": poet, "poem": poem, "kind": "repair"})
+    if result is None:
+        return None
+    repaired = _parse_result(result)
+    if isinstance(repaired, dict):
+        repaired = [repaired]
+    return repaired if isinstance(repaired, list) else None
+
+
+def _validate_and_repair(poet, poem, items, rounds, show_response=None):
+    """校验题目，不合格的最多修 rounds 轮，仍不合格的丢弃"""
+    items = list(items)
+    _, broken = split_valid(items)
+
+    for _ in range(max(0, rounds)):
+        if not broken:
+            break
+        console.print(f"[yellow]⚠ {len(broken)} 道题目未通过校验，正在单独修正...[/yellow]")
+        repaired = repair_items(poet, poem, broken, show_response)
+        if repaired is None:
+            break
+
+        if len(repaired) == len(broken):
+            # 数量对得上就放回原位置
+            for (index, _, _), item in zip(broken, repaired):
+                items[index] = item
+        else:
+            for index, _, _ in broken:
+                items[index] = None
+            items.extend(repaired)
+        items = [item for item in items if item is not None]
+        _, broken = split_valid(items)
+
+    if broken:
+        console.print(f"[yellow]⚠ 丢弃 {len(broken)} 道仍未通过校验的题目[/yellow]")
+        for _, item, errors in broken:
+            console.print(f"  [dim]{'；'.join(errors)}[/dim]")
+        bad = {id(item) for _, item, _ in broken}
+        items = [item for item in items if id(item) not in bad]
+
+    return items
+
+
+def save_to_bank(data, config, difficulty=None, import_key=None):
+    """
+    把题目追加到题库，之前生成的题目不会被覆盖，和库里近似重复的题会被跳过
+    import_key: 幂等键，同一个键的题目只写入一次（断点续跑时重复保存不会重复入库）
+    """
+    try:
+        with open_bank(config) as bank:
+            if import_key is not None and bank.has_import(import_key):
+                console.print(f"[dim]这批题目之前已经写入题库，跳过: {import_key}[/dim]")
+                return True
+            dedupe = config.get('bank', {}).get('dedupe', True)
+            count = bank.insert_many(data, difficulty=difficulty, dedupe=dedupe, import_key=import_key)
+        skipped = len(data) - count
+        console.print(
+            f"[green]✓[/green] 已加入题库 {count} 题"
+            + (f"，跳过重复 {skipped} 题" if skipped else "")
+            + f": [dim]{get_bank_path(config)}[/dim]"
+        )
+        return True
+    except Exception as e:
+        console.print(f"[red]✗ 写入题库失败: {e}[/red]")
+        return False
 
 
-def save_generated_data(data, config):
-    """保存生成的数据到文件"""
+def save_generated_data(data, config, difficulty=None, to_bank=True):
+    """保存生成的数据到文件，同时追加到题库（to_bank=False 时只写文件）"""
     data_dir = config.get('paths', {}).get('data_dir', './data')
     output_file = os.path.join(data_dir, 'generated.json')
     
@@ -172,7 +224,11 @@ def save_generated_data(data, config):
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
         console.print(f"[green]✓[/green] 数据已保存: [dim]{output_file}[/dim]")
-        return True
     except Exception as e:
         console.print(f"[red]✗ 保存数据失败: {e}[/red]")
         return False
+
+    # 题库写失败不影响本次打印
+    if to_bank:
+        save_to_bank(data, config, difficulty)
+    return True
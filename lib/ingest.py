@@ -0,0 +1,250 @@
+import glob
+import json
+import os
+import re
+import time
+from .api import api_single
+from .retrieval import estimate_tokens
+from .stream_json import parse_json_text
+
+# 批量导入原始题目：一次处理一个目录或一批文件
+# 太长的输入在诗 / 题的边界切成几块，每块不超过 token 预算，各块并发交给 AI 转换，结果按文件和块的顺序合并
+
+DEFAULT_INGEST_SETTINGS = {
+    "token_budget": 3000,   # 每块输入最多多少 token（估算），不含格式化提示词
+    "pattern": "*.txt",     # 目录里要导入的文件
+}
+
+# 诗篇标题行：带《诗名》、不以题号开头，比如 "《蜀相》理解性默写"、"一、杜甫《登高》"
+_POEM_RE = re.compile(r'^\s*(?:[一二三四五六七八九十]+\s*[、．.]\s*)?[^\d\s].*?《(?P<title>[^》]+)》|^\s*《(?P<title2>[^》]+)》')
+# 题号：1．、2.、3、（4）
+_NUMBER_RE = re.compile(r'^\s*[（(]?(?P<number>\d+)\s*[）)．.、]')
+# 答案区开头："答案"、"参考答案："、"【答案】"
+_ANSWER_RE = re.compile(r'^\s*[【\[]?\s*(?:参考)?答案\s*[】\]]?\s*[:：]?\s*$')
+# 标题行不会太长，也不会带填空横线，这样跨行的题干里引用的《诗名》不会被当成标题
+_TITLE_MAX_LENGTH = 40
+
+
+def get_ingest_settings(config):
+    """读取批量导入配置（ingest），缺省的项用默认值"""
+    ingest_config = config.get('ingest', {})
+    settings = {}
+    for key, default in DEFAULT_INGEST_SETTINGS.items():
+        try:
+            settings[key] = type(default)(ingest_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['token_budget'] = max(100, settings['token_budget'])
+    return settings
+
+
+def expand_inputs(inputs, pattern=DEFAULT_INGEST_SETTINGS['pattern']):
+    """
+    把命令行给的路径展开成文件列表：目录取里面匹配 pattern 的文件，通配符按 glob 展开
+    去重后按路径排序，保证每次处理顺序一样
+    """
+    files = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            files.extend(glob.glob(os.path.join(entry, '**', pattern), recursive=True))
+        elif glob.has_magic(entry):
+            files.extend(glob.glob(entry, recursive=True))
+        else:
+            files.append(entry)
+    return sorted({os.path.normpath(f) for f in files if not os.path.isdir(f)})
+
+
+def _split_sections(lines):
+    """按诗篇标题行切分，返回 [(诗名, 行列表)]，第一篇之前的内容诗名为 None"""
+    sections = [(None, [])]
+    for line in lines:
+        match = None
+        if len(line.strip()) <= _TITLE_MAX_LENGTH and '_' not in line and '＿' not in line \
+                and not _NUMBER_RE.match(line):
+            match = _POEM_RE.match(line)
+        if match:
+            sections.append((match.group('title') or match.group('title2'), [line]))
+        else:
+            sections[-1][1].append(line)
+    if not sections[0][1]:
+        sections.pop(0)
+    return sections
+
+
+def _split_numbered(lines):
+    """把一篇按题号切分，返回 (标题部分, [(题号, 行列表)])"""
+    head = []
+    questions = []
+    for line in lines:
+        match = _NUMBER_RE.match(line)
+        if match:
+            questions.append((match.group('number'), [line]))
+        elif questions:
+            questions[-1][1].append(line)
+        else:
+            head.append(line)
+    return head, questions
+
+
+def _join(lines):
+    return ''.join(lines)
+
+
+def _pack(pieces, budget):
+    """把 (文本, token 数) 按顺序装箱，每箱不超过 budget，单个超预算的自己一箱"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for text, tokens in pieces:
+        if current and current_tokens + tokens > budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_content(content, budget):
+    """
+    把一份输入切成不超过 budget token 的几块，返回文本列表
+    - 题目区按诗篇切，一篇太长再按题号切，每块都带上篇名那一行
+    - 文末集中的答案区按篇名（再按题号）跟着各自的题目走
+    - 认不出结构的文本按空行分段装箱
+    不超预算的输入原样返回一块
+    """
+    if estimate_tokens(content) <= budget:
+        return [content]
+
+    lines = content.splitlines(keepends=True)
+    answer_at = next((i for i, line in enumerate(lines) if _ANSWER_RE.match(line)), None)
+    question_lines = lines if answer_at is None else lines[:answer_at]
+    answer_header = [] if answer_at is None else [lines[answer_at]]
+    answer_sections = {} if answer_at is None else {
+        title: body for title, body in _split_sections(lines[answer_at + 1:]) if title
+    }
+
+    # 答案区没有按篇名分开（比如整卷统一编号），只能每块都带上整个答案区
+    shared_answers = ''
+    if answer_at is not None and not answer_sections:
+        shared_answers = _join(lines[answer_at:])
+        budget = max(1, budget - estimate_tokens(shared_answers))
+
+    sections = [s for s in _split_sections(question_lines) if s[0] is not None or _join(s[1]).strip()]
+    if not any(title for title, _ in sections):
+        # 没有篇名，按段落装箱
+        paragraphs = re.split(r'(?<=\n)(?=\s*\n)', _join(question_lines))
+        return [''.join(chunk) + shared_answers
+                for chunk in _pack(((p, estimate_tokens(p)) for p in paragraphs), budget)]
+
+    pieces = []
+    for title, body in sections:
+        answer = answer_sections.get(title, [])
+        text = _join(body) + (_join(answer_header + answer) if answer else '')
+        tokens = estimate_tokens(text)
+        if tokens <= budget or title is None:
+            pieces.append((text, tokens))
+            continue
+
+        # 一篇就超预算：按题号切，每块带上篇名和对应题号的答案
+        head, questions = _split_numbered(body)
+        answer_head, answers = _split_numbered(answer)
+        answers_by_number = {number: _join(part) for number, part in answers}
+        prefix = _join(head)
+        answer_prefix = _join(answer_header + answer_head)
+        # 每道题连同它的答案一起计入预算
+        numbered = [((number, _join(part)), estimate_tokens(_join(part) + answers_by_number.get(number, '')))
+                    for number, part in questions]
+        for group in _pack(numbered, budget - estimate_tokens(prefix + answer_prefix)):
+            text = prefix + ''.join(part for _, part in group)
+            matched = [answers_by_number[number] for number, _ in group if number in answers_by_number]
+            if matched:
+                text += answer_prefix + ''.join(matched)
+            pieces.append((text, estimate_tokens(text)))
+
+    return [''.join(chunk) + shared_answers for chunk in _pack(pieces, budget)]
+
+
+def _convert_chunk(prompt, file_index, chunk_index, text, refresh=False):
+    """把一块输入交给 AI 转成题目列表，返回结果记录"""
+    start = time.perf_counter()
+    items = []
+    error = None
+    try:
+        result = api_single(
+            [{'role': 'system', 'content': prompt}, {'role': 'user', 'content': text}],
+            show_response=False, refresh=refresh, tags={"task": "ingest"},
+        )
+        if result is None:
+            error = "API调用失败"
+        else:
+            parsed = parse_json_text(result)
+            if isinstance(parsed, dict):
+                parsed = [parsed]
+            items = [item for item in parsed if isinstance(item, dict)]
+    except json.JSONDecodeError as e:
+        error = f"JSON解析失败: {e}"
+    except Exception as e:
+        error = str(e)
+    return {
+        'file_index': file_index,
+        'chunk_index': chunk_index,
+        'ok': error is None,
+        'items': items,
+        'error': error,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def ingest_files(files, prompt, budget, workers=4, progress_callback=None, refresh=False):
+    """
+    并发转换多个文件
+    每个文件先切块，所有块放进同一个线程池；结果按 (文件, 块) 的顺序合并，和完成顺序无关
+    progress_callback(record, done, total): 每完成一块调用一次
+    返回按文件顺序排列的结果：[{file, chunks, failed, items, error}]
+    某个文件只要有一块失败，这个文件整体算失败，不返回它的题目（重新导入时成功的块会命中缓存）
+    """
+    reports = []
+    tasks = []
+    for file_index, path in enumerate(files):
+        report = {'file': path, 'chunks': 0, 'failed': 0, 'items': [], 'error': None}
+        reports.append(report)
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            report['error'] = f"读取失败: {e}"
+            continue
+        if not content.strip():
+            report['error'] = "文件为空"
+            continue
+        chunks = split_content(content, budget)
+        report['chunks'] = len(chunks)
+        tasks.extend((file_index, chunk_index, text) for chunk_index, text in enumerate(chunks))
+
+    results = {}
+    total = len(tasks)
+    # concurrent.futures 连带 logging 加载要二十毫秒左右，真正并发时再导入
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_convert_chunk, prompt, *task, refresh) for task in tasks]
+        done = 0
+        for future in as_completed(futures):
+            record = future.result()
+            results[record['file_index'], record['chunk_index']] = record
+            done += 1
+            if progress_callback:
+                progress_callback(record, done, total)
+
+    for file_index, report in enumerate(reports):
+        records = [results[file_index, i] for i in range(report['chunks'])]
+        errors = [f"第 {r['chunk_index'] + 1} 块：{r['error']}" for r in records if not r['ok']]
+        report['failed'] = len(errors)
+        if errors:
+            report['error'] = "；".join(errors)
+        elif report['error'] is None:
+            for record in records:
+                report['items'].extend(record['items'])
+    return reports
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# 批量任务的持久化队列：每个任务的状态和结果都存在 SQLite 里，进程崩溃或 Ctrl-C 之后重新运行只做没完成的任务
+# - 同一份任务列表（按内容算出 run 编号）再次运行时接着上次的进度，已经完成的任务直接读结果，不再调用 API
+# - 完成一个任务时状态和结果在同一个事务里写入，要么都写进去要么都没有
+# - 已经是 done 的任务不会再被改写，同一个任务重复完成只有第一次生效
+
+DEFAULT_JOB_STORE_FILE = "./data/jobs.db"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    nonce TEXT NOT NULL,
+    source TEXT,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id TEXT NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    elapsed REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (run_id, state);
+"""
+
+
+def get_job_store_path(config):
+    """任务队列文件路径，默认放在数据目录下"""
+    return config.get('paths', {}).get('job_store_file', DEFAULT_JOB_STORE_FILE)
+
+
+def run_id_for(jobs):
+    """任务列表的编号：内容（包括顺序）一样的任务列表编号一样，再次运行就能找到上次的进度"""
+    data = json.dumps(jobs, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+def job_key(run_id, position, nonce=None):
+    """
+    任务的幂等键，写题库时用它保证同一个任务的题目只写一次
+    nonce 每次登记新的运行时随机生成，--restart 之后同一份任务列表重新生成的题目用的是新键
+    """
+    if nonce:
+        return f"job:{run_id}:{nonce}:{position}"
+    return f"job:{run_id}:{position}"
+
+
+class JobStore:
+    """
+    SQLite 任务队列
+    runs 一行是一次批量运行（一份任务列表），jobs 一行是其中一个任务
+    任务状态：pending（未开始）→ running → done / failed
+    """
+
+    def __init__(self, path=DEFAULT_JOB_STORE_FILE):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 每个任务的结果都是花钱换来的，提交时要真正落盘
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open_run(self, jobs, source=None):
+        """
+        登记一份任务列表，返回 (run 编号, 是否接着上次的进度)
+        之前的进程崩溃时留下的 running 任务重新置为 pending
+        """
+        run_id = run_id_for(jobs)
+        now = time.time()
+        with self._lock, self._conn:
+            exists = self._conn.execute("SELECT 1 FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if exists:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE run_id = ? AND state = ?",
+                    (PENDING, now, run_id, RUNNING)
+                )
+                self._conn.execute("UPDATE runs SET updated_at = ? WHERE id = ?", (now, run_id))
+                return run_id, True
+            self._conn.execute(
+                "INSERT INTO runs (id, nonce, source, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, uuid.uuid4().hex[:12], source, len(jobs), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO jobs (run_id, position, params, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, i, json.dumps(job, ensure_ascii=False), PENDING, now) for i, job in enumerate(jobs)]
+            )
+            return run_id, False
+
+    def import_key(self, run_id, position):
+        """这次运行里某个任务写题库用的幂等键"""
+        with self._lock:
+            row = self._conn.execute("SELECT nonce FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return job_key(run_id, position, row[0] if row else None)
+
+    def unfinished(self, run_id):
+        """还要做的任务 [(序号, 任务)]，失败的任务也算，重新运行时再试一次"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, params FROM jobs WHERE run_id = ? AND state != ? ORDER BY position",
+                (run_id, DONE)
+            ).fetchall()
+        return [(position, json.loads(params)) for position, params in rows]
+
+    def finished(self, run_id):
+        """已经完成的任务 [(序号, 任务, 题目列表, 用时)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, params, result, elapsed FROM jobs WHERE run_id = ? AND state = ? ORDER BY position",
+                (run_id, DONE)
+            ).fetchall()
+        return [(position, json.loads(params), json.loads(result), elapsed or 0.0)
+                for position, params, result, elapsed in rows]
+
+    def start(self, run_id, position):
+        """标记任务开始执行；已经完成的任务返回 False，不用再做"""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE run_id = ? AND position = ? AND state != ?",
+                (RUNNING, time.time(), run_id, position, DONE)
+            )
+            return cur.rowcount == 1
+
+    def complete(self, run_id, position, items, elapsed=None):
+        """
+        任务完成，状态和结果在一个事务里写入
+        任务已经是 done 时什么都不改，返回 False
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, elapsed = ?, updated_at = ? "
+                "WHERE run_id = ? AND position = ? AND state != ?",
+                (DONE, json.dumps(items, ensure_ascii=False), elapsed, time.time(), run_id, position, DONE)
+            )
+            return cur.rowcount == 1
+
+    def fail(self, run_id, position, error, elapsed=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, elapsed = ?, updated_at = ? "
+                "WHERE run_id = ? AND position = ? AND state != ?",
+                (FAILED, str(error), elapsed, time.time(), run_id, position, DONE)
+            )
+
+    def counts(self, run_id):
+        """各状态的任务数"""
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for state, count in self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY state", (run_id,)
+            ):
+                counts[state] = count
+        return counts
+
+    def discard(self, run_id):
+        """删除一次运行的全部记录，下次从头开始"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def runs(self):
+        """返回 [(run 编号, 来源, 总数, 完成数, 最后更新时间)]，最近的在前"""
+        with self._lock:
+            return self._conn.execute("""
+                SELECT r.id, r.source, r.total, COUNT(j.position), r.updated_at
+                FROM runs r LEFT JOIN jobs j ON j.run_id = r.id AND j.state = ?
+                GROUP BY r.id ORDER BY r.updated_at DESC
+            """, (DONE,)).fetchall()
+
+
+def open_job_store(config):
+    return JobStore(get_job_store_path(config))
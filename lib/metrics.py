@@ -0,0 +1,259 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 已注册的指标输出，每次调用结束后把记录交给它们
+_sinks = []
+_sinks_lock = threading.Lock()
+_configured_files = set()
+
+
+def percentile(values, p):
+    """线性插值的百分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def cached_prompt_tokens(usage):
+    """
+    从 usage 里取出命中前缀缓存的输入 token 数，不同服务商字段不同：
+    DeepSeek: prompt_cache_hit_tokens / prompt_cache_miss_tokens
+    OpenAI 兼容: prompt_tokens_details.cached_tokens
+    没有这些字段时返回 None
+    """
+    if not usage:
+        return None
+    hit = usage.get('prompt_cache_hit_tokens')
+    if hit is not None:
+        return hit
+    details = usage.get('prompt_tokens_details') or {}
+    return details.get('cached_tokens')
+
+
+class CallTimer:
+    """
+    记录一次 API 调用的耗时和用量
+    start → 每收到一段内容调 on_chunk → finish 生成记录并分发给所有 sink
+    """
+
+    def __init__(self, model=None, tags=None):
+        self.model = model
+        self.tags = dict(tags or {})
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.chunks = 0
+        self.usage = None
+
+    def on_chunk(self, content):
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.chunks += 1
+
+    def on_usage(self, usage):
+        if usage:
+            self.usage = usage
+
+    def restart(self):
+        """排队等并发名额之后调用，从真正发请求时开始计时，返回排队等了多少秒"""
+        now = time.perf_counter()
+        waited = now - self.start_time
+        self.start_time = now
+        return waited
+
+    @property
+    def ttft(self):
+        """首字延迟秒数，还没收到内容时为 None"""
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    def finish(self, status, **extra):
+        """生成记录并分发，status: ok / cached / http_xxx / error"""
+        end = time.perf_counter()
+        usage = self.usage or {}
+        duration = end - self.start_time
+        ttft = self.ttft
+        completion_tokens = usage.get('completion_tokens')
+        # 生成速度按首字之后的时间算
+        stream_time = None if ttft is None else end - self.first_token_time
+        tokens_per_sec = None
+        if completion_tokens and stream_time and stream_time > 0:
+            tokens_per_sec = completion_tokens / stream_time
+
+        record = {
+            "ts": time.time(),
+            "model": self.model,
+            "status": status,
+            "ttft": ttft,
+            "duration": duration,
+            "chunks": self.chunks,
+            "prompt_tokens": usage.get('prompt_tokens'),
+            "cached_tokens": cached_prompt_tokens(usage),
+            "completion_tokens": completion_tokens,
+            "tokens_per_sec": tokens_per_sec,
+        }
+        record.update(self.tags)
+        record.update(extra)
+        emit(record)
+        return record
+
+
+class JsonlSink:
+    """每条记录追加一行 JSON 到文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class MemoryAggregator:
+    """内存里汇总调用记录，给出 p50/p95/p99 等统计，只保留最近 max_records 条"""
+
+    FIELDS = ("ttft", "duration", "tokens_per_sec")
+
+    def __init__(self, max_records=10000):
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.records = deque(maxlen=self.max_records)
+
+    def __call__(self, record):
+        # 只汇总调用记录，并发上限变化之类的事件记录（带 event 字段）不算
+        if 'event' in record:
+            return
+        with self._lock:
+            self.records.append(record)
+
+    def recent(self, field, limit=200, **filters):
+        """最近 limit 次成功调用里某个字段的值（不含缓存命中），从新到旧"""
+        values = []
+        with self._lock:
+            for r in reversed(self.records):
+                if r.get('status') != 'ok' or r.get(field) is None:
+                    continue
+                if all(r.get(k) == v for k, v in filters.items()):
+                    values.append(r[field])
+                    if len(values) >= limit:
+                        break
+        return values
+
+    def summary(self, **filters):
+        """
+        汇总统计，可按记录里的字段过滤（比如 model='deepseek-chat'）
+        延迟类指标只统计真正发出的成功请求，不含缓存命中
+        """
+        with self._lock:
+            records = [r for r in self.records
+                       if all(r.get(k) == v for k, v in filters.items())]
+
+        ok = [r for r in records if r.get('status') == 'ok']
+        result = {
+            "calls": len(records),
+            "ok": len(ok),
+            "cached": sum(1 for r in records if r.get('status') == 'cached'),
+            "errors": sum(1 for r in records if r.get('status') not in ('ok', 'cached')),
+            "prompt_tokens": sum(r.get('prompt_tokens') or 0 for r in ok),
+            "completion_tokens": sum(r.get('completion_tokens') or 0 for r in ok),
+        }
+        # 前缀缓存命中率只统计服务商返回了命中字段的调用
+        reported = [r for r in ok if r.get('cached_tokens') is not None and r.get('prompt_tokens')]
+        result["cached_tokens"] = sum(r['cached_tokens'] for r in reported)
+        reported_prompt = sum(r['prompt_tokens'] for r in reported)
+        result["prompt_cache_hit_rate"] = result["cached_tokens"] / reported_prompt if reported_prompt else None
+        for field in self.FIELDS:
+            values = [r[field] for r in ok if r.get(field) is not None]
+            for p in (50, 95, 99):
+                result[f"{field}_p{p}"] = percentile(values, p)
+        return result
+
+
+# 进程内默认的汇总器，总是注册
+_aggregator = MemoryAggregator()
+_sinks.append(_aggregator)
+
+
+def get_aggregator():
+    """进程内默认的汇总器"""
+    return _aggregator
+
+
+def add_sink(sink):
+    """注册一个指标输出，sink 是接收记录 dict 的可调用对象"""
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def emit(record):
+    """把记录交给所有 sink，单个 sink 出错不影响调用"""
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception as e:
+            print(f"[!] 指标输出失败: {e}")
+
+
+def configure_metrics(config):
+    """按配置注册 JSONL 输出（metrics.jsonl_file），同一个文件只注册一次"""
+    path = config.get('metrics', {}).get('jsonl_file')
+    if not path:
+        return
+    path = os.path.abspath(path)
+    with _sinks_lock:
+        if path in _configured_files:
+            return
+        _configured_files.add(path)
+    add_sink(JsonlSink(path))
+
+
+def format_summary(summary):
+    """把汇总结果排成几行文字，给批量任务结束时打印"""
+    def ms(v):
+        return "-" if v is None else f"{v * 1000:.0f}ms"
+
+    def rate(v):
+        return "-" if v is None else f"{v:.1f}"
+
+    return [
+        f"调用 {summary['calls']} 次：成功 {summary['ok']}，缓存 {summary['cached']}，失败 {summary['errors']}",
+        f"Token：输入 {summary['prompt_tokens']}，输出 {summary['completion_tokens']}",
+        format_prompt_cache(summary),
+        f"首字延迟 p50/p95/p99：{ms(summary['ttft_p50'])} / {ms(summary['ttft_p95'])} / {ms(summary['ttft_p99'])}",
+        f"总耗时 p50/p95/p99：{ms(summary['duration_p50'])} / {ms(summary['duration_p95'])} / {ms(summary['duration_p99'])}",
+        f"输出速度 p50/p95/p99（token/s）：{rate(summary['tokens_per_sec_p50'])} / "
+        f"{rate(summary['tokens_per_sec_p95'])} / {rate(summary['tokens_per_sec_p99'])}",
+    ]
+
+
+def format_prompt_cache(summary):
+    """前缀缓存命中情况，一行文字"""
+    rate = summary.get('prompt_cache_hit_rate')
+    if rate is None:
+        return "提示词前缀缓存：服务商未返回命中数据"
+    return f"提示词前缀缓存：命中 {summary['cached_tokens']} token，命中率 {rate:.0%}"
@@ -1,48 +1,23 @@
 import json
 import os
 from collections import defaultdict
+from html import escape
 from .config import load_config
-from rich.console import Console
+from .bank import open_bank
+from .dedup import NearDuplicateDetector
+from .console import console
 
-console = Console()
+# 输出写入缓冲区大小，分段写文件，内存占用和题目数量无关
+WRITE_BUFFER_SIZE = 1 << 20
 
+# 每题分值，试卷页脚按这个算总分
+POINTS_PER_QUESTION = 5
 
-def generate_test_papers(json_file=None):
-    """
-    生成试卷和答案HTML
-    """
-    config = load_config()
-    
-    # 如果没传文件路径，就用默认的
-    if json_file is None:
-        data_dir = config.get('paths', {}).get('data_dir', './data')
-        json_file = os.path.join(data_dir, 'generated.json')
-    
-    # 检查文件是否存在
-    if not os.path.exists(json_file):
-        console.print(f"[red]✗ 错误：文件 {json_file} 不存在！[/red]")
-        console.print("[yellow]⚠ 请先生成题目数据[/yellow]")
-        return None, None
-
-    # 读取JSON文件
-    try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except json.JSONDecodeError as e:
-        console.print(f"[red]✗ JSON解析错误: {e}[/red]")
-        return None, None
-    except Exception as e:
-        console.print(f"[red]✗ 读取文件错误: {e}[/red]")
-        return None, None
+PAPER_TITLE = "高中语文诗词默写测试卷"
+ANSWER_TITLE = "诗词默写测试卷参考答案"
 
-    # 按诗人和诗名分组
-    poem_dict = defaultdict(list)
-    for item in data:
-        key = (item.get('poet', '未知'), item.get('title', '未知'))
-        poem_dict[key].append(item)
-
-    # 生成试卷HTML（只有题目，没有答案）
-    test_paper = '''<!DOCTYPE html>
+# 试卷页头（只有题目，没有答案）
+PAPER_HEAD = '''<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -131,8 +106,8 @@ def generate_test_papers(json_file=None):
     </div>
 '''
 
-    # 生成答案HTML
-    answer_sheet = '''<!DOCTYPE html>
+# 答案页头
+ANSWER_HEAD = '''<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -203,84 +178,218 @@ def generate_test_papers(json_file=None):
     </div>
 '''
 
-    question_count = 0
-
-    # 为每首诗生成题目
-    for (poet, title), sentences in poem_dict.items():
-        # 去重
-        unique_sentences = []
-        seen_values = set()
-        for sentence in sentences:
-            if sentence.get('value') not in seen_values:
-                seen_values.add(sentence.get('value'))
-                unique_sentences.append(sentence)
-
-        # 添加到试卷
-        test_paper += f'''
+SECTION_OPEN = '''
     <div class="section">
         <div class="poem-title">{title}（{poet}）</div>
 '''
 
-        # 添加到答案
-        answer_sheet += f'''
-    <div class="section">
-        <div class="poem-title">{title}（{poet}）</div>
+SECTION_CLOSE = '''    </div>
 '''
 
-        # 生成每道题
-        for i, sentence in enumerate(unique_sentences):
-            question_count += 1
-
-            # 处理题目文本，将占位符替换为下划线
-            value_text = sentence.get('value', '')
-            answers = sentence.get('answer', [])
-            
-            for _ in answers:
-                value_text = value_text.replace("{{answer}}", "_______________", 1)
-            
-            value_text = value_text.replace('{{answer}}', "_______________")
-            
-            # 试卷：添加题目
-            test_paper += f'''
+PAPER_QUESTION = '''
         <div class="question">
-            <div class="question-text"><span class="question-number">{question_count}.</span>
-            {value_text}</div>
+            <div class="question-text"><span class="question-number">{number}.</span>
+            {text}</div>
         </div>
 '''
 
-            # 答案：创建完整的题目文本，将占位符替换为答案
-            original_text = sentence.get('value', '')
-            answer_text = original_text
-
-            # 将{{answer}}替换为实际答案
-            for answer_line in answers:
-                if "{{answer}}" in answer_text:
-                    answer_text = answer_text.replace("{{answer}}", f"<span class='answer'>{answer_line}</span>", 1)
-
-            # 答案：添加题目和答案（不换行）
-            answer_sheet += f'''
+ANSWER_QUESTION = '''
         <div class="full-question">
-            <span class="question-number">{question_count}.</span>
-            <span class="question-text">{answer_text}</span>
+            <span class="question-number">{number}.</span>
+            <span class="question-text">{text}</span>
         </div>
 '''
 
-        test_paper += '''    </div>
-'''
-        answer_sheet += '''    </div>
-'''
-
-    # 添加页脚
-    test_paper += f'''
+PAPER_FOOTER = '''
     <div class="footer">
-        共 {question_count} 题，每题 5 分，总分 {question_count * 5} 分
+        共 {count} 题，每题 {points} 分，总分 {score} 分
     </div>
 </body>
 </html>'''
 
-    answer_sheet += '''</body>
+ANSWER_FOOTER = '''</body>
 </html>'''
 
+PLACEHOLDER = "{{answer}}"
+BLANK = "_______________"
+
+# 预先绑定好的模板，循环里直接调用
+_section_open = SECTION_OPEN.format
+_paper_question = PAPER_QUESTION.format
+_answer_question = ANSWER_QUESTION.format
+
+
+def group_by_poem(data):
+    """按诗人和诗名分组，保持首次出现的顺序"""
+    poem_dict = defaultdict(list)
+    for item in data:
+        key = (item.get('poet', '未知'), item.get('title', '未知'))
+        poem_dict[key].append(item)
+    return poem_dict
+
+
+def render_question(value, answers):
+    """返回 (试卷上的题目文本, 答案上的题目文本)，题干和答案都做 HTML 转义"""
+    parts = [escape(part) for part in value.split(PLACEHOLDER)]
+    paper_text = BLANK.join(parts)
+
+    # 将{{answer}}依次替换为实际答案，答案不够的空保持原样
+    pieces = [parts[0]]
+    for i, part in enumerate(parts[1:]):
+        if i < len(answers):
+            pieces.append(f"<span class='answer'>{escape(str(answers[i]))}</span>")
+        else:
+            pieces.append(PLACEHOLDER)
+        pieces.append(part)
+    return paper_text, ''.join(pieces)
+
+
+def _dedupe(sentences, detector=None):
+    """同一首诗内按 value 去重；传入 detector 时再去掉和本卷已有题目近似重复的题（答案相同、题干改写）"""
+    unique_sentences = []
+    seen_values = set()
+    for sentence in sentences:
+        if sentence.get('value') not in seen_values:
+            seen_values.add(sentence.get('value'))
+            if detector is None or detector.add(sentence) is None:
+                unique_sentences.append(sentence)
+    return unique_sentences
+
+
+def render_test_papers(groups, test_file, answer_file, label=None, dedupe=False):
+    """
+    把分好组的题目流式写入试卷和答案文件
+    groups: 可迭代的 ((诗人, 诗名), 题目列表)，可以是生成器
+    label: 加在标题后面的卷别，比如 "（A卷）"；原样写进 HTML，来自外部输入时调用方要先转义
+    先写临时文件，全部写完再替换，中途出错不会留下半个文件
+    同一首诗内 value 完全相同的题只保留一道；dedupe=True 时整卷范围内再去掉近似重复的题
+    （要在内存里登记整卷题目的签名）
+    返回题目总数
+    """
+    test_tmp = test_file + '.tmp'
+    answer_tmp = answer_file + '.tmp'
+    question_count = 0
+    detector = NearDuplicateDetector() if dedupe else None
+
+    try:
+        with open(test_tmp, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as paper, \
+                open(answer_tmp, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as answer:
+            if label:
+                paper.write(PAPER_HEAD.replace(PAPER_TITLE, PAPER_TITLE + label))
+                answer.write(ANSWER_HEAD.replace(ANSWER_TITLE, ANSWER_TITLE + label))
+            else:
+                paper.write(PAPER_HEAD)
+                answer.write(ANSWER_HEAD)
+
+            # 为每首诗生成题目
+            for (poet, title), sentences in groups:
+                section = _section_open(title=escape(str(title)), poet=escape(str(poet)))
+                paper.write(section)
+                answer.write(section)
+
+                for sentence in _dedupe(sentences, detector):
+                    question_count += 1
+                    paper_text, answer_text = render_question(
+                        sentence.get('value', ''), sentence.get('answer', [])
+                    )
+                    paper.write(_paper_question(number=question_count, text=paper_text))
+                    answer.write(_answer_question(number=question_count, text=answer_text))
+
+                paper.write(SECTION_CLOSE)
+                answer.write(SECTION_CLOSE)
+
+            # 添加页脚
+            paper.write(PAPER_FOOTER.format(
+                count=question_count, points=POINTS_PER_QUESTION, score=question_count * POINTS_PER_QUESTION
+            ))
+            answer.write(ANSWER_FOOTER)
+
+        os.replace(test_tmp, test_file)
+        os.replace(answer_tmp, answer_file)
+    except BaseException:
+        for path in (test_tmp, answer_tmp):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    return question_count
+
+
+def generate_test_papers(json_file=None, bank_query=None):
+    """
+    生成试卷和答案HTML
+    bank_query: 不为 None 时直接从题库按条件选题（诗人、诗名、难度、时间、数量），忽略 json_file
+    """
+    config = load_config()
+
+    if bank_query is not None:
+        bank = open_bank(config)
+        if bank.count(**{k: v for k, v in bank_query.items() if k != 'limit'}) == 0:
+            bank.close()
+            console.print("[red]✗ 题库中没有符合条件的题目[/red]")
+            return None, None
+        groups = bank.iter_groups(**bank_query)
+    else:
+        bank = None
+        groups = _load_groups_from_json(config, json_file)
+        if groups is None:
+            return None, None
+
+    try:
+        return _write_papers(config, groups)
+    finally:
+        if bank is not None:
+            bank.close()
+
+
+def load_question_groups(json_file=None, bank_query=None):
+    """
+    读取题目并按诗分组，返回 [((诗人, 诗名), 题目列表)]，失败返回 None
+    参数同 generate_test_papers，结果整个放在内存里，给需要反复使用同一套题的场合（学生个人卷）
+    """
+    config = load_config()
+    if bank_query is None:
+        groups = _load_groups_from_json(config, json_file)
+        return None if groups is None else list(groups)
+
+    with open_bank(config) as bank:
+        groups = list(bank.iter_groups(**bank_query))
+    if not groups:
+        console.print("[red]✗ 题库中没有符合条件的题目[/red]")
+        return None
+    return groups
+
+
+def _load_groups_from_json(config, json_file):
+    """从JSON文件读取题目并按诗分组，失败返回 None"""
+    # 如果没传文件路径，就用默认的
+    if json_file is None:
+        data_dir = config.get('paths', {}).get('data_dir', './data')
+        json_file = os.path.join(data_dir, 'generated.json')
+    
+    # 检查文件是否存在
+    if not os.path.exists(json_file):
+        console.print(f"[red]✗ 错误：文件 {json_file} 不存在！[/red]")
+        console.print("[yellow]⚠ 请先生成题目数据[/yellow]")
+        return None
+
+    # 读取JSON文件
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        console.print(f"[red]✗ JSON解析错误: {e}[/red]")
+        return None
+    except Exception as e:
+        console.print(f"[red]✗ 读取文件错误: {e}[/red]")
+        return None
+
+    # 按诗人和诗名分组
+    return group_by_poem(data).items()
+
+
+def _write_papers(config, groups):
+    """渲染试卷和答案到输出目录，返回 (试卷文件, 答案文件)"""
     # 保存试卷和答案
     output_dir = config.get('paths', {}).get('output_dir', './output')
     
@@ -293,11 +402,9 @@ def generate_test_papers(json_file=None):
     answer_file = os.path.join(output_dir, "诗词默写答案.html")
 
     try:
-        with open(test_file, 'w', encoding='utf-8') as f:
-            f.write(test_paper)
-
-        with open(answer_file, 'w', encoding='utf-8') as f:
-            f.write(answer_sheet)
+        question_count = render_test_papers(
+            groups, test_file, answer_file, dedupe=config.get('printer', {}).get('dedupe', False)
+        )
 
         console.print(f"[green]✓[/green] 生成完成！")
         console.print(f"  [dim]试卷文件：[/dim]{test_file}")
@@ -0,0 +1,340 @@
+import json
+import os
+import re
+import threading
+import time
+from .retrieval import ReferenceIndex, flatten_reference_data
+
+# 参考库的存储：只追加的 JSONL 分段 + 定期合并出的快照
+# - 每次导入的一批题目是分段文件里的一行，追加一行就完事，和参考库多大无关
+# - 一行要么完整写进去要么不算（没有换行结尾或解析不了的行读的时候跳过），写到一半崩溃不会弄坏已有数据
+# - 分段多了合并成一个快照文件，manifest.json 记录快照覆盖到哪个分段，替换 manifest 是合并的提交点
+# - 合并时顺便把快照里题目的检索索引存成同代的 .index.json，加载时不用再逐条建索引，只补快照之后的分段
+# 老的 reference-original.json 第一次打开时整体转成快照
+
+DEFAULT_REFERENCE_STORE_SETTINGS = {
+    "segment_max_mb": 4,        # 单个分段超过这个大小就换新分段
+    "compact_segments": 8,      # 快照之后积累了这么多分段就合并
+    "fsync": True,              # 每次追加后刷到磁盘
+}
+
+LEGACY_FILE = "reference-original.json"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "compact.lock"
+# 合并锁超过这么久还在，认为是合并进程崩溃留下的
+STALE_LOCK_SECONDS = 600
+
+_SEGMENT_RE = re.compile(r'^segment-(\d{8})\.jsonl$')
+
+
+def _segment_name(number):
+    return f"segment-{number:08d}.jsonl"
+
+
+def _snapshot_name(generation):
+    return f"snapshot-{generation:08d}.jsonl"
+
+
+def _index_name(generation):
+    return f"snapshot-{generation:08d}.index.json"
+
+
+def _fsync_dir(directory):
+    # Windows 上目录不能 fsync，跳过
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _encode(batch):
+    return (json.dumps(batch, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def _read_lines(path):
+    """逐行读出批次，跳过没写完的行（没有换行结尾或 JSON 不完整）"""
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def get_reference_store_settings(config):
+    """读取参考库存储配置（reference_store），缺省的项用默认值"""
+    store_config = config.get('reference_store', {})
+    settings = {}
+    for key, default in DEFAULT_REFERENCE_STORE_SETTINGS.items():
+        try:
+            settings[key] = type(default)(store_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['compact_segments'] = max(1, settings['compact_segments'])
+    return settings
+
+
+class ReferenceStore:
+    """
+    参考库存储，目录结构：
+        manifest.json               {"snapshot": 快照文件名, "index": 索引文件名, "segment": 快照覆盖到的分段号,
+                                     "generation", "batches", "items"}
+        snapshot-00000003.jsonl     合并后的快照，一行一批
+        snapshot-00000003.index.json  快照里题目的检索索引（ReferenceIndex.postings）
+        segment-00000012.jsonl      快照之后追加的分段，编号最大的是当前写入的分段
+    """
+
+    def __init__(self, directory, segment_max_mb=4, compact_segments=8, fsync=True):
+        self.directory = directory
+        self.segment_max_bytes = int(segment_max_mb * 1024 * 1024)
+        self.compact_segments = compact_segments
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._compactor = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------------- 读 ----------------
+
+    def manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"snapshot": None, "segment": 0, "generation": 0, "batches": 0, "items": 0}
+
+    def segments(self, after=0):
+        """编号大于 after 的分段号，从小到大"""
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match and int(match.group(1)) > after:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def iter_batches(self):
+        """按写入顺序产出每一批题目：先快照，再快照之后的分段"""
+        manifest = self.manifest()
+        if manifest.get('snapshot'):
+            yield from _read_lines(os.path.join(self.directory, manifest['snapshot']))
+        for number in self.segments(after=manifest.get('segment', 0)):
+            yield from _read_lines(os.path.join(self.directory, _segment_name(number)))
+
+    def load(self):
+        """全部批次，和 reference-original.json 一样是二维数组"""
+        return list(self.iter_batches())
+
+    def load_index(self):
+        """
+        全部题目的检索索引，题目顺序和 flatten_reference_data(load()) 一致
+        快照部分直接用合并时存下的索引，快照之后的分段逐条追加；索引文件缺失、损坏或和快照对不上时重新建
+        """
+        manifest = self.manifest()
+        items = []
+        if manifest.get('snapshot'):
+            items = flatten_reference_data(_read_lines(os.path.join(self.directory, manifest['snapshot'])))
+
+        index = None
+        if manifest.get('index'):
+            try:
+                with open(os.path.join(self.directory, manifest['index']), 'r', encoding='utf-8') as f:
+                    postings = json.load(f)
+                if postings.get('generation') == manifest.get('generation'):
+                    index = ReferenceIndex.from_postings(items, postings)
+            except (OSError, ValueError):
+                index = None
+        if index is None:
+            index = ReferenceIndex(items)
+
+        for number in self.segments(after=manifest.get('segment', 0)):
+            index.extend(flatten_reference_data(_read_lines(os.path.join(self.directory, _segment_name(number)))))
+        return index
+
+    def signature(self):
+        """manifest 和各分段的大小、修改时间，任何一次追加或合并都会变，用来判断缓存是否失效"""
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            if name == MANIFEST_FILE or _SEGMENT_RE.match(name):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((name, st.st_size, st.st_mtime_ns))
+        return tuple(entries)
+
+    # ---------------- 写 ----------------
+
+    def append(self, batch):
+        """
+        追加一批题目，返回写入的分段号
+        整行一次 write 到 O_APPEND 打开的文件，上一行没写完（崩溃留下的半行）时先补一个换行把它隔开
+        """
+        data = _encode(batch)
+        with self._lock:
+            manifest = self.manifest()
+            numbers = self.segments(after=manifest.get('segment', 0))
+            number = numbers[-1] if numbers else manifest.get('segment', 0) + 1
+            path = os.path.join(self.directory, _segment_name(number))
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                size = 0
+            if size and size + len(data) > self.segment_max_bytes:
+                number += 1
+                path = os.path.join(self.directory, _segment_name(number))
+                size = 0
+
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                if size:
+                    with open(path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            data = b'\n' + data
+                os.write(fd, data)
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            if not size and self.fsync:
+                _fsync_dir(self.directory)
+            return number
+
+    def needs_compaction(self):
+        manifest = self.manifest()
+        return len(self.segments(after=manifest.get('segment', 0))) >= self.compact_segments
+
+    def compact(self):
+        """
+        把快照和已经写满的分段（除了编号最大的那个）合并成新快照
+        新快照写完并落盘后替换 manifest，之后才删旧文件；中途崩溃时旧的 manifest 仍然有效
+        另一个进程正在合并时直接返回 False
+        """
+        lock_path = os.path.join(self.directory, LOCK_FILE)
+        if not self._acquire_lock(lock_path):
+            return False
+        try:
+            manifest = self.manifest()
+            numbers = self.segments(after=manifest.get('segment', 0))
+            # 当前写入的分段留着不动，别的进程可能正在往里追加
+            sealed = numbers[:-1]
+            if not sealed:
+                return False
+
+            paths = [os.path.join(self.directory, _segment_name(n)) for n in sealed]
+            if manifest.get('snapshot'):
+                paths.insert(0, os.path.join(self.directory, manifest['snapshot']))
+            generation = manifest.get('generation', 0) + 1
+            self._write_snapshot(generation, (b for path in paths for b in _read_lines(path)),
+                                 segment=sealed[-1])
+
+            # 新 manifest 生效之后旧文件就没人读了
+            if manifest.get('index'):
+                paths.append(os.path.join(self.directory, manifest['index']))
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return True
+        finally:
+            os.remove(lock_path)
+
+    def compact_in_background(self):
+        """需要合并时在后台线程里合并，不阻塞调用方；线程不是守护线程，进程退出前会等它做完"""
+        if not self.needs_compaction():
+            return None
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+            self._compactor = threading.Thread(target=self.compact, name="reference-compact")
+            self._compactor.start()
+            return self._compactor
+
+    def import_legacy(self, path):
+        """把老格式的 reference-original.json 转成快照，只在存储还是空的时候做"""
+        manifest = self.manifest()
+        if manifest.get('snapshot') or self.segments():
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._write_snapshot(1, (batch for batch in data), segment=0, legacy=os.path.abspath(path))
+        return True
+
+    def _write_snapshot(self, generation, batches, segment, **extra):
+        name = _snapshot_name(generation)
+        path = os.path.join(self.directory, name)
+        count = 0
+        items = 0
+        index = ReferenceIndex()
+        with open(path + '.tmp', 'wb') as f:
+            for batch in batches:
+                f.write(_encode(batch))
+                count += 1
+                items += len(batch) if isinstance(batch, list) else 1
+                index.extend(flatten_reference_data([batch]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+        # 索引和快照同代，在 manifest 替换之前落盘，manifest 指向的索引一定是完整的
+        index_name = _index_name(generation)
+        index_path = os.path.join(self.directory, index_name)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(dict(index.postings(), generation=generation), f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(index_path + '.tmp', index_path)
+
+        manifest = {"snapshot": name, "index": index_name, "segment": segment, "generation": generation,
+                    "batches": count, "items": items, "compacted_at": time.time()}
+        manifest.update(extra)
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + '.tmp', manifest_path)
+        _fsync_dir(self.directory)
+        return manifest
+
+    def _acquire_lock(self, lock_path):
+        for _ in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) < STALE_LOCK_SECONDS:
+                        return False
+                    os.remove(lock_path)
+                except OSError:
+                    return False
+        return False
+
+
+def get_reference_dir(config):
+    data_dir = config.get('paths', {}).get('data_dir', './data')
+    return os.path.join(data_dir, 'reference')
+
+
+def open_reference_store(config):
+    """
+    打开参考库存储，第一次打开时把老的 reference-original.json 转进来
+    """
+    settings = get_reference_store_settings(config)
+    store = ReferenceStore(
+        get_reference_dir(config),
+        segment_max_mb=settings['segment_max_mb'],
+        compact_segments=settings['compact_segments'],
+        fsync=settings['fsync'],
+    )
+    data_dir = config.get('paths', {}).get('data_dir', './data')
+    legacy = os.path.join(data_dir, LEGACY_FILE)
+    if os.path.exists(legacy) and not os.path.exists(os.path.join(store.directory, MANIFEST_FILE)):
+        store.import_legacy(legacy)
+    return store
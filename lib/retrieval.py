@@ -0,0 +1,177 @@
+import json
+from collections import defaultdict
+
+# 默认检索配置
+DEFAULT_REFERENCE_SETTINGS = {
+    "top_k": 12,
+    "token_budget": 2000
+}
+
+# 打分权重：同一首诗 > 同一诗人 > 文本相似
+TITLE_WEIGHT = 20.0
+POET_WEIGHT = 5.0
+NGRAM_WEIGHT = 1.0
+
+NGRAM_SIZE = 2
+
+# 存下来的索引的格式版本，切分或打分用的字段变了就加一，旧索引作废重建
+INDEX_VERSION = 1
+
+
+def get_reference_settings(config):
+    """读取参考示例的检索配置"""
+    settings = dict(DEFAULT_REFERENCE_SETTINGS)
+    settings.update(config.get('reference', {}))
+    settings['top_k'] = max(0, int(settings['top_k']))
+    settings['token_budget'] = max(0, int(settings['token_budget']))
+    return settings
+
+
+def flatten_reference_data(data):
+    """参考库是按批次追加的二维数组，摊平成单条题目列表"""
+    items = []
+    for entry in data:
+        if isinstance(entry, list):
+            items.extend(item for item in entry if isinstance(item, dict))
+        elif isinstance(entry, dict):
+            items.append(entry)
+    return items
+
+
+def char_ngrams(text, n=NGRAM_SIZE):
+    """字符 n-gram，去掉空白和常见标点"""
+    text = ''.join(ch for ch in text if ch.strip() and ch not in '，。？！；：、“”‘’《》（）{}_,.?!;:"\'()')
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中文按一字一 token，其余按四字符一 token"""
+    cjk = sum(1 for ch in text if '一' <= ch <= '鿿')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def serialize_example(item):
+    """示例的紧凑序列化，选择时估算长度和放进提示词用同一份"""
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+
+class ReferenceIndex:
+    """
+    参考题目的倒排索引
+    按诗人、诗名和 value/answer 的字符 n-gram 建索引，出题时只挑最相关的几条做示例
+    """
+
+    def __init__(self, items=()):
+        self.items = []
+        self.by_poet = defaultdict(list)
+        self.by_title = defaultdict(list)
+        self.by_ngram = defaultdict(list)
+        self._sizes = []
+        self.extend(items)
+
+    def extend(self, items):
+        """把题目追加到索引末尾，已有题目的序号不变"""
+        for item in items:
+            i = len(self.items)
+            self.items.append(item)
+            poet = str(item.get('poet', '')).strip()
+            title = str(item.get('title', '')).strip().strip('《》')
+            if poet:
+                self.by_poet[poet].append(i)
+            if title:
+                self.by_title[title].append(i)
+
+            answer = item.get('answer', [])
+            if isinstance(answer, list):
+                answer = ''.join(str(a) for a in answer)
+            text = str(item.get('value', '')) + str(answer)
+            for gram in char_ngrams(text):
+                self.by_ngram[gram].append(i)
+
+            self._sizes.append(estimate_tokens(serialize_example(item)))
+
+    def postings(self):
+        """索引本身（不含题目），可以存成 JSON，和同样顺序的题目一起交给 from_postings 还原"""
+        return {
+            "version": INDEX_VERSION,
+            "ngram_size": NGRAM_SIZE,
+            "items": len(self.items),
+            "by_poet": self.by_poet,
+            "by_title": self.by_title,
+            "by_ngram": self.by_ngram,
+            "sizes": self._sizes,
+        }
+
+    @classmethod
+    def from_postings(cls, items, postings):
+        """
+        用存下来的索引还原，省掉逐条切 n-gram 和估算长度
+        索引的版本或题目数对不上时返回 None，调用方重新建
+        """
+        if (postings.get('version') != INDEX_VERSION or postings.get('ngram_size') != NGRAM_SIZE
+                or postings.get('items') != len(items)):
+            return None
+        index = cls()
+        index.items = list(items)
+        index.by_poet = defaultdict(list, postings['by_poet'])
+        index.by_title = defaultdict(list, postings['by_title'])
+        index.by_ngram = defaultdict(list, postings['by_ngram'])
+        index._sizes = postings['sizes']
+        return index
+
+    def __len__(self):
+        return len(self.items)
+
+    def search(self, poet, poem, top_k=DEFAULT_REFERENCE_SETTINGS['top_k'],
+               token_budget=DEFAULT_REFERENCE_SETTINGS['token_budget']):
+        """
+        返回与 (poet, poem) 最相关的示例，数量不超过 top_k，总 token 估算不超过 token_budget
+        相关的不够时，用其他诗的题目补齐（每首诗轮流取一条），保证模型有格式可参照
+        """
+        if top_k <= 0 or not self.items:
+            return []
+
+        poet = poet.strip()
+        poem = poem.strip().strip('《》')
+        scores = defaultdict(float)
+
+        for i in self.by_title.get(poem, []):
+            scores[i] += TITLE_WEIGHT
+        for i in self.by_poet.get(poet, []):
+            scores[i] += POET_WEIGHT
+        for gram in char_ngrams(poet + poem):
+            for i in self.by_ngram.get(gram, []):
+                scores[i] += NGRAM_WEIGHT
+
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))
+        if len(ranked) < top_k:
+            ranked.extend(self._diverse_fill(set(ranked), top_k - len(ranked)))
+
+        selected = []
+        used = 0
+        for i in ranked:
+            if len(selected) >= top_k:
+                break
+            size = self._sizes[i]
+            if used + size > token_budget:
+                continue
+            selected.append(self.items[i])
+            used += size
+        return selected
+
+    def _diverse_fill(self, exclude, count):
+        """从不同的诗里轮流各取一条"""
+        queues = [[i for i in ids if i not in exclude] for ids in self.by_title.values()]
+        queues = [q for q in queues if q]
+        picked = []
+        depth = 0
+        while len(picked) < count and queues:
+            queues = [q for q in queues if len(q) > depth]
+            for q in queues:
+                if len(picked) >= count:
+                    break
+                picked.append(q[depth])
+            depth += 1
+        return picked
@@ -0,0 +1,75 @@
+import random
+import time
+from .metrics import get_aggregator, percentile
+
+# 失败重试和对冲请求的策略
+# 重试：所有接口都试过一轮还失败时，指数退避加随机抖动后再来一轮，服务端给了 Retry-After 就至少等这么久
+# 对冲：首字迟迟不来（超过最近首字延迟的某个百分位）时再发一路请求，谁先出内容用谁
+
+DEFAULT_RETRY_SETTINGS = {
+    "max_attempts": 3,          # 一次调用最多发几次请求（含换接口和对冲）
+    "base_delay": 1.0,          # 第一轮退避的秒数，之后每轮翻倍
+    "max_delay": 30.0,          # 退避上限
+    "hedge": False,             # 是否启用对冲请求
+    "hedge_percentile": 95,     # 首字延迟超过最近调用的这个百分位就对冲
+    "hedge_min_samples": 20,    # 最近样本少于这个数时不对冲
+    "hedge_min_delay": 1.0,     # 对冲等待时间的下限
+}
+
+# 计算对冲阈值时看最近多少次成功调用
+HEDGE_WINDOW = 200
+
+
+def get_retry_settings(config):
+    """读取重试配置（retry），缺省的项用默认值"""
+    retry_config = config.get('retry', {})
+    settings = {}
+    for key, default in DEFAULT_RETRY_SETTINGS.items():
+        try:
+            settings[key] = type(default)(retry_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['max_attempts'] = max(1, settings['max_attempts'])
+    return settings
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种写法，返回秒数，解析不了返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # email.utils 加载要十几毫秒，只有服务端给了日期格式时才用得到
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def backoff_delay(round_number, settings, retry_after=None, rng=random):
+    """
+    第 round_number 轮（从 1 开始）重试前的等待秒数
+    指数退避 + 一半随机抖动，避免大量调用同时醒来再次撞上限流；Retry-After 更长时以它为准
+    """
+    delay = min(settings['max_delay'], settings['base_delay'] * (2 ** (round_number - 1)))
+    delay = delay / 2 + rng.uniform(0, delay / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def hedge_delay(settings, model=None):
+    """
+    对冲前等待首字的秒数，按最近成功调用的首字延迟百分位计算
+    没开对冲或样本不够时返回 None
+    """
+    if not settings['hedge']:
+        return None
+    filters = {"model": model} if model else {}
+    values = get_aggregator().recent('ttft', limit=HEDGE_WINDOW, **filters)
+    if len(values) < settings['hedge_min_samples']:
+        return None
+    return max(settings['hedge_min_delay'], percentile(values, settings['hedge_percentile']))
@@ -0,0 +1,421 @@
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from .api import close_session, get_session
+from .bank import open_bank
+from .batch import normalize_job
+from .concurrency import get_limiter
+from .config import load_config
+from .console import console
+from .endpoints import get_endpoint_pool
+from .generator import generate_questions, get_reference_index, save_to_bank
+from .metrics import get_aggregator
+from .printer import group_by_poem, render_test_papers
+
+# 常驻的本地 HTTP 服务，给教务系统之类的程序调用
+# 配置、参考库索引、HTTP 连接池、题库连接都常驻内存，每次调用不用重新加载
+# 出题和渲染放进任务队列由固定数量的线程执行；参数完全相同、还没做完的请求合并成同一个任务，只调一次 API
+
+DEFAULT_SERVICE_SETTINGS = {
+    "host": "127.0.0.1",
+    "port": 8321,
+    "workers": 4,               # 执行任务的线程数
+    "max_finished_jobs": 1000,  # 保留多少个已结束的任务供查询
+    "wait_timeout": 300,        # 同步请求最多等多少秒，超时返回任务号，之后再查
+    "token": "",                # 不为空时请求必须带 Authorization: Bearer <token>
+    "bank_limit": 1000,         # 题库查询一次最多返回多少题
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def get_service_settings(config):
+    """读取服务配置（service），缺省的项用默认值"""
+    service_config = config.get('service', {})
+    settings = {}
+    for key, default in DEFAULT_SERVICE_SETTINGS.items():
+        try:
+            settings[key] = type(default)(service_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['workers'] = max(1, settings['workers'])
+    return settings
+
+
+class Job:
+    """队列里的一个任务"""
+
+    def __init__(self, job_id, kind, params, key):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.requests = 1  # 合并进来的请求数
+        self.done = threading.Event()
+
+    def to_dict(self, with_result=True):
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "requests": self.requests,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if with_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """
+    任务队列
+    handlers 是 {任务类型: 处理函数(job) -> 结果 dict}，由 workers 个线程从队列里取任务执行
+    submit 时如果有参数相同、还没结束的任务，直接返回那个任务（合并），不重复执行
+    """
+
+    def __init__(self, handlers, workers=4, max_finished=1000):
+        self.handlers = handlers
+        self.max_finished = max_finished
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}  # 合并键 -> 未结束的任务
+        self._ids = itertools.count(1)
+        self._coalesced = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"service-worker-{i + 1}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def make_key(kind, params):
+        return kind + ':' + json.dumps(params, ensure_ascii=False, sort_keys=True)
+
+    def submit(self, kind, params):
+        """提交任务，返回 (任务, 是否合并到了已有任务)"""
+        if kind not in self.handlers:
+            raise ValueError(f"未知的任务类型: {kind}")
+        key = self.make_key(kind, params)
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                job.requests += 1
+                self._coalesced += 1
+                return job, True
+            job = Job(f"{kind}-{next(self._ids)}-{int(time.time())}", kind, params, key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._queue.put(job)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            counts["coalesced"] = self._coalesced
+            counts["workers"] = len(self._threads)
+            return counts
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status = RUNNING
+            job.started = time.time()
+            try:
+                job.result = self.handlers[job.kind](job)
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            job.finished = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+                self._trim()
+            job.done.set()
+
+    def _trim(self):
+        # 只清理已经结束的旧任务，排队和执行中的任务一直保留
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set() or job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+
+def _parse_bank_query(params):
+    """把 HTTP 参数整理成题库筛选条件"""
+    query = {}
+    for key in ('poet', 'title'):
+        if params.get(key):
+            query[key] = str(params[key])
+    difficulty = params.get('difficulty')
+    if difficulty:
+        if isinstance(difficulty, str):
+            difficulty = [d for d in difficulty.split(',') if d]
+        query['difficulty'] = [str(d) for d in difficulty]
+    if params.get('days'):
+        query['since'] = time.time() - float(params['days']) * 86400
+    elif params.get('since'):
+        query['since'] = float(params['since'])
+    if params.get('until'):
+        query['until'] = float(params['until'])
+    return query
+
+
+class PoetryService:
+    """服务的状态和各个接口的实现，HTTP 层只负责解析请求和返回 JSON"""
+
+    def __init__(self, config=None):
+        self.config = config or load_config()
+        self.settings = get_service_settings(self.config)
+        self.started = time.time()
+        self.bank = open_bank(self.config)
+        self.jobs = JobQueue(
+            {"generate": self._run_generate, "render": self._run_render},
+            workers=self.settings['workers'],
+            max_finished=self.settings['max_finished_jobs'],
+        )
+
+    def warm_up(self):
+        """启动时把参考库索引、连接池、接口池都建好，第一次请求不用等"""
+        config = load_config()
+        index = get_reference_index(config)
+        get_session(config)
+        get_endpoint_pool(config)
+        get_limiter(config)
+        return len(index)
+
+    def close(self):
+        self.jobs.close()
+        self.bank.close()
+        close_session()
+
+    # ---------------- 任务 ----------------
+
+    def _run_generate(self, job):
+        params = job.params
+        items = generate_questions(
+            params['poet'], params['poem'], params['num'], params['difficulty'],
+            show_response=False, refresh=params['refresh'],
+        )
+        if items is None:
+            raise RuntimeError("生成失败")
+        if isinstance(items, dict):
+            items = [items]
+        saved = False
+        if items and params['save']:
+            saved = save_to_bank(items, load_config(), params['difficulty'])
+        return {"items": items, "count": len(items), "saved": saved}
+
+    def _run_render(self, job):
+        params = job.params
+        if params.get('items') is not None:
+            groups = list(group_by_poem(params['items']).items())
+        else:
+            query = _parse_bank_query(params.get('query') or {})
+            if params.get('limit'):
+                query['limit'] = int(params['limit'])
+            groups = list(self.bank.iter_groups(**query))
+        if not groups:
+            raise ValueError("没有可以渲染的题目")
+
+        output_dir = os.path.join(load_config().get('paths', {}).get('output_dir', './output'), 'service')
+        os.makedirs(output_dir, exist_ok=True)
+        test_file = os.path.join(output_dir, f"{job.id}-试卷.html")
+        answer_file = os.path.join(output_dir, f"{job.id}-答案.html")
+        # 卷别来自请求，转义后才能写进页面
+        label = escape(str(params['label'])) if params.get('label') else None
+        count = render_test_papers(groups, test_file, answer_file, label=label)
+
+        result = {"count": count, "test_file": os.path.abspath(test_file), "answer_file": os.path.abspath(answer_file)}
+        if params.get('inline'):
+            with open(test_file, 'r', encoding='utf-8') as f:
+                result["test_html"] = f.read()
+            with open(answer_file, 'r', encoding='utf-8') as f:
+                result["answer_html"] = f.read()
+        return result
+
+    def submit(self, kind, params):
+        """
+        提交任务，wait 为真（默认）时等任务结束再返回
+        返回 (HTTP 状态码, 响应 dict)
+        """
+        wait = params.pop('wait', True)
+        job, coalesced = self.jobs.submit(kind, params)
+        if wait:
+            job.done.wait(self.settings['wait_timeout'])
+        data = job.to_dict()
+        data["coalesced"] = coalesced
+        if job.status == DONE:
+            return 200, data
+        if job.status == FAILED:
+            return 500, data
+        return 202, data
+
+    # ---------------- 查询 ----------------
+
+    def query_bank(self, params):
+        query = _parse_bank_query(params)
+        limit = int(params.get('limit') or self.settings['bank_limit'])
+        query['limit'] = max(1, min(limit, self.settings['bank_limit']))
+        items = self.bank.query(**query)
+        total = self.bank.count(**{k: v for k, v in query.items() if k != 'limit'})
+        return {"items": items, "count": len(items), "total": total}
+
+    def list_poems(self):
+        poems = self.bank.poems()
+        return {"poems": [{"poet": poet, "title": title, "questions": count} for poet, title, count in poems]}
+
+    def health(self):
+        config = load_config()
+        pool = get_endpoint_pool(config)
+        limiter = get_limiter(config)
+        snapshot = limiter.snapshot() if limiter is not None else None
+        if snapshot is not None:
+            snapshot.pop('history', None)
+        return {
+            "status": "ok",
+            "uptime": time.time() - self.started,
+            "jobs": self.jobs.stats(),
+            "reference_items": len(get_reference_index(config)),
+            "endpoints": pool.snapshot() if pool is not None else [],
+            "concurrency": snapshot,
+            "calls": get_aggregator().summary(),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "PoetryService/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        console.print(f"[dim]{self.address_string()} {format % args}[/dim]")
+
+    def _send(self, status, data, close=False):
+        """
+        返回 JSON 响应
+        close=True 时回完就关闭连接：请求体可能还没读完，留在连接上的字节会被当成下一个请求
+        """
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if close:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.service.settings['token']
+        if not token:
+            return True
+        if self.headers.get('Authorization', '') == f"Bearer {token}":
+            return True
+        # 不读未授权请求的请求体，直接断开
+        self._send(401, {"error": "未授权"}, close=True)
+        return False
+
+    def _internal_error(self, error):
+        """处理请求时的意外错误（数据库、API 等）返回 500，不让连接无响应地断掉"""
+        console.print(f"[red]✗ 处理请求 {self.command} {self.path} 出错: {error!r}[/red]")
+        self._send(500, {"error": str(error) or type(error).__name__}, close=True)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是 JSON 对象")
+        return data
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == '/health':
+                return self._send(200, self.service.health())
+            if url.path == '/bank':
+                return self._send(200, self.service.query_bank(params))
+            if url.path == '/bank/poems':
+                return self._send(200, self.service.list_poems())
+            if url.path.startswith('/jobs/'):
+                job = self.service.jobs.get(url.path[len('/jobs/'):])
+                if job is None:
+                    return self._send(404, {"error": "任务不存在"})
+                return self._send(200, job.to_dict())
+            self._send(404, {"error": "接口不存在"})
+        except (TypeError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._internal_error(e)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        try:
+            params = self._read_json()
+            if url.path == '/generate':
+                # 先统一参数（title/poem、数字/字符串写法），写法不同的相同请求也能合并；参数有问题直接返回 400
+                job = normalize_job(params)
+                job['refresh'] = bool(params.get('refresh', False))
+                job['save'] = bool(params.get('save', True))
+                job['wait'] = params.get('wait', True)
+                return self._send(*self.service.submit('generate', job))
+            if url.path == '/render':
+                return self._send(*self.service.submit('render', params))
+            self._send(404, {"error": "接口不存在"})
+        except (TypeError, ValueError) as e:
+            # Content-Length 写错时请求体没读，连接不能再用
+            self._send(400, {"error": str(e)}, close=True)
+        except Exception as e:
+            self._internal_error(e)
+
+
+def create_server(service, host=None, port=None):
+    """创建 HTTP 服务（还没开始监听循环），port=0 时由系统分配端口"""
+    host = service.settings['host'] if host is None else host
+    port = service.settings['port'] if port is None else port
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
@@ -0,0 +1,122 @@
+import json
+from json.decoder import scanstring
+
+DONE = b'[DONE]'
+
+_CONTENT_KEYS = ('"content":"', '"content": "')
+
+
+class SSEDecoder:
+    """
+    Server-Sent Events 字节流解码器
+    直接处理大块字节，按空行切分事件，支持 \\n / \\r\\n / \\r 换行、多行 data、注释行
+    只关心 data 字段，event / id / retry 字段忽略
+    """
+
+    def __init__(self):
+        self._buf = b''
+        self._data = []  # 当前事件已收到的 data 行
+
+    def feed(self, chunk):
+        """喂入一块字节，返回这块数据里完成的事件 data 列表（bytes，多行用 \\n 连接）"""
+        if not chunk:
+            return []
+        buf = self._buf + chunk if self._buf else chunk
+
+        if b'\r' in buf:
+            # 结尾的 \r 可能和下一块开头的 \n 组成 \r\n，先留着
+            hold = buf.endswith(b'\r')
+            if hold:
+                buf = buf[:-1]
+            buf = buf.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            if hold:
+                buf += b'\r'
+
+        lines = buf.split(b'\n')
+        self._buf = lines.pop()
+
+        events = []
+        data = self._data
+        for line in lines:
+            if not line:
+                # 空行：事件结束
+                if data:
+                    events.append(data[0] if len(data) == 1 else b'\n'.join(data))
+                    data = []
+                continue
+            if line[0] == 0x3A:  # ':' 开头是注释
+                continue
+            if line.startswith(b'data:'):
+                value = line[5:]
+                if value[:1] == b' ':
+                    value = value[1:]
+                data.append(value)
+            # 其他字段不需要
+        self._data = data
+        return events
+
+    def flush(self):
+        """流结束时调用，返回没有以空行结尾的最后一个事件"""
+        events = []
+        if self._buf and self._buf != b'\r':
+            events = self.feed(b'\n')
+        if self._data:
+            events.append(b'\n'.join(self._data))
+            self._data = []
+        self._buf = b''
+        return events
+
+
+def extract_delta(data):
+    """
+    从一个 chat.completion.chunk 事件里取出 (是否结束, delta.content, usage)
+    常见情况直接定位 content 字符串，用 json 的 C 扫描函数只解码这一段，不做整段 JSON 解析
+    带 usage 或格式不常见时退回 json.loads
+    """
+    if data == DONE:
+        return True, '', None
+
+    text = data.decode('utf-8')
+    if '"usage":{' not in text and '"usage": {' not in text:
+        for key in _CONTENT_KEYS:
+            start = text.find(key)
+            if start >= 0:
+                try:
+                    return False, scanstring(text, start + len(key))[0], None
+                except ValueError:
+                    break
+        else:
+            if '"content"' not in text:
+                # 没有 content 也没有 usage 的块（比如只有 role）
+                return False, '', None
+
+    # 完整解析
+    try:
+        chunk = json.loads(text)
+        # 带 usage 的最后一块 choices 可能是空数组
+        choices = chunk.get('choices') or [{}]
+        delta = choices[0].get('delta') or {}
+        return False, delta.get('content') or '', chunk.get('usage')
+    except (ValueError, AttributeError):
+        return False, '', None
+
+
+def iter_deltas(chunks):
+    """
+    从字节块迭代器里逐个产出 (content, usage)，遇到 [DONE] 结束
+    chunks 可以是 response.iter_content(None) 之类
+    """
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        for data in decoder.feed(chunk):
+            finished, content, usage = extract_delta(data)
+            if finished:
+                return
+            if content or usage:
+                yield content, usage
+    for data in decoder.flush():
+        finished, content, usage = extract_delta(data)
+        if finished:
+            return
+        if content or usage:
+            yield content, usage
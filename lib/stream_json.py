@@ -0,0 +1,113 @@
+import json
+
+
+def strip_code_fence(text):
+    """AI 有时会把 JSON 包在 markdown 代码块里，去掉代码块标记"""
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
+
+def parse_json_text(text):
+    """解析 AI 返回的 JSON，失败时去掉代码块再试一次，仍失败抛出 JSONDecodeError"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(strip_code_fence(text))
+
+
+class IncrementalArrayParser:
+    """
+    流式 JSON 数组解析器
+    边接收 AI 的输出边解析，数组里每个对象的右括号一到就把这个对象解析出来
+    数组开始之前的内容（比如 ```json、"好的[注意]："）会被跳过，单个对象坏了只丢这一个
+    只有后面（跳过空白）紧跟 { 或 ] 的 [ 才算数组开始，前言里的方括号不会被当成数组
+    """
+
+    def __init__(self):
+        self.items = []
+        self.errors = []
+        self.started = False   # 是否已经遇到数组的 [
+        self._opening = False  # 刚遇到一个 [，还要看后面是不是 { 或 ]（可能在下一段文本里）
+        self.finished = False  # 是否已经遇到数组的 ]
+        self._buf = []         # 当前对象已收到的文本片段
+        self._depth = 0        # 当前对象内的括号深度，0 表示在对象之间
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """喂入一段文本，返回这段文本里新完成的对象列表"""
+        completed = []
+        i = 0
+        n = len(text)
+
+        while i < n and not self.finished:
+            if not self.started:
+                if self._opening:
+                    ch = text[i]
+                    if ch.isspace():
+                        i += 1
+                        continue
+                    self._opening = False
+                    # 是 { 或 ] 就从这个字符开始按数组处理，否则从这个字符接着找下一个 [
+                    self.started = ch in '{]'
+                    continue
+                pos = text.find('[', i)
+                if pos < 0:
+                    return completed
+                self._opening = True
+                i = pos + 1
+                continue
+
+            if self._depth == 0:
+                # 在对象之间，只关心下一个 { 或者数组结束
+                ch = text[i]
+                if ch == '{':
+                    self._depth = 1
+                    self._buf = ['{']
+                elif ch == ']':
+                    self.finished = True
+                i += 1
+                continue
+
+            # 在对象内部，找到本段文本里对象结束的位置
+            start = i
+            while i < n:
+                ch = text[i]
+                i += 1
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == '\\':
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch == '{' or ch == '[':
+                    self._depth += 1
+                elif ch == '}' or ch == ']':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        break
+
+            self._buf.append(text[start:i])
+            if self._depth == 0:
+                obj = self._finish_object()
+                if obj is not None:
+                    completed.append(obj)
+
+        return completed
+
+    def _finish_object(self):
+        raw = ''.join(self._buf)
+        self._buf = []
+        try:
+            obj = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.errors.append((raw, str(e)))
+            return None
+        self.items.append(obj)
+        return obj
@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import io
+import os
+import random
+import re
+import shutil
+import time
+import zipfile
+from html import escape
+from .config import load_config
+from .dedup import dedupe_items
+from .printer import render_test_papers
+from .console import console
+
+# 学生个人卷：同一套题，每个学生一份打乱了顺序的试卷和答案，防止抄袭
+# 每个学生的随机种子由考试种子和学号算出来，同一个学生重新生成还是同一份卷子
+# 渲染分块交给进程池，每个学生写自己的文件，最后打成一个 zip
+
+DEFAULT_STUDENT_PAPER_SETTINGS = {
+    "workers": 0,           # 进程数，0 表示按 CPU 核数
+    "chunk_size": 50,       # 每个任务渲染多少个学生，太小进程间通信开销大，太大负载不均
+    "seed": 0,              # 考试种子，换一个种子所有学生的顺序都会变
+}
+
+MANIFEST_NAME = "manifest.csv"
+
+_UNSAFE_RE = re.compile(r'[\\/:*?"<>|\s]+')
+
+# 子进程里的题目，进程池初始化时设置一次，不用每个任务都传一遍
+_worker_groups = None
+
+
+def get_student_paper_settings(config):
+    """读取学生个人卷配置（student_papers），缺省的项用默认值"""
+    student_config = config.get('student_papers', {})
+    settings = {}
+    for key, default in DEFAULT_STUDENT_PAPER_SETTINGS.items():
+        try:
+            settings[key] = type(default)(student_config.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    if settings['workers'] <= 0:
+        settings['workers'] = os.cpu_count() or 1
+    settings['chunk_size'] = max(1, settings['chunk_size'])
+    return settings
+
+
+def load_roster(path):
+    """
+    读取学生名单，每行 "学号,姓名"（CSV，姓名可省略），空行和 # 开头的行跳过
+    返回 [(学号, 姓名)]
+    """
+    students = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            student_id = row[0].strip()
+            name = row[1].strip() if len(row) > 1 else ''
+            students.append((student_id, name))
+    return students
+
+
+def numbered_roster(count):
+    """没有名单时按序号生成学生：001、002……"""
+    width = max(3, len(str(count)))
+    return [(str(i + 1).zfill(width), '') for i in range(count)]
+
+
+def student_seed(exam_seed, student_id):
+    """学生的随机种子，用 sha256 而不是内置 hash，跨进程、跨次运行都稳定"""
+    digest = hashlib.sha256(f"{exam_seed}:{student_id}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def shuffle_groups(groups, seed):
+    """按种子打乱诗的顺序和每首诗里的题目顺序，诗还是分节排列"""
+    rng = random.Random(seed)
+    shuffled = [(key, list(items)) for key, items in groups]
+    rng.shuffle(shuffled)
+    for _, items in shuffled:
+        rng.shuffle(items)
+    return shuffled
+
+
+def _file_stem(index, student_id):
+    # 序号保证文件名唯一，学号里不能做文件名的字符换掉
+    safe_id = _UNSAFE_RE.sub('_', student_id).strip('_') or 'student'
+    return f"{index + 1:04d}-{safe_id}"
+
+
+def _init_worker(groups):
+    global _worker_groups
+    _worker_groups = groups
+
+
+def _render_chunk(staging_dir, students):
+    """子进程里渲染一批学生，students 是 [(序号, 学号, 姓名, 种子)]，返回 manifest 行"""
+    rows = []
+    for index, student_id, name, seed in students:
+        stem = _file_stem(index, student_id)
+        test_name = f"{stem}-试卷.html"
+        answer_name = f"{stem}-答案.html"
+        # 学号、姓名来自名单，转义后再写进页面标题
+        label = escape(f"（{' '.join(part for part in (student_id, name) if part)}）")
+        count = render_test_papers(
+            shuffle_groups(_worker_groups, seed),
+            os.path.join(staging_dir, test_name),
+            os.path.join(staging_dir, answer_name),
+            label=label,
+        )
+        rows.append((student_id, name, seed, test_name, answer_name, count))
+    return rows
+
+
+def render_student_papers(groups, students, archive_file, seed=0, workers=1, chunk_size=50, dedupe=False):
+    """
+    为每个学生渲染一份打乱顺序的试卷和答案，打包成 archive_file（zip）
+    groups: [((诗人, 诗名), 题目列表)]；students: [(学号, 姓名)]
+    dedupe=True 时近似重复的题在这里统一去掉一次，子进程里不再重复去重
+    返回 manifest 行列表 [(学号, 姓名, 种子, 试卷文件名, 答案文件名, 题数)]
+    """
+    ids = [student_id for student_id, _ in students]
+    if len(set(ids)) != len(ids):
+        raise ValueError("学生名单里有重复的学号")
+
+    if dedupe:
+        items = dedupe_items([item for _, group in groups for item in group])
+        kept = {id(item) for item in items}
+        groups = [(key, [item for item in group if id(item) in kept]) for key, group in groups]
+        groups = [(key, group) for key, group in groups if group]
+
+    tasks = [(i, student_id, name, student_seed(seed, student_id))
+             for i, (student_id, name) in enumerate(students)]
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    staging_dir = archive_file + '.parts'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    try:
+        # 进程完成的顺序不固定，结果按批次的序号放回去，manifest 和 zip 都按名单顺序
+        results = [None] * len(chunks)
+        if workers <= 1 or len(chunks) <= 1:
+            _init_worker(groups)
+            for i, chunk in enumerate(chunks):
+                results[i] = _render_chunk(staging_dir, chunk)
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                     initializer=_init_worker, initargs=(groups,)) as executor:
+                futures = {executor.submit(_render_chunk, staging_dir, chunk): i for i, chunk in enumerate(chunks)}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        rows = [row for part in results for row in part]
+
+        archive_tmp = archive_file + '.tmp'
+        with zipfile.ZipFile(archive_tmp, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            manifest = [("学号", "姓名", "种子", "试卷", "答案", "题数")] + rows
+            # 姓名、学号里可能有逗号或引号，交给 csv 转义；带 BOM 方便 Excel 识别编码
+            with io.TextIOWrapper(archive.open(MANIFEST_NAME, 'w'), encoding='utf-8-sig', newline='') as f:
+                csv.writer(f).writerows(manifest)
+            for row in rows:
+                for name in row[3:5]:
+                    archive.write(os.path.join(staging_dir, name), name)
+        os.replace(archive_tmp, archive_file)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if os.path.exists(archive_file + '.tmp'):
+            os.remove(archive_file + '.tmp')
+    return rows
+
+
+def generate_student_papers(groups, students, seed=None, workers=None):
+    """
+    生成学生个人卷压缩包到输出目录，返回压缩包路径，失败返回 None
+    没传的参数用配置里的 student_papers 设置
+    """
+    config = load_config()
+    settings = get_student_paper_settings(config)
+    seed = settings['seed'] if seed is None else seed
+    workers = settings['workers'] if workers is None else max(1, workers)
+
+    output_dir = config.get('paths', {}).get('output_dir', './output')
+    os.makedirs(output_dir, exist_ok=True)
+    archive_file = os.path.join(output_dir, f"诗词默写学生卷-{time.strftime('%Y%m%d-%H%M%S')}.zip")
+
+    start = time.perf_counter()
+    try:
+        rows = render_student_papers(
+            list(groups), students, archive_file,
+            seed=seed, workers=workers, chunk_size=settings['chunk_size'],
+            dedupe=config.get('printer', {}).get('dedupe', False),
+        )
+    except Exception as e:
+        console.print(f"[red]✗ 生成学生卷失败: {e}[/red]")
+        return None
+
+    console.print(f"[green]✓[/green] 生成 {len(rows)} 名学生的试卷和答案，"
+                  f"{workers} 个进程，用时 {time.perf_counter() - start:.1f}s")
+    console.print(f"  [dim]压缩包：[/dim]{archive_file}")
+    if rows:
+        console.print(f"  [dim]每份题数：[/dim][bold]{rows[0][5]}[/bold] 题，种子 {seed}（名单见 {MANIFEST_NAME}）")
+    return archive_file
@@ -0,0 +1,67 @@
+PLACEHOLDER = "{{answer}}"
+
+# 答案片段里不允许出现的标点（书名号除外，诗句里可能有曲名，比如《霓裳》）
+PUNCTUATION = set("，。？！；：、“”‘’（）【】…—·,.?!;:\"'()[]")
+
+
+def validate_item(item):
+    """
+    本地校验一道题的结构，返回错误说明列表，空列表表示通过
+    检查提示词里要求模型自查的几条：
+    - title / poet / value 必须是非空字符串，title 不带书名号
+    - answer 是非空的字符串数组，片段不能为空、不能带标点
+    - value 里 {{answer}} 的数量等于 answer 的长度
+    - value 里不能直接出现答案原句
+    """
+    if not isinstance(item, dict):
+        return ["题目不是JSON对象"]
+
+    errors = []
+    for field in ('title', 'poet', 'value'):
+        if not isinstance(item.get(field), str) or not item.get(field).strip():
+            errors.append(f"缺少{field}字段或为空")
+
+    title = item.get('title')
+    if isinstance(title, str) and ('《' in title or '》' in title):
+        errors.append("title不应包含书名号")
+
+    answers = item.get('answer')
+    if not isinstance(answers, list) or not answers:
+        errors.append("answer必须是非空数组")
+        answers = []
+    elif not all(isinstance(a, str) and a.strip() for a in answers):
+        errors.append("answer中存在空片段或非字符串")
+        answers = [a for a in answers if isinstance(a, str)]
+
+    for a in answers:
+        found = sorted(set(ch for ch in a if ch in PUNCTUATION))
+        if found:
+            errors.append(f"answer片段「{a}」包含标点{''.join(found)}")
+
+    value = item.get('value')
+    if isinstance(value, str):
+        count = value.count(PLACEHOLDER)
+        if count != len(item.get('answer') or []):
+            errors.append(f"value中有{count}处{PLACEHOLDER}，但answer有{len(item.get('answer') or [])}个片段")
+        stem = value.replace(PLACEHOLDER, '')
+        for a in answers:
+            if len(a.strip()) >= 2 and a.strip() in stem:
+                errors.append(f"value中直接出现了答案「{a.strip()}」")
+
+    return errors
+
+
+def split_valid(items):
+    """
+    把题目分成通过和未通过两组
+    返回 (通过的题目列表, [(原序号, 题目, 错误列表)])
+    """
+    valid = []
+    invalid = []
+    for i, item in enumerate(items):
+        errors = validate_item(item)
+        if errors:
+            invalid.append((i, item, errors))
+        else:
+            valid.append(item)
+    return valid, invalid
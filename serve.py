@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻服务模式：在本地 HTTP 端口上提供出题、渲染试卷、查询题库接口
+
+接口（请求和响应都是 JSON）:
+    POST /generate     {"poet", "poem", "num", "difficulty", "save": true, "refresh": false, "wait": true}
+    POST /render       {"items": [...]} 或 {"query": {"poet", "title", "difficulty", "days"}, "limit"}，可加 "label", "inline"
+    GET  /bank         ?poet=&title=&difficulty=0.9,0.5&days=&limit=
+    GET  /bank/poems
+    GET  /jobs/<任务号>  "wait": false 提交的任务用这个查结果
+    GET  /health
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lib.config import load_config
+from lib.console import console
+from lib.service import PoetryService, create_server
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='常驻服务模式，通过本地 HTTP 调用出题和打印')
+    parser.add_argument('--host', help='监听地址（默认用配置 service.host）')
+    parser.add_argument('--port', type=int, help='监听端口（默认用配置 service.port）')
+    parser.add_argument('--workers', type=int, help='执行任务的线程数（默认用配置 service.workers）')
+    args = parser.parse_args()
+
+    config = load_config()
+    if args.workers:
+        config = dict(config, service=dict(config.get('service', {}), workers=args.workers))
+
+    service = PoetryService(config)
+    reference_items = service.warm_up()
+    server = create_server(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    console.print(f"[green]✓[/green] 服务已启动: [bold]http://{host}:{port}[/bold]  "
+                  f"{service.settings['workers']} 个任务线程，参考库 {reference_items} 条")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("\n[yellow]正在停止服务...[/yellow]")
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
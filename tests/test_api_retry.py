@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接口重试和熔断：本地起一个按脚本返回状态码的假接口，直接跑 _request_with_retry
+    python -m pytest tests/test_api_retry.py
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.api import _request_with_retry
+from lib.endpoints import CLOSED, Endpoint, EndpointPool
+from lib.metrics import CallTimer
+
+SSE_BODY = b'data: {"choices":[{"delta":{"content":"ok"}}]}\n\ndata: [DONE]\n\n'
+
+
+class ScriptedServer:
+    """按 script 依次返回状态码，脚本用完后都返回 200；非 200 时带上 Retry-After"""
+
+    def __init__(self, script, retry_after="0"):
+        self.script = list(script)
+        self.retry_after = retry_after
+        self.calls = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                server.calls += 1
+                status = server.script.pop(0) if server.script else 200
+                body = SSE_BODY if status == 200 else b'{"error": "rate limited"}'
+                self.send_response(status)
+                if status != 200:
+                    self.send_header('Retry-After', server.retry_after)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as s:
+        yield s
+
+
+def make_pool(server, failure_threshold=3, cooldown_seconds=30):
+    endpoint = Endpoint("only", server.url, "token", "test-model")
+    return EndpointPool([endpoint], failure_threshold=failure_threshold, cooldown_seconds=cooldown_seconds)
+
+
+def call(pool, session, **retry):
+    config = {"retry": dict({"max_attempts": 3, "base_delay": 0.01, "max_delay": 2.0}, **retry)}
+    data = {"model": "test-model", "messages": [{"role": "user", "content": "hi"}]}
+    return _request_with_retry(config, pool, session, data, (5, 5), 1, None, False, CallTimer("test-model"))
+
+
+def test_rate_limits_do_not_open_the_only_endpoint(session):
+    server = ScriptedServer([429, 429, 429, 200])
+    try:
+        pool = make_pool(server)
+        status, content, _ = call(pool, session)
+        assert (status, content) == ("http_429", None)
+        assert pool.endpoints[0].state == CLOSED
+
+        status, content, _ = call(pool, session)
+        assert (status, content) == ("ok", "ok")
+        assert server.calls == 4
+    finally:
+        server.close()
+
+
+def test_retry_after_is_honoured(session):
+    server = ScriptedServer([429, 200], retry_after="0.5")
+    try:
+        start = time.monotonic()
+        status, content, _ = call(make_pool(server), session)
+        assert (status, content) == ("ok", "ok")
+        assert time.monotonic() - start >= 0.5
+    finally:
+        server.close()
+
+
+def test_open_breaker_waits_for_half_open(session):
+    server = ScriptedServer([500, 200])
+    try:
+        pool = make_pool(server, failure_threshold=1, cooldown_seconds=0.3)
+        start = time.monotonic()
+        status, content, _ = call(pool, session)
+        assert (status, content) == ("ok", "ok")
+        assert time.monotonic() - start >= 0.3
+        assert pool.endpoints[0].state == CLOSED
+    finally:
+        server.close()
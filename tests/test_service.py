@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 服务：在临时目录里起服务，用真实的 HTTP 请求调接口
+    python -m pytest tests/test_service.py
+"""
+
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.config import DEFAULT_CONFIG, reload_config
+from lib.service import PoetryService, create_server
+
+SCRIPT = "<script>alert(1)</script>"
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    config['paths'].update({
+        "data_dir": str(tmp_path / "data"),
+        "output_dir": str(tmp_path / "output"),
+        "bank_file": str(tmp_path / "data" / "question_bank.db"),
+    })
+    with open("config.json", 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+    reload_config()
+
+    svc = PoetryService()
+    server = create_server(svc, '127.0.0.1', 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    svc.close()
+    reload_config()
+
+
+def post(port, path, data):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('POST', path, body=json.dumps(data).encode('utf-8'),
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+    finally:
+        conn.close()
+
+
+def test_render_escapes_label_and_items(service):
+    item = {"title": "静夜思", "poet": SCRIPT, "value": f"床前明月光，{{{{answer}}}}。{SCRIPT}", "answer": [SCRIPT]}
+    status, result = post(service, '/render', {"items": [item], "label": SCRIPT, "inline": True})
+    assert status == 200, result
+    result = result['result']
+    assert result['count'] == 1
+    for page in (result['test_html'], result['answer_html']):
+        assert SCRIPT not in page
+        assert "&lt;script&gt;alert(1)&lt;/script&gt;" in page
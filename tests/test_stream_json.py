@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式 JSON 数组解析器
+    python -m pytest tests/test_stream_json.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.stream_json import IncrementalArrayParser
+
+ITEMS = [
+    {"title": "静夜思", "poet": "李白", "value": "床前明月光，{{answer}}。", "answer": ["疑是地上霜"]},
+    {"title": "静夜思", "poet": "李白", "value": "{{answer}}，低头思故乡。", "answer": ["举头望明月"]},
+]
+
+
+def feed_all(text, chunk_size):
+    parser = IncrementalArrayParser()
+    completed = []
+    for i in range(0, len(text), chunk_size):
+        completed.extend(parser.feed(text[i:i + chunk_size]))
+    return parser, completed
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 10000])
+def test_preamble_with_brackets_is_skipped(chunk_size):
+    text = "好的[注意]：\n[ \n" + json.dumps(ITEMS, ensure_ascii=False)[1:]
+    parser, completed = feed_all(text, chunk_size)
+    assert completed == ITEMS
+    assert parser.finished
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 10000])
+def test_code_fence_and_empty_array(chunk_size):
+    parser, completed = feed_all("```json\n" + json.dumps(ITEMS, ensure_ascii=False) + "\n```", chunk_size)
+    assert completed == ITEMS
+
+    parser, completed = feed_all("没有题目：[]", chunk_size)
+    assert completed == [] and parser.finished